@@ -0,0 +1,224 @@
+# audit/archive.py
+
+import gzip
+import io
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from audit.audit_writer import LOG_DIR, SEGMENT_DIR
+
+ARCHIVE_DIR = LOG_DIR / "archive"
+
+# Columns kept in the archive; nested fields (explanations) stay in the
+# gzip'd JSONL segments, which remain the source of truth.
+#   category -> int32 codes (-1 = missing) + dictionary of values
+#   bytes    -> fixed-width utf-8 (unique ids, no dictionary gain)
+ARCHIVE_SCHEMA = {
+    "transaction_id": "bytes",
+    "payer_vpa": "category",
+    "payee_vpa": "category",
+    "decision": "category",
+    "challenger_decision": "category",
+    "graph_override": "category",
+    "actual_outcome": "category",
+    "amount": "float",
+    "champion_probability": "float",
+    "challenger_probability": "float",
+    "velocity_risk": "float",
+    "final_probability": "float",
+    "logged_at": "datetime",
+}
+
+
+# --------------------------------------------------
+# COMPACTION
+# --------------------------------------------------
+def closed_segments(segment_dir: Path = SEGMENT_DIR) -> list[Path]:
+    """
+    Rotated segments that are no longer written to: `.jsonl.gz`, and
+    plain `.jsonl` only when no compression of it is in progress.
+    """
+    if not segment_dir.exists():
+        return []
+
+    segments = []
+    for path in sorted(segment_dir.iterdir()):
+        if path.name.endswith(".jsonl.gz"):
+            segments.append(path)
+        elif path.suffix == ".jsonl" and not (
+            path.with_name(path.name + ".gz").exists()
+            or path.with_name(path.name + ".gz.tmp").exists()
+        ):
+            segments.append(path)
+
+    return segments
+
+
+def _archive_path(segment: Path, archive_dir: Path) -> Path:
+    stem = segment.name.split(".jsonl")[0]
+    return archive_dir / f"{stem}.npz"
+
+
+def _read_segment(segment: Path) -> list[dict]:
+    opener = gzip.open if segment.suffix == ".gz" else open
+
+    with opener(segment, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def encode_records(records: list[dict]) -> dict[str, np.ndarray]:
+    arrays = {"__rows__": np.asarray(len(records), dtype=np.int64)}
+
+    for column, kind in ARCHIVE_SCHEMA.items():
+        values = [record.get(column) for record in records]
+
+        if kind == "category":
+            codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+            arrays[f"{column}.codes"] = codes.astype(np.int32)
+            arrays[f"{column}.values"] = np.asarray(
+                [str(v) for v in uniques], dtype=np.str_
+            )
+        elif kind == "bytes":
+            arrays[column] = np.asarray(
+                [("" if v is None else str(v)).encode("utf-8") for v in values],
+                dtype=np.bytes_
+            )
+        elif kind == "float":
+            arrays[column] = np.asarray(
+                [np.nan if v is None else v for v in values], dtype=np.float64
+            )
+        elif kind == "datetime":
+            arrays[column] = pd.to_datetime(
+                pd.Series(values, dtype=object), errors="coerce", utc=True
+            ).dt.tz_localize(None).to_numpy(dtype="datetime64[us]")
+
+    return arrays
+
+
+def compact_segments(
+    segment_dir: Path = SEGMENT_DIR,
+    archive_dir: Path = ARCHIVE_DIR
+) -> list[Path]:
+    """
+    Writes one `.npz` per closed segment that is not archived yet.
+    Returns the new archive files.
+    """
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    written = []
+
+    for segment in closed_segments(segment_dir):
+        target = _archive_path(segment, archive_dir)
+        if target.exists():
+            continue
+
+        arrays = encode_records(_read_segment(segment))
+
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **arrays)
+
+        tmp = target.with_name(target.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(buffer.getvalue())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, target)
+
+        written.append(target)
+
+    return written
+
+
+# --------------------------------------------------
+# READER
+# --------------------------------------------------
+def _decode_column(npz, column: str, n_rows: int):
+    kind = ARCHIVE_SCHEMA[column]
+
+    if kind == "category":
+        if f"{column}.codes" not in npz:
+            return pd.Categorical.from_codes(np.full(n_rows, -1), categories=[])
+        return pd.Categorical.from_codes(
+            npz[f"{column}.codes"], categories=npz[f"{column}.values"]
+        )
+
+    if column not in npz:
+        fill = {"bytes": b"", "float": np.nan, "datetime": np.datetime64("NaT")}
+        return np.full(n_rows, fill[kind])
+
+    values = npz[column]
+    if kind == "bytes":
+        return np.char.decode(values, "utf-8")
+    return values
+
+
+def load_columns(
+    columns: list[str],
+    archive_dir: Path = ARCHIVE_DIR
+) -> pd.DataFrame:
+    """
+    Reads only `columns` from every archive file (npz members are
+    loaded lazily, per column). Category columns come back as pandas
+    Categoricals over the union of the files' dictionaries.
+    """
+    unknown = [c for c in columns if c not in ARCHIVE_SCHEMA]
+    if unknown:
+        raise KeyError(f"Not archived: {unknown}")
+
+    parts = {column: [] for column in columns}
+
+    for path in sorted(archive_dir.glob("*.npz")) if archive_dir.exists() else []:
+        with np.load(path, allow_pickle=False) as npz:
+            n_rows = int(npz["__rows__"])
+            for column in columns:
+                parts[column].append(_decode_column(npz, column, n_rows))
+
+    data = {}
+    for column in columns:
+        chunks = parts[column]
+
+        if ARCHIVE_SCHEMA[column] == "category":
+            data[column] = (
+                pd.api.types.union_categoricals(chunks, ignore_order=True)
+                if chunks else pd.Categorical([])
+            )
+        else:
+            data[column] = np.concatenate(chunks) if chunks else np.array([])
+
+    return pd.DataFrame(data)
+
+
+def load_decisions(
+    columns: list[str],
+    archive_dir: Path = ARCHIVE_DIR,
+    log_dir: Path = LOG_DIR
+) -> pd.DataFrame:
+    """
+    Archived decisions plus the still-active JSONL files
+    (decision_log*.jsonl), restricted to `columns`.
+    """
+    frames = [load_columns(columns, archive_dir)]
+
+    for path in sorted(log_dir.glob("decision_log*.jsonl")):
+        records = _read_segment(path)
+        if records:
+            frames.append(
+                pd.DataFrame(
+                    [{c: r.get(c) for c in columns} for r in records],
+                    columns=columns
+                )
+            )
+
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == "__main__":
+    for path in compact_segments():
+        print(f"Archived {path.name}")
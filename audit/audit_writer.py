@@ -0,0 +1,383 @@
+# audit/audit_writer.py
+
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from pymongo.errors import BulkWriteError
+
+from storage.write_behind import DUPLICATE_KEY_ERROR
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+LOG_DIR = Path(os.getenv("AUDIT_LOG_DIR", BASE_DIR / "audit" / "logs"))
+SEGMENT_DIR = LOG_DIR / "segments"
+
+# =====================================================
+# CONFIG
+# =====================================================
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", 10_000))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", 500))
+AUDIT_FLUSH_INTERVAL_MS = float(os.getenv("AUDIT_FLUSH_INTERVAL_MS", 200))
+
+# always: fsync every write batch | flush: only on flush() | never
+AUDIT_FSYNC = os.getenv("AUDIT_FSYNC", "flush")
+
+AUDIT_ROTATE_BYTES = int(os.getenv("AUDIT_ROTATE_BYTES", 128 * 1024 * 1024))
+AUDIT_ROTATE_INTERVAL_S = float(os.getenv("AUDIT_ROTATE_INTERVAL_S", 24 * 3600))
+AUDIT_COMPRESS = os.getenv("AUDIT_COMPRESS", "1") == "1"
+
+# Records kept for retry while the Mongo mirror is unreachable
+AUDIT_MIRROR_MAX_PENDING = int(os.getenv("AUDIT_MIRROR_MAX_PENDING", 50_000))
+
+# How often a waiting flush() checks that the writer thread is alive
+AUDIT_FLUSH_POLL_S = 1.0
+
+_STOP = object()
+
+
+# --------------------------------------------------
+# SAFE JSON SERIALIZER
+# --------------------------------------------------
+def _json_serializer(obj: Any):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    return str(obj)
+
+
+class _Barrier:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class AuditWriter:
+    """
+    Appends decision records to a JSONL file from a background thread.
+
+    Callers enqueue records into a bounded queue (blocking when it is
+    full) and return immediately; the writer thread serializes them,
+    writes them in batches and optionally mirrors each batch into a
+    Mongo collection with one `insert_many` (and hands it to `rollup`,
+    e.g. a DecisionCounterStore). `flush()` blocks until
+    everything enqueued before it is written (and fsync'd unless
+    AUDIT_FSYNC=never) — call it before acknowledging the events.
+
+    The active file is rotated into `logs/segments/` by size or age and
+    gzip-compressed there.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        mirror=None,
+        rollup=None,
+        queue_size: int = AUDIT_QUEUE_SIZE,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        flush_interval_ms: float = AUDIT_FLUSH_INTERVAL_MS,
+        fsync: str = AUDIT_FSYNC,
+        rotate_bytes: int = AUDIT_ROTATE_BYTES,
+        rotate_interval_s: float = AUDIT_ROTATE_INTERVAL_S,
+        compress: bool = AUDIT_COMPRESS,
+        segment_dir: Path = SEGMENT_DIR
+    ):
+        if fsync not in ("always", "flush", "never"):
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+
+        self.path = Path(path)
+        self.mirror = mirror
+        self.rollup = rollup
+        self.batch_size = batch_size
+        self.flush_interval_ms = flush_interval_ms
+        self.fsync = fsync
+        self.rotate_bytes = rotate_bytes
+        self.rotate_interval_s = rotate_interval_s
+        self.compress = compress
+        self.segment_dir = Path(segment_dir)
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._error = None
+
+        self._file = None
+        self._opened_at = 0.0
+        self._mirror_pending = []
+        self._compressors = []
+
+        # metrics
+        self.written = 0
+        self.mirrored = 0
+        self.mirror_dropped = 0
+        self.rotations = 0
+
+    # --------------------------------------------------
+    # PUBLIC
+    # --------------------------------------------------
+    def write(self, record: dict):
+        self._check()
+        record.setdefault("logged_at", datetime.utcnow())
+        self._queue.put(record)
+
+    def write_many(self, records: list[dict]):
+        self._check()
+        now = datetime.utcnow()
+
+        for record in records:
+            record.setdefault("logged_at", now)
+            self._queue.put(record)
+
+    def flush(self, timeout: float | None = None):
+        """
+        Waits until every record enqueued so far is on disk.
+        """
+        self._check()
+
+        barrier = _Barrier()
+        self._queue.put(barrier)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = AUDIT_FLUSH_POLL_S
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    raise TimeoutError("Audit writer did not flush in time")
+
+            if barrier.done.wait(wait):
+                break
+
+            # the writer thread died without reaching the barrier
+            if not self._thread.is_alive() and not barrier.done.is_set():
+                self._check()
+                raise RuntimeError("Audit writer thread exited before flushing")
+
+        self._check()
+
+    def close(self):
+        if self._thread is None or not self._thread.is_alive():
+            return
+
+        self._queue.put(_STOP)
+        self._thread.join()
+
+        for compressor in self._compressors:
+            compressor.join()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "mirrored": self.mirrored,
+            "mirror_pending": len(self._mirror_pending),
+            "mirror_dropped": self.mirror_dropped,
+            "rotations": self.rotations
+        }
+
+    # --------------------------------------------------
+    # WRITER THREAD
+    # --------------------------------------------------
+    def _check(self):
+        if self._error is not None:
+            raise RuntimeError("Audit writer failed") from self._error
+
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="audit-writer", daemon=True
+                    )
+                    self._thread.start()
+
+    def _run(self):
+        try:
+            self._loop()
+        except Exception as e:
+            # surfaced to callers by _check() / a waiting flush()
+            self._error = e
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _loop(self):
+        timeout = self.flush_interval_ms / 1000
+        stopping = False
+
+        while not stopping:
+            try:
+                items = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                self._mirror_batch([])
+                continue
+
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = []
+            barriers = []
+            for item in items:
+                if item is _STOP:
+                    stopping = True
+                elif isinstance(item, _Barrier):
+                    barriers.append(item)
+                else:
+                    records.append(item)
+
+            try:
+                self._write_batch(records, sync=bool(barriers) or stopping)
+            except Exception as e:
+                self._error = e
+
+            for barrier in barriers:
+                barrier.done.set()
+
+            if self._error is not None:
+                break
+
+    def _write_batch(self, records: list[dict], sync: bool):
+        if records:
+            if self._file is None:
+                self._open()
+
+            self._file.write("".join(
+                json.dumps(record, default=_json_serializer) + "\n"
+                for record in records
+            ))
+            self._file.flush()
+            self.written += len(records)
+
+        if self._file is not None and (
+            self.fsync == "always" and records
+            or self.fsync == "flush" and sync
+        ):
+            os.fsync(self._file.fileno())
+
+        self._mirror_batch(records)
+        self._maybe_rotate()
+
+    def _mirror_batch(self, records: list[dict]):
+        if self.mirror is None:
+            return
+
+        # insert_many adds `_id` to the docs; never touch caller records
+        self._mirror_pending.extend(dict(record) for record in records)
+        if not self._mirror_pending:
+            return
+
+        # Retries re-send the same `_id`s: a duplicate key means an
+        # earlier (timed out / partly failed) attempt already inserted it
+        pending = self._mirror_pending
+        try:
+            self.mirror.insert_many(pending, ordered=False)
+            failed = set()
+        except BulkWriteError as e:
+            failed = {
+                err["index"]
+                for err in e.details.get("writeErrors", [])
+                if err["code"] != DUPLICATE_KEY_ERROR
+            }
+            if failed:
+                print(f"[AUDIT] Mongo mirror failed for {len(failed)} records, will retry")
+        except Exception as e:
+            print(f"[AUDIT] Mongo mirror failed, will retry: {e}")
+            self._trim_mirror_pending()
+            return
+
+        docs = [doc for i, doc in enumerate(pending) if i not in failed]
+        self._mirror_pending = [pending[i] for i in sorted(failed)]
+        self.mirrored += len(docs)
+        self._trim_mirror_pending()
+
+        if docs and self.rollup is not None:
+            try:
+                self.rollup.record_batch(docs)
+            except Exception as e:
+                print(f"[AUDIT] Decision counter update failed: {e}")
+
+    def _trim_mirror_pending(self):
+        overflow = len(self._mirror_pending) - AUDIT_MIRROR_MAX_PENDING
+        if overflow > 0:
+            del self._mirror_pending[:overflow]
+            self.mirror_dropped += overflow
+
+    # --------------------------------------------------
+    # FILE / ROTATION
+    # --------------------------------------------------
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._opened_at = self._first_logged_at() or time.time()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _first_logged_at(self) -> float | None:
+        # age of an existing file survives restarts
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return None
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                logged_at = json.loads(f.readline()).get("logged_at")
+            # written from utcnow(): naive, but UTC
+            return datetime.fromisoformat(logged_at).replace(tzinfo=timezone.utc).timestamp()
+        except (ValueError, TypeError):
+            return None
+
+    def _maybe_rotate(self):
+        if self._file is None:
+            return
+
+        too_big = self._file.tell() >= self.rotate_bytes
+        too_old = time.time() - self._opened_at >= self.rotate_interval_s
+
+        if too_big or too_old:
+            self.rotate()
+
+    def rotate(self) -> Path | None:
+        """
+        Closes the active file and moves it into the segment directory.
+        Writer thread only (or while the writer is stopped).
+        """
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return None
+
+        self.segment_dir.mkdir(parents=True, exist_ok=True)
+        segment = self.segment_dir / (
+            f"{self.path.stem}-{datetime.utcnow():%Y%m%dT%H%M%S%f}.jsonl"
+        )
+        os.replace(self.path, segment)
+        self.rotations += 1
+
+        if self.compress:
+            compressor = threading.Thread(
+                target=_gzip_segment, args=(segment,), daemon=True
+            )
+            compressor.start()
+            self._compressors = [
+                c for c in self._compressors if c.is_alive()
+            ] + [compressor]
+
+        return segment
+
+
+def _gzip_segment(segment: Path):
+    target = segment.with_name(segment.name + ".gz")
+    tmp = target.with_name(target.name + ".tmp")
+
+    with open(segment, "rb") as src, gzip.open(tmp, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+
+    os.replace(tmp, target)
+    segment.unlink()
@@ -1,24 +1,53 @@
 # audit/decision_log.py
 
-import json
-from pathlib import Path
-from datetime import datetime
-from typing import Any
+import atexit
+import os
+import threading
+
+from audit.audit_writer import AuditWriter, LOG_DIR
 
-BASE_DIR = Path(__file__).resolve().parent.parent
-LOG_DIR = BASE_DIR / "audit" / "logs"
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 
 LOG_FILE = LOG_DIR / "decision_log.jsonl"
 
+# Mirror decisions into Mongo `audit_decisions` (dashboard, evaluation)
+# and keep the dashboard's decision counters in step
+AUDIT_MONGO_MIRROR = os.getenv("AUDIT_MONGO_MIRROR", "1") == "1"
+
+_writers = {}
+_writers_lock = threading.Lock()
+
 
 # --------------------------------------------------
-# SAFE JSON SERIALIZER
+# WRITERS
 # --------------------------------------------------
-def _json_serializer(obj: Any):
-    if isinstance(obj, datetime):
-        return obj.isoformat()
-    return str(obj)
+def get_audit_writer(path=LOG_FILE) -> AuditWriter:
+    """
+    One background writer per log file. Processes that run side by
+    side (partitioned consumers) must use different files.
+    """
+    with _writers_lock:
+        writer = _writers.get(path)
+
+        if writer is None:
+            mirror = rollup = None
+            if AUDIT_MONGO_MIRROR:
+                from storage.mongo import db
+                from storage.decision_counters import DecisionCounterStore
+                mirror = db["audit_decisions"]
+                rollup = DecisionCounterStore()
+
+            writer = _writers[path] = AuditWriter(
+                path, mirror=mirror, rollup=rollup
+            )
+
+        return writer
+
+
+@atexit.register
+def _close_writers():
+    for writer in list(_writers.values()):
+        writer.close()
 
 
 # --------------------------------------------------
@@ -26,17 +55,22 @@ def _json_serializer(obj: Any):
 # --------------------------------------------------
 def log_decision(record: dict):
     """
-    Writes one fraud decision record per line (JSONL).
-    Safely serializes datetime and other non-JSON objects.
+    Queues one fraud decision record (JSONL line) for the background
+    writer. Call flush_decisions() when it has to be on disk.
+    """
+    get_audit_writer().write(record)
+
+
+def log_decisions(records: list[dict]):
+    """
+    Batched variant of log_decision for a whole micro-batch.
     """
+    if records:
+        get_audit_writer().write_many(records)
 
-    # Ensure audit timestamp exists
-    record.setdefault(
-        "logged_at",
-        datetime.utcnow()
-    )
 
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(
-            json.dumps(record, default=_json_serializer) + "\n"
-        )
+def flush_decisions():
+    """
+    Blocks until every queued decision is written and fsync'd.
+    """
+    get_audit_writer().flush()
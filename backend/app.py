@@ -1,15 +1,30 @@
-from fastapi import FastAPI, HTTPException, Query, UploadFile, File
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Query, Request, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile as FormUpload
+from pydantic import BaseModel, TypeAdapter, ValidationError
+import numpy as np
 import pandas as pd
-import joblib
 from pathlib import Path
+from contextlib import asynccontextmanager
+from datetime import datetime
+import asyncio
+from functools import lru_cache
+import io
+import json
 import os
 from dotenv import load_dotenv
 import logging
-import shap
 
 from data.schema import FEATURE_COLUMNS
 from data.upi_schema import UPI_FEATURE_COLUMNS
+from backend.batcher import MicroBatcher
+from backend.model_registry import ModelRegistry, ModelSpec
+from inference.native_booster import NativeBoosterScorer
+from inference.anomaly import HybridAnomalyScorer
+from monitoring.metrics import STAGE_SECONDS, instrument_app
+from storage.feature_store import PayerFeatureStore, STORE_FEATURE_COLUMNS
+from storage.mongo import close_clients
+from pymongo.errors import PyMongoError
 
 # =====================================================
 # ENV + LOGGING
@@ -25,17 +40,36 @@ logger = logging.getLogger(__name__)
 # =====================================================
 # FASTAPI APP
 # =====================================================
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if MODEL_WARMUP != "lazy":
+        await run_in_threadpool(
+            registry.warm_up, MODEL_WARMUP == "parallel"
+        )
+    yield
+    close_clients()
+
+
 app = FastAPI(
     title="Transaction Fraud Detection API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Request latency + Prometheus /metrics
+instrument_app(app)
+
 # =====================================================
 # PATHS
 # =====================================================
 BASE_DIR = Path(__file__).resolve().parent.parent
 MODEL_DIR = BASE_DIR / "models"
 
+# =====================================================
+# BATCH LIMITS
+# =====================================================
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 1000))
+
 # =====================================================
 # RISK SCORING FUNCTION (FIXED: WAS MISSING)
 # =====================================================
@@ -50,86 +84,49 @@ def risk_score(prob: float):
         return 20, "LOW"
 
 # =====================================================
-# LOAD CREDIT CARD MODELS
+# MODEL REGISTRY (LAZY)
 # =====================================================
-MODELS = {}
-
-try:
-    MODELS["lightgbm"] = joblib.load(MODEL_DIR / "fraud_lgbm.pkl")
-    MODELS["xgboost"] = joblib.load(MODEL_DIR / "fraud_xgb.pkl")
-    logger.info("LightGBM and XGBoost loaded")
-except Exception as e:
-    logger.exception("Failed to load main models")
-    raise RuntimeError(str(e))
-
-try:
-    MODELS["decision_tree"] = joblib.load(MODEL_DIR / "fraud_decision_tree.pkl")
-    logger.info("Decision Tree loaded")
-except Exception:
-    logger.warning("Decision Tree not available")
+CREDIT_MODEL_NAMES = ["lightgbm", "xgboost", "decision_tree"]
+
+registry = ModelRegistry(MODEL_DIR, [
+    # Credit card
+    ModelSpec("lightgbm", "fraud_lgbm.pkl", required=True),
+    ModelSpec("xgboost", "fraud_xgb.pkl", required=True),
+    ModelSpec("decision_tree", "fraud_decision_tree.pkl"),
+    # Credit card fast path (python -m training.export_native_models)
+    ModelSpec("lightgbm_native", "fraud_lgbm_native.pkl",
+              build=NativeBoosterScorer.from_artifact),
+    ModelSpec("xgboost_native", "fraud_xgb_native.pkl",
+              build=NativeBoosterScorer.from_artifact),
+    # Anomaly
+    ModelSpec("isolation_forest", "fraud_isolation_forest.pkl"),
+    ModelSpec("knn", "fraud_knn.pkl"),
+    # UPI
+    ModelSpec("upi_lightgbm", "upi_fraud_lgbm.pkl"),
+    ModelSpec("upi_lightgbm_calibrated", "upi_fraud_lgbm_calibrated.pkl"),
+])
+
+# lazy | sequential | parallel
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "parallel")
 
 # =====================================================
-# LOAD ANOMALY MODELS
+# SHAP (built on first use, shap imported lazily)
 # =====================================================
-ISO_MODEL = None
-KNN_MODEL = None
-KNN_SCALER = None
+@lru_cache(maxsize=None)
+def get_shap_explainer(model_name: str):
+    """
+    `lightgbm` (credit card pipeline) or `upi_lightgbm`.
+    """
+    import shap
 
-try:
-    ISO_MODEL = joblib.load(MODEL_DIR / "fraud_isolation_forest.pkl")
-    logger.info("Isolation Forest loaded")
-except Exception:
-    logger.warning("Isolation Forest not available")
+    model = registry.get(model_name)
+    if model is None:
+        return None
 
-try:
-    knn_bundle = joblib.load(MODEL_DIR / "fraud_knn.pkl")
-    KNN_MODEL = knn_bundle["model"]
-    KNN_SCALER = knn_bundle["scaler"]
-    logger.info("KNN anomaly model loaded")
-except Exception:
-    logger.warning("KNN model not available")
+    if model_name == "lightgbm":
+        model = model.steps[-1][1]
 
-# =====================================================
-# SHAP (CREDIT CARD – LIGHTGBM)
-# =====================================================
-SHAP_EXPLAINER = None
-try:
-    lgbm_pipeline = MODELS["lightgbm"]
-    lgbm_model = lgbm_pipeline.steps[-1][1]
-    SHAP_EXPLAINER = shap.TreeExplainer(lgbm_model)
-    logger.info("SHAP explainer initialized (credit card)")
-except Exception:
-    logger.warning("SHAP explainer not available")
-
-# =====================================================
-# LOAD UPI MODELS
-# =====================================================
-UPI_MODELS = {}
-
-try:
-    UPI_MODELS["lightgbm"] = joblib.load(MODEL_DIR / "upi_fraud_lgbm.pkl")
-    logger.info("UPI LightGBM model loaded")
-except Exception:
-    logger.warning("UPI LightGBM model not available")
-
-try:
-    UPI_MODELS["lightgbm_calibrated"] = joblib.load(
-        MODEL_DIR / "upi_fraud_lgbm_calibrated.pkl"
-    )
-    logger.info("UPI calibrated model loaded")
-except Exception:
-    logger.warning("UPI calibrated model not available")
-
-# =====================================================
-# SHAP (UPI – LIGHTGBM)
-# =====================================================
-UPI_SHAP_EXPLAINER = None
-try:
-    if "lightgbm" in UPI_MODELS:
-        UPI_SHAP_EXPLAINER = shap.TreeExplainer(UPI_MODELS["lightgbm"])
-        logger.info("UPI SHAP explainer initialized")
-except Exception:
-    logger.warning("UPI SHAP explainer not available")
+    return shap.TreeExplainer(model)
 
 # =====================================================
 # REQUEST SCHEMAS
@@ -174,23 +171,131 @@ class UPITransaction(BaseModel):
     transactions_last_1hr: int
     transactions_last_24hr: int
     avg_amount_last_7_days: float
-    device_change_flag: int
-    location_change_flag: int
-    failed_attempts_last_1hr: int
-    receiver_new_flag: int
+    # Left out -> looked up in the payer feature store (needs the context below)
+    device_change_flag: int | None = None
+    location_change_flag: int | None = None
+    failed_attempts_last_1hr: int | None = None
+    receiver_new_flag: int | None = None
+    # Transaction context for the feature store
+    payer_vpa: str | None = None
+    payee_vpa: str | None = None
+    device_id: str | None = None
+    ip_address: str | None = None
+
+
+UPI_CONTEXT_COLUMNS = ["payer_vpa", "payee_vpa", "device_id", "ip_address"]
+
+# =====================================================
+# PAYER FEATURE STORE (shared with the UPI consumer, read-only here)
+# =====================================================
+# no in-process cache: the consumer owns the states and keeps changing them
+feature_store = PayerFeatureStore(cache_size=0)
+
+
+def complete_upi_rows(rows: list[dict]) -> list[dict]:
+    """
+    Fills store features the caller left out from the payer feature
+    store, with one query for the whole batch.
+    """
+    incomplete = [
+        row for row in rows
+        if any(pd.isna(row.get(c)) for c in STORE_FEATURE_COLUMNS)
+    ]
+    if not incomplete:
+        return rows
+
+    if any(pd.isna(row.get(c)) for row in incomplete for c in UPI_CONTEXT_COLUMNS):
+        raise HTTPException(
+            422,
+            f"Provide {STORE_FEATURE_COLUMNS} or the transaction context "
+            f"{UPI_CONTEXT_COLUMNS} to look them up"
+        )
+
+    try:
+        with STAGE_SECONDS.time("feature_store_lookup"):
+            looked_up = feature_store.get_features_many(incomplete, datetime.utcnow())
+    except PyMongoError:
+        logger.exception("Feature store lookup failed")
+        raise HTTPException(503, "Feature store unavailable")
+
+    for row, features in zip(incomplete, looked_up):
+        for c in STORE_FEATURE_COLUMNS:
+            if pd.isna(row.get(c)):
+                row[c] = features[c]
+
+    return rows
+
+# =====================================================
+# CREDIT CARD SCORING (native booster when exported)
+# =====================================================
+def credit_predict_proba(model_name: str, rows) -> np.ndarray:
+    """
+    Fraud probabilities for rows in FEATURE_COLUMNS order. Uses the
+    exported booster + scaler arrays when available and falls back to
+    the sklearn pipeline otherwise.
+    """
+    native_name = f"{model_name}_native"
+    native = registry.get(native_name) if native_name in registry.specs else None
+
+    if native is not None:
+        return native.predict_proba(np.ascontiguousarray(rows, dtype=np.float64))
+
+    X = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(
+        rows, columns=FEATURE_COLUMNS
+    )
+    return registry.get(model_name).predict_proba(X)[:, 1]
+
+# =====================================================
+# DYNAMIC REQUEST BATCHING
+# =====================================================
+def _credit_scorer(model_name: str):
+    def score(rows: list) -> list:
+        with STAGE_SECONDS.time(f"score_{model_name}"):
+            return credit_predict_proba(model_name, rows)
+    return score
+
+
+def _anomaly_scorer(rows: list) -> list[dict]:
+    X = pd.DataFrame(rows, columns=FEATURE_COLUMNS)
+    with STAGE_SECONDS.time("score_anomaly"):
+        return HybridAnomalyScorer(
+            registry.get("isolation_forest"), registry.get("knn")
+        ).score(X)
+
+
+def _upi_scorer(rows: list) -> list:
+    X = pd.DataFrame(rows, columns=UPI_FEATURE_COLUMNS)
+    with STAGE_SECONDS.time("score_upi_calibrated"):
+        return registry.get("upi_lightgbm_calibrated").predict_proba(X)[:, 1]
+
+
+# Concurrent single-row requests are scored together, one batcher per model
+BATCHERS = {
+    name: MicroBatcher(name, _credit_scorer(name))
+    for name in CREDIT_MODEL_NAMES
+}
+BATCHERS["anomaly"] = MicroBatcher("anomaly", _anomaly_scorer)
+BATCHERS["upi_calibrated"] = MicroBatcher("upi_calibrated", _upi_scorer)
+
+
+def require_model(name: str):
+    model = registry.get(name)
+    if model is None:
+        raise HTTPException(404, f"Model not available: {name}")
+    return model
 
 # =====================================================
 # CREDIT CARD PREDICTION
 # =====================================================
 @app.post("/predict")
-def predict(transaction: Transaction,
-            model_name: str = Query("lightgbm", enum=["lightgbm", "xgboost", "decision_tree"])):
+async def predict(transaction: Transaction,
+                  model_name: str = Query("lightgbm", enum=["lightgbm", "xgboost", "decision_tree"])):
+
+    await run_in_threadpool(require_model, model_name)
 
-    pipeline = MODELS[model_name]
-    X = pd.DataFrame([[getattr(transaction, c) for c in FEATURE_COLUMNS]],
-                     columns=FEATURE_COLUMNS)
+    row = [getattr(transaction, c) for c in FEATURE_COLUMNS]
 
-    prob = pipeline.predict_proba(X)[0][1]
+    prob = await BATCHERS[model_name].submit(row)
     threshold = float(os.getenv("FRAUD_THRESHOLD", 0.5))
 
     return {
@@ -203,43 +308,34 @@ def predict(transaction: Transaction,
 # HYBRID CREDIT CARD PREDICTION
 # =====================================================
 @app.post("/predict/hybrid")
-def predict_hybrid(transaction: Transaction,
-                   model_name: str = Query("lightgbm", enum=["lightgbm", "xgboost", "decision_tree"])):
+async def predict_hybrid(transaction: Transaction,
+                         model_name: str = Query("lightgbm", enum=["lightgbm", "xgboost", "decision_tree"])):
 
-    pipeline = MODELS[model_name]
-    X = pd.DataFrame([[getattr(transaction, c) for c in FEATURE_COLUMNS]],
-                     columns=FEATURE_COLUMNS)
+    await run_in_threadpool(require_model, model_name)
 
-    prob = pipeline.predict_proba(X)[0][1]
-
-    iso_anomaly = ISO_MODEL is not None and ISO_MODEL.predict(X)[0] == -1
-
-    knn_anomaly = False
-    if KNN_MODEL is not None:
-        X_scaled = KNN_SCALER.transform(X)
-        knn_anomaly = X_scaled.mean() > 3.0
+    row = [getattr(transaction, c) for c in FEATURE_COLUMNS]
 
+    # supervised + anomaly scores, each coalesced with concurrent requests
+    prob, anomaly = await asyncio.gather(
+        BATCHERS[model_name].submit(row),
+        BATCHERS["anomaly"].submit(row)
+    )
     threshold = float(os.getenv("FRAUD_THRESHOLD", 0.5))
 
     return {
         "fraud_probability": float(prob),
-        "isolation_forest_anomaly": iso_anomaly,
-        "knn_anomaly": knn_anomaly,
-        "final_decision": bool(prob >= threshold or iso_anomaly or knn_anomaly)
+        **anomaly,
+        "final_decision": bool(
+            prob >= threshold
+            or anomaly["isolation_forest_anomaly"]
+            or anomaly["knn_anomaly"]
+        )
     }
 
 # =====================================================
 # UPI RISK PREDICTION (CALIBRATED)
 # =====================================================
-@app.post("/upi/predict/risk")
-def predict_upi_risk(transaction: UPITransaction):
-    if "lightgbm_calibrated" not in UPI_MODELS:
-        raise HTTPException(500, "Calibrated model not available")
-
-    model = UPI_MODELS["lightgbm_calibrated"]
-    X = pd.DataFrame([transaction.dict()])
-
-    prob = model.predict_proba(X)[0][1]
+def upi_risk_result(prob: float) -> dict:
     score, level = risk_score(prob)
 
     return {
@@ -254,13 +350,188 @@ def predict_upi_risk(transaction: UPITransaction):
         )
     }
 
+
+@app.post("/upi/predict/risk")
+async def predict_upi_risk(transaction: UPITransaction):
+    if not await run_in_threadpool(registry.available, "upi_lightgbm_calibrated"):
+        raise HTTPException(500, "Calibrated model not available")
+
+    row = transaction.model_dump()
+    if any(row[c] is None for c in STORE_FEATURE_COLUMNS):
+        row = (await run_in_threadpool(complete_upi_rows, [row]))[0]
+
+    prob = await BATCHERS["upi_calibrated"].submit(
+        [row[c] for c in UPI_FEATURE_COLUMNS]
+    )
+
+    return upi_risk_result(prob)
+
+# =====================================================
+# BATCH PREDICTION (JSON array / NDJSON / CSV upload)
+# =====================================================
+def check_csv_cells(df: pd.DataFrame, schema: type[BaseModel], required: list[str]):
+    """
+    CSV cells skip the schema, so numeric fields are converted here
+    (in place); a bad or, for `required`, empty cell is a 422 naming
+    its column and row index.
+    """
+    for column in df.columns:
+        if schema.model_fields[column].annotation in (str, str | None):
+            continue
+
+        values = pd.to_numeric(df[column], errors="coerce")
+        bad = values.isna() & (df[column].notna() | (column in required))
+
+        if bad.any():
+            row = int(bad.idxmax())
+            raise HTTPException(
+                422,
+                f"Column '{column}', row {row}: expected a number, "
+                f"got {df[column][row]!r}"
+            )
+
+        df[column] = values
+
+
+async def parse_batch(
+    request: Request,
+    schema: type[BaseModel],
+    columns: list[str],
+    optional: list[str] = ()
+) -> pd.DataFrame:
+    """
+    Accepts a JSON array, NDJSON (one object per line) or a multipart
+    CSV upload in the `file` field, and returns one DataFrame in
+    `columns` order followed by the `optional` columns (missing -> NaN).
+    """
+    optional = [c for c in optional if c not in columns]
+
+    content_type = request.headers.get("content-type", "")
+
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+
+        # request.form() yields Starlette's class, not FastAPI's subclass
+        if not isinstance(upload, FormUpload):
+            raise HTTPException(400, "Expected a CSV upload in field 'file'")
+
+        try:
+            df = pd.read_csv(io.BytesIO(await upload.read()))
+        except Exception:
+            raise HTTPException(400, "Invalid CSV file")
+
+        missing = [c for c in columns if c not in df.columns]
+        if missing:
+            raise HTTPException(400, f"Missing columns: {missing}")
+        if len(df) > MAX_BATCH_SIZE:
+            raise HTTPException(413, f"Batch exceeds {MAX_BATCH_SIZE} items")
+
+        df = df.reindex(columns=columns + optional)
+        check_csv_cells(df, schema, columns)
+        return df
+
+    body = await request.body()
+
+    try:
+        if "ndjson" in content_type or "jsonl" in content_type:
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            items = json.loads(body)
+    except json.JSONDecodeError:
+        raise HTTPException(400, "Invalid JSON body")
+
+    if not isinstance(items, list):
+        raise HTTPException(400, "Expected an array of transactions")
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(413, f"Batch exceeds {MAX_BATCH_SIZE} items")
+
+    try:
+        rows = TypeAdapter(list[schema]).validate_python(items)
+    except ValidationError as e:
+        raise HTTPException(422, e.errors(include_url=False))
+
+    return pd.DataFrame(
+        [[getattr(row, c) for c in columns + optional] for row in rows],
+        columns=columns + optional
+    )
+
+
+@app.post("/predict/batch")
+async def predict_batch(
+    request: Request,
+    model_name: str = Query("lightgbm", enum=["lightgbm", "xgboost", "decision_tree"])
+):
+    await run_in_threadpool(require_model, model_name)
+
+    X = await parse_batch(request, Transaction, FEATURE_COLUMNS)
+    if X.empty:
+        return {"model": model_name, "count": 0, "results": []}
+
+    probs = await run_in_threadpool(credit_predict_proba, model_name, X)
+    threshold = float(os.getenv("FRAUD_THRESHOLD", 0.5))
+
+    return {
+        "model": model_name,
+        "count": len(probs),
+        "results": [
+            {
+                "index": i,
+                "fraud_probability": float(prob),
+                "is_fraud": bool(prob >= threshold)
+            }
+            for i, prob in enumerate(probs)
+        ]
+    }
+
+
+@app.post("/upi/predict/risk/batch")
+async def predict_upi_risk_batch(request: Request):
+    model = await run_in_threadpool(registry.get, "upi_lightgbm_calibrated")
+    if model is None:
+        raise HTTPException(500, "Calibrated model not available")
+
+    X = await parse_batch(
+        request,
+        UPITransaction,
+        [c for c in UPI_FEATURE_COLUMNS if c not in STORE_FEATURE_COLUMNS],
+        STORE_FEATURE_COLUMNS + UPI_CONTEXT_COLUMNS
+    )
+    if X.empty:
+        return {"domain": "upi", "count": 0, "results": []}
+
+    rows = await run_in_threadpool(complete_upi_rows, X.to_dict("records"))
+    X = pd.DataFrame(rows, columns=UPI_FEATURE_COLUMNS)
+
+    probs = await run_in_threadpool(
+        lambda: model.predict_proba(X)[:, 1]
+    )
+
+    return {
+        "domain": "upi",
+        "count": len(probs),
+        "results": [
+            {"index": i, **upi_risk_result(prob)}
+            for i, prob in enumerate(probs)
+        ]
+    }
+
 # =====================================================
 # HEALTH
 # =====================================================
 @app.get("/health")
 def health():
+    status = registry.status()
+    loaded = [name for name, s in status.items() if s["state"] == "loaded"]
+
     return {
         "status": "ok",
-        "credit_models": list(MODELS.keys()),
-        "upi_models": list(UPI_MODELS.keys())
+        "credit_models": [n for n in CREDIT_MODEL_NAMES if n in loaded],
+        "upi_models": [n[len("upi_"):] for n in loaded if n.startswith("upi_")],
+        "models": status
     }
+
+
+@app.get("/metrics/batching")
+def batching_metrics():
+    return {name: batcher.stats() for name, batcher in BATCHERS.items()}
@@ -0,0 +1,196 @@
+# backend/batcher.py
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Sequence
+
+from fastapi.concurrency import run_in_threadpool
+
+# =====================================================
+# CONFIG
+# =====================================================
+DYNAMIC_BATCH_MAX_SIZE = int(os.getenv("DYNAMIC_BATCH_MAX_SIZE", 64))
+DYNAMIC_BATCH_MAX_WAIT_MS = float(os.getenv("DYNAMIC_BATCH_MAX_WAIT_MS", 2))
+
+# Recent queue waits kept for percentile reporting
+WAIT_SAMPLE_SIZE = 2048
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, float("inf"))
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-row scoring requests.
+
+    Callers `await submit(row)`; a background task collects rows until
+    `max_batch_size` is reached or `max_wait_ms` passed since the first
+    row, scores them with one `score_fn(rows)` call in the threadpool and
+    resolves every caller's future. While a batch is being scored, new
+    requests queue up and form the next batch.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        score_fn: Callable[[list], Sequence[Any]],
+        max_batch_size: int = DYNAMIC_BATCH_MAX_SIZE,
+        max_wait_ms: float = DYNAMIC_BATCH_MAX_WAIT_MS
+    ):
+        self.name = name
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._queue = None
+        self._loop = None
+        self._task = None
+
+        # metrics
+        self.batches = 0
+        self.items = 0
+        self.batch_size_counts = {b: 0 for b in BATCH_SIZE_BUCKETS}
+        self.waits_ms = deque(maxlen=WAIT_SAMPLE_SIZE)
+
+    # --------------------------------------------------
+    # PUBLIC
+    # --------------------------------------------------
+    async def submit(self, row):
+        self._ensure_started()
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future, time.perf_counter()))
+
+        return await future
+
+    def stats(self) -> dict:
+        waits = sorted(self.waits_ms)
+
+        def percentile(q: float) -> float:
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(q * len(waits)))], 3)
+
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": (
+                round(self.items / self.batches, 2) if self.batches else 0.0
+            ),
+            "batch_size_histogram": {
+                f"le_{b}": n for b, n in self.batch_size_counts.items()
+            },
+            "queue_wait_ms": {
+                "p50": percentile(0.50),
+                "p99": percentile(0.99),
+                "max": round(waits[-1], 3) if waits else 0.0
+            },
+            "queue_depth": self._queue.qsize() if self._queue else 0
+        }
+
+    # --------------------------------------------------
+    # WORKER
+    # --------------------------------------------------
+    def _ensure_started(self):
+        if self._task is not None and not self._task.done():
+            return
+
+        if self._task is not None and not self._task.cancelled() and self._task.exception():
+            logger.error(
+                "%s batcher stopped, restarting", self.name,
+                exc_info=self._task.exception()
+            )
+
+        loop = asyncio.get_running_loop()
+
+        # Requests queued on this loop are picked up by the new task;
+        # a queue of another (finished) loop can only be failed
+        if self._queue is None or self._loop is not loop:
+            self._fail_queued(RuntimeError(f"{self.name} batcher was restarted"))
+            self._queue = asyncio.Queue()
+            self._loop = loop
+
+        self._task = loop.create_task(self._run())
+
+    def _fail_queued(self, error: Exception):
+        if self._queue is None:
+            return
+
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            self._fail(future, error)
+
+    @staticmethod
+    def _fail(future: asyncio.Future, error: Exception):
+        if future.done():
+            return
+        try:
+            future.set_exception(error)
+        except RuntimeError:
+            # its event loop is closed; nobody is waiting any more
+            pass
+
+    async def _collect(self, batch: list):
+        loop = asyncio.get_running_loop()
+
+        batch.append(await self._queue.get())
+        deadline = loop.time() + self.max_wait_ms / 1000
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+
+            try:
+                batch.append(
+                    await asyncio.wait_for(self._queue.get(), timeout)
+                )
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self):
+        batch = []
+        try:
+            while True:
+                batch = []
+                await self._collect(batch)
+
+                started = time.perf_counter()
+                for _, _, enqueued in batch:
+                    self.waits_ms.append((started - enqueued) * 1000)
+
+                self._record_batch(len(batch))
+
+                try:
+                    results = await run_in_threadpool(
+                        self.score_fn, [row for row, _, _ in batch]
+                    )
+                except Exception as e:
+                    for _, future, _ in batch:
+                        self._fail(future, e)
+                    continue
+
+                for (_, future, _), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            # cancelled or crashed mid-batch: its callers must not hang
+            for _, future, _ in batch:
+                self._fail(future, RuntimeError(f"{self.name} batcher stopped"))
+
+    def _record_batch(self, size: int):
+        self.batches += 1
+        self.items += size
+
+        for bucket in BATCH_SIZE_BUCKETS:
+            if size <= bucket:
+                self.batch_size_counts[bucket] += 1
+                break
@@ -0,0 +1,128 @@
+# backend/model_registry.py
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ModelSpec:
+    name: str
+    filename: str
+    required: bool = False
+    # turns the unpickled artifact into the object callers use
+    build: Callable | None = None
+
+
+class ModelRegistry:
+    """
+    Loads model artifacts on first use instead of at import time.
+
+    Pickles are opened with `mmap_mode="r"`, so large numpy arrays are
+    mapped from the page cache and shared between uvicorn workers
+    rather than copied into each one. `warm_up()` optionally loads
+    everything up front, in parallel threads (joblib/numpy release the
+    GIL for most of the I/O).
+    """
+
+    def __init__(self, model_dir: Path, specs: list[ModelSpec], mmap_mode: str | None = "r"):
+        self.model_dir = Path(model_dir)
+        self.specs = {spec.name: spec for spec in specs}
+        self.mmap_mode = mmap_mode
+
+        self._models = {}
+        self._status = {
+            name: {"state": "unloaded", "load_seconds": None, "error": None}
+            for name in self.specs
+        }
+        self._locks = {name: threading.Lock() for name in self.specs}
+
+    # --------------------------------------------------
+    # ACCESS
+    # --------------------------------------------------
+    def get(self, name: str):
+        """
+        Returns the loaded model, or None if it is not available.
+        """
+        if name in self._models:
+            return self._models[name]
+
+        with self._locks[name]:
+            if name not in self._models and self._status[name]["state"] == "unloaded":
+                self._load(name)
+
+        return self._models.get(name)
+
+    def available(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    # --------------------------------------------------
+    # WARM-UP
+    # --------------------------------------------------
+    def warm_up(self, parallel: bool = True):
+        """
+        Loads every model; raises if a required one is unavailable.
+        """
+        started = time.perf_counter()
+
+        if parallel:
+            with ThreadPoolExecutor(max_workers=len(self.specs)) as pool:
+                list(pool.map(self.get, self.specs))
+        else:
+            for name in self.specs:
+                self.get(name)
+
+        logger.info(
+            f"Model warm-up finished in {time.perf_counter() - started:.2f}s "
+            f"(parallel={parallel})"
+        )
+
+        missing = [
+            name for name, spec in self.specs.items()
+            if spec.required and name not in self._models
+        ]
+        if missing:
+            raise RuntimeError(f"Required models not available: {missing}")
+
+    def status(self) -> dict:
+        return {name: dict(status) for name, status in self._status.items()}
+
+    # --------------------------------------------------
+    # INTERNALS
+    # --------------------------------------------------
+    def _load(self, name: str):
+        spec = self.specs[name]
+        status = self._status[name]
+        path = self.model_dir / spec.filename
+
+        started = time.perf_counter()
+        status["state"] = "loading"
+
+        try:
+            model = joblib.load(path, mmap_mode=self.mmap_mode)
+            if spec.build is not None:
+                model = spec.build(model)
+        except FileNotFoundError:
+            status.update(state="missing", error=f"{path.name} not found")
+            log = logger.error if spec.required else logger.warning
+            log(f"{name} not available ({path.name} not found)")
+            return
+        except Exception as e:
+            status.update(state="failed", error=str(e))
+            logger.exception(f"Failed to load {name}")
+            return
+
+        self._models[name] = model
+        status.update(
+            state="loaded",
+            load_seconds=round(time.perf_counter() - started, 4)
+        )
+        logger.info(f"{name} loaded in {status['load_seconds']}s")
@@ -0,0 +1,150 @@
+# benchmarks/load_generator.py
+
+import argparse
+import json
+import random
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from itertools import accumulate
+from uuid import UUID
+
+from event_queue.event_queue import QUEUE_FILE, _queue_lock
+from events.upi_event import UPITransactionEvent
+
+BANK_CODES = ["HDFC", "ICICI", "SBI", "AXIS"]
+
+
+class UPILoadGenerator:
+    """
+    Synthetic UPITransactionEvent stream with realistic skew:
+
+    - payers are Zipf-distributed (a few very active users, a long tail)
+    - mule accounts fan out: each send goes to a fresh payee
+    - scam merchants fan in: many distinct payers pay the same payee
+    - timestamps advance at `rate_per_s` events per second, with a
+      little jitter so some events arrive slightly out of order
+
+    Events are plain dicts shaped like `UPITransactionEvent.model_dump()`
+    (building a pydantic model per event would dominate generation).
+    """
+
+    def __init__(
+        self,
+        payers: int = 100_000,
+        merchants: int = 5_000,
+        zipf_s: float = 1.1,
+        mules: int = 50,
+        mule_share: float = 0.01,
+        scam_merchants: int = 20,
+        scam_share: float = 0.01,
+        rate_per_s: float = 500.0,
+        start: datetime | None = None,
+        seed: int = 42
+    ):
+        self.rng = random.Random(seed)
+        self.payers = payers
+        self.merchants = merchants
+        self.mules = mules
+        self.mule_share = mule_share
+        self.scam_merchants = scam_merchants
+        self.scam_share = scam_share
+        self.rate_per_s = rate_per_s
+        self.start = start or datetime.utcnow() - timedelta(days=1)
+
+        self._payer_cdf = list(accumulate(
+            1.0 / (rank ** zipf_s) for rank in range(1, payers + 1)
+        ))
+        self._merchant_cdf = list(accumulate(
+            1.0 / (rank ** zipf_s) for rank in range(1, merchants + 1)
+        ))
+        self._mule_payees = 0
+
+    def _zipf(self, cdf: list[float]) -> int:
+        return bisect_right(cdf, self.rng.random() * cdf[-1])
+
+    def event(self, seq: int) -> dict:
+        rng = self.rng
+        roll = rng.random()
+
+        if roll < self.mule_share:
+            payer = f"mule{rng.randrange(self.mules)}@upi"
+            self._mule_payees += 1
+            payee = f"drop{self._mule_payees}@upi"
+            amount = round(rng.uniform(2_000, 20_000), 2)
+        elif roll < self.mule_share + self.scam_share:
+            payer = f"user{self._zipf(self._payer_cdf)}@upi"
+            payee = f"scam{rng.randrange(self.scam_merchants)}@upi"
+            amount = round(rng.uniform(500, 10_000), 2)
+        else:
+            payer = f"user{self._zipf(self._payer_cdf)}@upi"
+            payee = f"merchant{self._zipf(self._merchant_cdf)}@upi"
+            amount = round(rng.lognormvariate(6.0, 1.0), 2)
+
+        offset = seq / self.rate_per_s + rng.uniform(-2.0, 2.0)
+
+        return {
+            "event_id": str(UUID(int=rng.getrandbits(128), version=4)),
+            "transaction_id": str(UUID(int=rng.getrandbits(128), version=4)),
+            "payer_vpa": payer,
+            "payee_vpa": payee,
+            "amount": amount,
+            "timestamp": (self.start + timedelta(seconds=max(0.0, offset))).isoformat(),
+            "device_id": f"device_{rng.randrange(300_000)}",
+            "ip_address": f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}",
+            "bank_code": rng.choice(BANK_CODES),
+            "status": "INITIATED"
+        }
+
+    def events(self, n: int):
+        for seq in range(n):
+            yield self.event(seq)
+
+
+def write_queue(events, path=QUEUE_FILE, chunk_size: int = 10_000) -> int:
+    """
+    Appends events to the queue file in large chunks (push_event takes
+    the queue lock once per event).
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    chunk = []
+
+    def flush():
+        with _queue_lock():
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("".join(chunk))
+        chunk.clear()
+
+    for event in events:
+        chunk.append(json.dumps(event) + "\n")
+        written += 1
+        if len(chunk) >= chunk_size:
+            flush()
+
+    if chunk:
+        flush()
+
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic UPI events into the queue")
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--payers", type=int, default=100_000)
+    parser.add_argument("--merchants", type=int, default=5_000)
+    parser.add_argument("--zipf-s", type=float, default=1.1)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    generator = UPILoadGenerator(
+        payers=args.payers,
+        merchants=args.merchants,
+        zipf_s=args.zipf_s,
+        seed=args.seed
+    )
+
+    # schema check on one event; the rest share its shape
+    UPITransactionEvent(**UPILoadGenerator(seed=args.seed + 1).event(0))
+
+    n = write_queue(generator.events(args.events))
+    print(f"Wrote {n} events to {QUEUE_FILE}")
@@ -0,0 +1,248 @@
+# benchmarks/pipeline_benchmark.py
+"""
+End-to-end throughput benchmark of the UPI consumer.
+
+    python -m benchmarks.pipeline_benchmark --events 200000
+
+Generates a skewed event stream into a scratch queue, runs
+`consume_events` against the Mongo at --mongo-uri (a scratch database,
+dropped first) and writes a JSON report to benchmarks/results/:
+events/sec, per-stage latency histograms and Mongo round trips per
+event. --compare <report.json> prints the change against an earlier run.
+
+For an in-memory setup, point --mongo-uri at a throwaway mongod whose
+dbpath is on tmpfs.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = BASE_DIR / "benchmarks" / "results"
+
+# upper bounds in ms
+LATENCY_BUCKETS_MS = (
+    0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, float("inf")
+)
+
+
+# --------------------------------------------------
+# MEASUREMENT
+# --------------------------------------------------
+class LatencyRecorder:
+    def __init__(self):
+        self.samples = array("d")
+
+    def add(self, seconds: float):
+        self.samples.append(seconds * 1000)
+
+    def summary(self) -> dict:
+        values = sorted(self.samples)
+        if not values:
+            return {"count": 0}
+
+        def pct(q: float) -> float:
+            return round(values[min(len(values) - 1, int(q * len(values)))], 4)
+
+        histogram = Counter()
+        i = 0
+        for bound in LATENCY_BUCKETS_MS:
+            start = i
+            while i < len(values) and values[i] <= bound:
+                i += 1
+            histogram[f"le_{bound}"] = i - start
+
+        return {
+            "count": len(values),
+            "mean_ms": round(sum(values) / len(values), 4),
+            "p50_ms": pct(0.50),
+            "p90_ms": pct(0.90),
+            "p99_ms": pct(0.99),
+            "max_ms": round(values[-1], 4),
+            "histogram_ms": dict(histogram)
+        }
+
+
+def timed(fn, recorder: LatencyRecorder):
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            recorder.add(time.perf_counter() - started)
+    return wrapper
+
+
+def _command_counter():
+    """
+    Counts every command sent to Mongo; must be registered before the
+    client is created.
+    """
+    from pymongo import monitoring
+
+    class CommandCounter(monitoring.CommandListener):
+        def __init__(self):
+            self.commands = Counter()
+
+        def started(self, event):
+            self.commands[event.command_name] += 1
+
+        def succeeded(self, event):
+            pass
+
+        def failed(self, event):
+            pass
+
+    counter = CommandCounter()
+    monitoring.register(counter)
+    return counter
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# --------------------------------------------------
+# RUN
+# --------------------------------------------------
+def run(args) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix="upi-bench-"))
+
+    # scratch queue, audit log and database — set before any import
+    os.environ["UPI_QUEUE_DIR"] = str(workdir / "queue")
+    os.environ["AUDIT_LOG_DIR"] = str(workdir / "audit")
+    os.environ["MONGO_URI"] = args.mongo_uri
+    os.environ["MONGO_DB"] = args.db
+
+    commands = _command_counter()
+
+    from pymongo import MongoClient
+    MongoClient(args.mongo_uri).drop_database(args.db)
+
+    from benchmarks.load_generator import UPILoadGenerator, write_queue
+
+    generator = UPILoadGenerator(
+        payers=args.payers, merchants=args.merchants, zipf_s=args.zipf_s, seed=args.seed
+    )
+    started = time.perf_counter()
+    write_queue(generator.events(args.events))
+    generate_s = time.perf_counter() - started
+
+    from consumers import upi_fraud_consumer as consumer
+    from storage.indexes import ensure_indexes
+
+    ensure_indexes()
+
+    stages = {name: LatencyRecorder() for name in (
+        "prepare_batch", "score_batch", "decide_event",
+        "audit_flush", "write_behind_flush", "process_batch"
+    )}
+    consumer.prepare_batch = timed(consumer.prepare_batch, stages["prepare_batch"])
+    consumer.score_batch = timed(consumer.score_batch, stages["score_batch"])
+    consumer.decide_event = timed(consumer.decide_event, stages["decide_event"])
+    consumer.write_buffer.flush = timed(consumer.write_buffer.flush, stages["write_behind_flush"])
+    consumer.audit_writer.flush = timed(consumer.audit_writer.flush, stages["audit_flush"])
+    consumer.process_batch = timed(consumer.process_batch, stages["process_batch"])
+
+    # startup work (indexes, model load) is not part of the measurement
+    commands.commands.clear()
+
+    started = time.perf_counter()
+    consumer.consume_events(args.batch_size, args.max_wait_ms)
+    elapsed = time.perf_counter() - started
+
+    total_commands = sum(commands.commands.values())
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "run_at": datetime.utcnow().isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "events": args.events,
+            "batch_size": args.batch_size,
+            "max_wait_ms": args.max_wait_ms,
+            "payers": args.payers,
+            "merchants": args.merchants,
+            "zipf_s": args.zipf_s,
+            "seed": args.seed
+        },
+        "generate_seconds": round(generate_s, 3),
+        "consume_seconds": round(elapsed, 3),
+        "events_per_second": round(args.events / elapsed, 1),
+        "stages": {name: r.summary() for name, r in stages.items()},
+        "mongo_round_trips": {
+            "total": total_commands,
+            "per_event": round(total_commands / args.events, 4),
+            "by_command": dict(commands.commands.most_common())
+        }
+    }
+
+
+def compare(current: dict, baseline: dict):
+    def change(new, old):
+        return f"{(new - old) / old:+.1%}" if old else "n/a"
+
+    print(f"\nvs {baseline['meta'].get('commit')} ({baseline['meta'].get('run_at')})")
+    print(
+        f"events/sec     {current['events_per_second']:>10} "
+        f"({change(current['events_per_second'], baseline['events_per_second'])})"
+    )
+    print(
+        f"round trips/ev {current['mongo_round_trips']['per_event']:>10} "
+        f"({change(current['mongo_round_trips']['per_event'], baseline['mongo_round_trips']['per_event'])})"
+    )
+    for name, stats in current["stages"].items():
+        old = baseline["stages"].get(name, {})
+        if stats.get("count") and old.get("count"):
+            print(
+                f"{name:<18} p99 {stats['p99_ms']:>9} ms "
+                f"({change(stats['p99_ms'], old['p99_ms'])})"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UPI pipeline throughput benchmark")
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--max-wait-ms", type=float, default=50)
+    parser.add_argument("--payers", type=int, default=100_000)
+    parser.add_argument("--merchants", type=int, default=5_000)
+    parser.add_argument("--zipf-s", type=float, default=1.1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017")
+    parser.add_argument("--db", default="fraud_bench")
+    parser.add_argument("--compare", type=Path, help="earlier report to diff against")
+    args = parser.parse_args()
+
+    report = run(args)
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    out = RESULTS_DIR / (
+        f"{datetime.utcnow():%Y%m%dT%H%M%S}-{report['meta']['commit'] or 'nogit'}.json"
+    )
+    out.write_text(json.dumps(report, indent=2))
+
+    print(json.dumps(
+        {k: report[k] for k in ("events_per_second", "consume_seconds", "mongo_round_trips")},
+        indent=2
+    ))
+    print(f"Report saved to {out}")
+
+    if args.compare:
+        compare(report, json.loads(args.compare.read_text()))
@@ -0,0 +1,216 @@
+# consumers/async_consumer.py
+
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from event_queue.event_queue import (
+    QueueReader,
+    iter_batches,
+    BATCH_SIZE,
+    BATCH_MAX_WAIT_MS
+)
+from monitoring.metrics import STAGE_SECONDS, EVENTS, SummaryReporter
+from storage.indexes import ensure_indexes
+from consumers import upi_fraud_consumer as consumer
+
+# =====================================================
+# CONFIG
+# =====================================================
+# Batches read and parsed ahead of the one being processed
+READ_AHEAD_BATCHES = int(os.getenv("CONSUMER_READ_AHEAD_BATCHES", 2))
+# Threads issuing blocking pymongo calls (the client is thread-safe)
+IO_WORKERS = int(os.getenv("CONSUMER_IO_WORKERS", 8))
+
+# =====================================================
+# RUNTIME
+# =====================================================
+class AsyncConsumer:
+    """
+    asyncio runtime over the same stores and decision logic as
+    `consumers.upi_fraud_consumer`.
+
+    Per micro-batch:
+
+    1. idempotency, risk-profile, payer-feature and graph reads run
+       concurrently (one query per store), and finish before any store
+       is used from the loop thread
+    2. feature extraction on the loop thread, then model scoring in a
+       worker thread
+    3. decisions run in event order on the loop thread
+    4. the audit flush, then the per-collection bulk writes (concurrent
+       with each other)
+
+    Meanwhile the next `read_ahead` batches are read and parsed. Batches
+    are processed one at a time, in queue order. A store is never used
+    by two threads at once, so per-payer order is the same as in the
+    synchronous loop.
+
+    Blocking pymongo calls run in a thread pool (motor does the same
+    underneath), so the stores need no async twin.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = BATCH_SIZE,
+        max_wait_ms: float = BATCH_MAX_WAIT_MS,
+        read_ahead: int = READ_AHEAD_BATCHES,
+        io_workers: int = IO_WORKERS
+    ):
+        self.batch_size = batch_size
+        self.max_wait_ms = max_wait_ms
+        self.read_ahead = read_ahead
+
+        self.io = ThreadPoolExecutor(io_workers, thread_name_prefix="consumer-io")
+        # bulk writes fanned out by a flush that itself runs on self.io
+        self.writes = ThreadPoolExecutor(io_workers, thread_name_prefix="consumer-write")
+
+    async def _run_io(self, stage: str, fn, *args):
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.io, fn, *args
+            )
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage)
+
+    # --------------------------------------------------
+    # QUEUE READ-AHEAD
+    # --------------------------------------------------
+    async def _read(self, reader: QueueReader, batches: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        it = iter_batches(reader, self.batch_size, self.max_wait_ms)
+
+        try:
+            while True:
+                batch = await loop.run_in_executor(self.io, next, it, None)
+                if batch is None:
+                    break
+                # offset right after this batch, committed once it is durable
+                await batches.put((batch, reader.position))
+        except Exception as e:
+            await batches.put(e)
+            return
+
+        await batches.put(None)
+
+    # --------------------------------------------------
+    # ONE MICRO-BATCH
+    # --------------------------------------------------
+    async def process_batch(self, events: list[dict]) -> int:
+        # 0️⃣ Independent store reads (one store per thread)
+        await asyncio.gather(*(
+            self._run_io(stage, fetch, keys)
+            for stage, fetch, keys in consumer.batch_lookups(events)
+        ))
+
+        # 1️⃣ Feature extraction (in memory after the reads above)
+        prepared = consumer.prepare_batch(events)
+
+        if not prepared:
+            # nothing queued; drops the prefetched overlays
+            consumer.write_buffer.flush()
+            return 0
+
+        EVENTS.inc("processed", amount=len(prepared))
+
+        # 2️⃣ Model scoring
+        champion_probs, challenger_probs = await asyncio.get_running_loop().run_in_executor(
+            self.io, consumer.score_batch, [row for _, _, row in prepared]
+        )
+
+        # 3️⃣ Decisions, strictly in event order
+        records = consumer.decide_batch(prepared, champion_probs, challenger_probs)
+
+        # =================================================
+        # BATCH BOUNDARY (durable before the queue moves on)
+        # =================================================
+        with STAGE_SECONDS.time("audit_enqueue"):
+            consumer.audit_writer.write_many(records)
+
+        # audit before state: a replay skips events already marked
+        await self._run_io("audit_flush", consumer.audit_writer.flush)
+        await self._run_io("write_behind_flush", consumer.write_buffer.flush, self.writes)
+
+        return len(prepared)
+
+    # --------------------------------------------------
+    # MAIN LOOP
+    # --------------------------------------------------
+    async def run(self):
+        reader = QueueReader()
+        reporter = SummaryReporter()
+        batches = asyncio.Queue(maxsize=max(1, self.read_ahead))
+        processed = 0
+
+        # Startup state (filter + velocity windows) loads concurrently
+        await asyncio.gather(
+            self._run_io("startup", consumer.processed_store.rebuild),
+            self._run_io("startup", consumer.velocity_store.restore)
+        )
+
+        read_task = asyncio.create_task(self._read(reader, batches))
+
+        try:
+            while (item := await batches.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                events, position = item
+
+                await self.process_batch(events)
+                await self._run_io("velocity_snapshot", consumer.velocity_store.maybe_snapshot)
+
+                # Batch is durable – resume after it on restart
+                await self._run_io("queue_commit", reader.commit, position)
+                processed += 1
+
+                reporter.maybe_report()
+        finally:
+            read_task.cancel()
+            await asyncio.gather(read_task, return_exceptions=True)
+
+        if not processed:
+            print("No events to process")
+            return
+
+        await self._run_io("velocity_snapshot", consumer.velocity_store.snapshot)
+        reporter.report()
+
+        segment = reader.rotate()
+        if segment:
+            print(f"Queue segment rotated to {segment}")
+
+    def close(self):
+        self.io.shutdown(wait=True)
+        self.writes.shutdown(wait=True)
+
+
+def consume_events_async(
+    batch_size: int = BATCH_SIZE,
+    max_wait_ms: float = BATCH_MAX_WAIT_MS,
+    read_ahead: int = READ_AHEAD_BATCHES,
+    io_workers: int = IO_WORKERS
+):
+    runtime = AsyncConsumer(batch_size, max_wait_ms, read_ahead, io_workers)
+    try:
+        asyncio.run(runtime.run())
+    finally:
+        runtime.close()
+
+# =====================================================
+# ENTRY POINT
+# =====================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UPI fraud consumer (asyncio runtime)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=BATCH_MAX_WAIT_MS)
+    parser.add_argument("--read-ahead", type=int, default=READ_AHEAD_BATCHES)
+    parser.add_argument("--io-workers", type=int, default=IO_WORKERS)
+    args = parser.parse_args()
+
+    if os.getenv("MONGO_ENSURE_INDEXES", "1") == "1":
+        ensure_indexes()
+
+    consume_events_async(args.batch_size, args.max_wait_ms, args.read_ahead, args.io_workers)
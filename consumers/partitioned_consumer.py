@@ -0,0 +1,270 @@
+# consumers/partitioned_consumer.py
+
+import argparse
+import os
+import queue
+import time
+import traceback
+from collections import deque
+import multiprocessing as mp
+
+from event_queue.event_queue import (
+    QueueReader,
+    iter_batches,
+    partition_for,
+    BATCH_SIZE,
+    BATCH_MAX_WAIT_MS
+)
+
+# =====================================================
+# CONFIG
+# =====================================================
+WORKERS = int(os.getenv("CONSUMER_WORKERS", os.cpu_count() or 1))
+MAX_IN_FLIGHT = int(os.getenv("CONSUMER_MAX_IN_FLIGHT", 4))
+LAG_REPORT_INTERVAL_S = float(os.getenv("CONSUMER_LAG_REPORT_INTERVAL_S", 10))
+# how often a supervisor waiting on the workers checks they are alive
+OUTBOX_POLL_S = float(os.getenv("CONSUMER_OUTBOX_POLL_S", 1.0))
+
+# =====================================================
+# WORKER
+# =====================================================
+def _worker_main(partition: int, partitions: int, inbox, outbox):
+    """
+    Runs in its own process (spawned, so it opens its own Mongo pool
+    and loads its own models). Owns velocity and risk-profile state
+    of every payer hashed to `partition`, so per-payer order holds.
+
+    Cross-partition graph updates: an edge and its payer's out-degree
+    belong to the payer's partition. A payee's in-degree is shared and
+    only ever changed by atomic `$inc`s, which Mongo merges at flush.
+    Workers therefore run without the graph cache, and they see other
+    partitions' in-degree increments from the next micro-batch on.
+    """
+    os.environ["CONSUMER_PARTITION"] = f"{partition}/{partitions}"
+    os.environ["GRAPH_CACHE_SIZE"] = "0"
+
+    try:
+        from consumers import upi_fraud_consumer as consumer
+
+        while True:
+            message = inbox.get()
+
+            if message is None:
+                consumer.velocity_store.snapshot()
+                outbox.put(("stopped", partition, None))
+                return
+
+            batch_id, events = message
+            started = time.monotonic()
+
+            consumer.process_batch(events)
+            consumer.velocity_store.maybe_snapshot()
+
+            outbox.put((
+                "done",
+                partition,
+                (batch_id, len(events), time.monotonic() - started)
+            ))
+
+    except Exception:
+        outbox.put(("error", partition, traceback.format_exc()))
+
+# =====================================================
+# SUPERVISOR
+# =====================================================
+class PartitionSupervisor:
+    """
+    Reads the queue, routes events by `payer_vpa` to worker processes
+    and commits the queue offset once every partition finished a batch
+    (batches are committed strictly in order).
+    """
+
+    def __init__(
+        self,
+        workers: int = WORKERS,
+        max_in_flight: int = MAX_IN_FLIGHT,
+        lag_report_interval_s: float = LAG_REPORT_INTERVAL_S,
+        outbox_poll_s: float = OUTBOX_POLL_S
+    ):
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self.lag_report_interval_s = lag_report_interval_s
+        self.outbox_poll_s = outbox_poll_s
+
+        ctx = mp.get_context("spawn")
+        self.outbox = ctx.Queue()
+        self.inboxes = [ctx.Queue() for _ in range(workers)]
+        self.processes = [
+            ctx.Process(
+                target=_worker_main,
+                args=(p, workers, self.inboxes[p], self.outbox),
+                daemon=True
+            )
+            for p in range(workers)
+        ]
+
+        # per-partition lag accounting
+        self.dispatched = [0] * workers
+        self.completed = [0] * workers
+        self.busy_s = [0.0] * workers
+
+        # batch_id -> [queue offset, partitions still working]
+        self.in_flight = {}
+        self.order = deque()
+        self._last_report = time.monotonic()
+
+    # --------------------------------------------------
+    # RUN
+    # --------------------------------------------------
+    def run(
+        self,
+        batch_size: int = BATCH_SIZE,
+        max_wait_ms: float = BATCH_MAX_WAIT_MS
+    ):
+        for proc in self.processes:
+            proc.start()
+
+        reader = QueueReader()
+        batches = 0
+
+        try:
+            for batch in iter_batches(reader, batch_size, max_wait_ms):
+                while len(self.in_flight) >= self.max_in_flight:
+                    self._handle(self._next_message(), reader)
+
+                self._dispatch(batches, batch, reader.position)
+                batches += 1
+                self._maybe_report()
+
+            while self.in_flight:
+                self._handle(self._next_message(), reader)
+
+        finally:
+            self._stop()
+
+        if not batches:
+            print("No events to process")
+            return
+
+        self.report()
+
+        segment = reader.rotate()
+        if segment:
+            print(f"Queue segment rotated to {segment}")
+
+    def _dispatch(self, batch_id: int, events: list[dict], offset: int):
+        parts = {}
+        for event in events:
+            p = partition_for(event["payer_vpa"], self.workers)
+            parts.setdefault(p, []).append(event)
+
+        self.in_flight[batch_id] = [offset, set(parts)]
+        self.order.append(batch_id)
+
+        for p, part in parts.items():
+            self.dispatched[p] += len(part)
+            self.inboxes[p].put((batch_id, part))
+
+    def _next_message(self):
+        """
+        Waits for a worker message. A worker that died without reporting
+        (killed, OOM, crash in the interpreter) fails the run instead of
+        hanging it; its batches stay uncommitted and are replayed.
+        """
+        while True:
+            try:
+                return self.outbox.get(timeout=self.outbox_poll_s)
+            except queue.Empty:
+                pass
+
+            for partition, proc in enumerate(self.processes):
+                if proc.is_alive():
+                    continue
+
+                # its last message may still be in the pipe
+                try:
+                    return self.outbox.get(timeout=self.outbox_poll_s)
+                except queue.Empty:
+                    raise RuntimeError(
+                        f"Partition {partition} worker exited "
+                        f"(exit code {proc.exitcode}) without reporting"
+                    ) from None
+
+    def _handle(self, message, reader: QueueReader):
+        kind, partition, payload = message
+
+        if kind == "error":
+            raise RuntimeError(
+                f"Partition {partition} worker failed:\n{payload}"
+            )
+        if kind != "done":
+            return
+
+        batch_id, n_events, elapsed = payload
+        self.completed[partition] += n_events
+        self.busy_s[partition] += elapsed
+        self.in_flight[batch_id][1].discard(partition)
+
+        # commit the longest fully processed prefix of batches
+        while self.order and not self.in_flight[self.order[0]][1]:
+            offset, _ = self.in_flight.pop(self.order.popleft())
+            reader.commit(offset)
+
+    def _stop(self):
+        for inbox, proc in zip(self.inboxes, self.processes):
+            if proc.is_alive():
+                inbox.put(None)
+
+        for proc in self.processes:
+            proc.join(timeout=30)
+            if proc.is_alive():
+                proc.terminate()
+
+    # --------------------------------------------------
+    # LAG REPORTING
+    # --------------------------------------------------
+    def lag(self) -> list[dict]:
+        return [
+            {
+                "partition": p,
+                "dispatched": self.dispatched[p],
+                "completed": self.completed[p],
+                "lag": self.dispatched[p] - self.completed[p],
+                "busy_s": round(self.busy_s[p], 3)
+            }
+            for p in range(self.workers)
+        ]
+
+    def report(self):
+        for row in self.lag():
+            print(
+                f"[SUPERVISOR] partition={row['partition']} | "
+                f"lag={row['lag']} | completed={row['completed']} | "
+                f"busy={row['busy_s']}s"
+            )
+
+    def _maybe_report(self):
+        if time.monotonic() - self._last_report >= self.lag_report_interval_s:
+            self.report()
+            self._last_report = time.monotonic()
+
+# =====================================================
+# ENTRY POINT
+# =====================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Partitioned UPI fraud consumer"
+    )
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=BATCH_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    # once, before the workers start
+    if os.getenv("MONGO_ENSURE_INDEXES", "1") == "1":
+        from storage.indexes import ensure_indexes
+        ensure_indexes()
+
+    PartitionSupervisor(workers=args.workers).run(
+        args.batch_size, args.max_wait_ms
+    )
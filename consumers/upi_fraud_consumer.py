@@ -1,24 +1,56 @@
-from event_queue.event_queue import read_events, clear_queue
-from audit.decision_log import log_decision
+from event_queue.event_queue import (
+    QueueReader,
+    iter_batches,
+    BATCH_SIZE,
+    BATCH_MAX_WAIT_MS
+)
+from audit.decision_log import get_audit_writer, LOG_DIR
 
 from storage.velocity_repo import VelocityStore
 from storage.risk_profile_repo import RiskProfileStore
 from storage.graph_repo import GraphStore
 from storage.processed_txn_store import ProcessedTransactionStore
+from storage.feature_store import PayerFeatureStore
+from storage.write_behind import WriteBehindBuffer
+from storage.indexes import ensure_indexes
 
 from state.decision_explainer import explain_decision
+from data.upi_schema import UPI_FEATURE_COLUMNS
+from inference.tree_engine import ChampionChallengerEngine
+from monitoring.metrics import STAGE_SECONDS, EVENTS, DECISIONS, SummaryReporter
+from monitoring.profiler import SamplingProfiler
 
+import argparse
 import joblib
+from typing import Callable
+import numpy as np
+import os
 from pathlib import Path
 import pandas as pd
 
 # =====================================================
 # GLOBAL STORES (STATEFUL)
 # =====================================================
-velocity_store = VelocityStore()
-risk_store = RiskProfileStore()
-graph_store = GraphStore()
-processed_store = ProcessedTransactionStore()
+# "index/count" when running as a worker of consumers.partitioned_consumer
+PARTITION = (
+    tuple(int(p) for p in os.environ["CONSUMER_PARTITION"].split("/"))
+    if os.getenv("CONSUMER_PARTITION") else None
+)
+
+# Mutations are buffered and bulk-written per micro-batch
+write_buffer = WriteBehindBuffer()
+
+# Background audit writer; partition workers each append to their own file
+audit_writer = get_audit_writer(
+    LOG_DIR / f"decision_log.p{PARTITION[0]}.jsonl" if PARTITION
+    else LOG_DIR / "decision_log.jsonl"
+)
+
+velocity_store = VelocityStore(writer=write_buffer, partition=PARTITION)
+risk_store = RiskProfileStore(writer=write_buffer)
+graph_store = GraphStore(writer=write_buffer)
+processed_store = ProcessedTransactionStore(writer=write_buffer)
+feature_store = PayerFeatureStore(writer=write_buffer)
 
 # =====================================================
 # LOAD MODELS (CHAMPION + CHALLENGER)
@@ -36,29 +68,69 @@ CHALLENGER_MODEL = joblib.load(
     MODEL_DIR / "upi_fraud_lgbm.pkl"
 )
 
+# Both models scored from one compiled tree evaluation
+# ("sklearn" falls back to two predict_proba calls)
+UPI_TREE_ENGINE = os.getenv("UPI_TREE_ENGINE", "compiled")
+
+ENGINE = (
+    ChampionChallengerEngine(CHAMPION_MODEL, CHALLENGER_MODEL)
+    if UPI_TREE_ENGINE == "compiled" else None
+)
+
 # =====================================================
 # FEATURE EXTRACTION
 # =====================================================
-def extract_upi_features(event: dict) -> tuple[pd.DataFrame, dict]:
+def build_feature_row(event: dict, velocity: dict, payer_features: dict) -> dict:
     now = pd.to_datetime(event["timestamp"])
 
-    velocity = velocity_store.get_features(
-        payer_vpa=event["payer_vpa"],
-        now=now
-    )
-
-    X = pd.DataFrame([{
+    return {
         "transaction_amount": event["amount"],
         "hour_of_day": now.hour,
         "day_of_week": now.weekday(),
         "transactions_last_1hr": velocity["transactions_last_1hr"],
         "transactions_last_24hr": velocity["transactions_last_24hr"],
         "avg_amount_last_7_days": velocity["avg_amount_last_7_days"],
-        "device_change_flag": 0,
-        "location_change_flag": 0,
-        "failed_attempts_last_1hr": 0,
-        "receiver_new_flag": 0
-    }])
+        **payer_features
+    }
+
+
+def get_payer_features(event: dict, now) -> dict:
+    return feature_store.get_features(
+        payer_vpa=event["payer_vpa"],
+        payee_vpa=event["payee_vpa"],
+        device_id=event["device_id"],
+        ip_address=event["ip_address"],
+        now=now
+    )
+
+
+def record_payer_features(event: dict, now):
+    feature_store.record(
+        payer_vpa=event["payer_vpa"],
+        payee_vpa=event["payee_vpa"],
+        device_id=event["device_id"],
+        ip_address=event["ip_address"],
+        timestamp=now,
+        status=event.get("status", "INITIATED")
+    )
+
+
+def extract_upi_features(
+    event: dict,
+    pending: list[dict] | None = None
+) -> tuple[pd.DataFrame, dict]:
+    now = pd.to_datetime(event["timestamp"])
+
+    velocity = velocity_store.get_features(
+        payer_vpa=event["payer_vpa"],
+        now=now,
+        pending=pending
+    )
+
+    X = pd.DataFrame(
+        [build_feature_row(event, velocity, get_payer_features(event, now))],
+        columns=UPI_FEATURE_COLUMNS
+    )
 
     return X, velocity
 
@@ -79,39 +151,125 @@ def compute_velocity_risk(event: dict, velocity: dict) -> float:
     return risk
 
 # =====================================================
-# MAIN CONSUMER LOOP
+# MICRO-BATCHING
 # =====================================================
-def consume_events():
-    events = read_events()
-
-    if not events:
-        print("No events to process")
-        return
+def batch_lookups(events: list[dict]) -> list[tuple[str, Callable, list]]:
+    """
+    Independent store reads of a micro-batch, one query each, as
+    (stage, fetch, keys). Run before prepare_batch so per-event reads
+    are served from memory; the sync loop runs them in turn, the async
+    runtime concurrently.
+    """
+    payers = [event["payer_vpa"] for event in events]
+
+    return [
+        ("idempotency_prefetch", processed_store.prefetch,
+         [(event["transaction_id"], pd.to_datetime(event["timestamp"]))
+          for event in events]),
+        ("risk_profile_prefetch", risk_store.prefetch, payers),
+        ("feature_store_prefetch", feature_store.prefetch, payers),
+        ("graph_prefetch", graph_store.prefetch,
+         [(event["payer_vpa"], event["payee_vpa"]) for event in events]),
+    ]
+
+
+def prepare_batch(events: list[dict]) -> list[tuple[dict, dict, dict]]:
+    """
+    Runs idempotency checks and feature extraction in event order.
+    Velocity of earlier events in the batch is overlaid on the stored
+    history, so features match the one-event-at-a-time loop.
+    """
+    prepared = []
+    seen = set()
+    pending = {}
 
     for event in events:
         txn_id = event["transaction_id"]
-
-        # 🔐 Idempotency
-        if processed_store.is_processed(txn_id):
+        now = pd.to_datetime(event["timestamp"])
+
+        # 🔐 Idempotency (store + duplicates inside this batch)
+        with STAGE_SECONDS.time("idempotency"):
+            duplicate = (
+                txn_id in seen or processed_store.is_processed(txn_id, now)
+            )
+        if duplicate:
+            EVENTS.inc("duplicate")
             print(f"[SKIP] Duplicate txn ignored | {txn_id}")
             continue
+        seen.add(txn_id)
+
+        payer_pending = pending.setdefault(event["payer_vpa"], [])
+
+        with STAGE_SECONDS.time("feature_extraction"):
+            velocity = velocity_store.get_features(
+                payer_vpa=event["payer_vpa"],
+                now=now,
+                pending=payer_pending
+            )
+            row = build_feature_row(
+                event, velocity, get_payer_features(event, now)
+            )
 
-        # 1️⃣ Feature extraction
-        X, velocity = extract_upi_features(event)
+        # later events of this payer in the batch see this one
+        record_payer_features(event, now)
 
-        # 2️⃣ MODEL SCORING
-        champion_prob = CHAMPION_MODEL.predict_proba(X)[0][1]
-        challenger_prob = CHALLENGER_MODEL.predict_proba(X)[0][1]
+        payer_pending.append({
+            "amount": event["amount"],
+            "timestamp": now
+        })
 
-        # 3️⃣ Velocity risk
-        velocity_risk = compute_velocity_risk(event, velocity)
+        prepared.append((event, velocity, row))
 
-        # 4️⃣ Final probability (Champion only)
-        final_prob = min(1.0, champion_prob + velocity_risk)
+    return prepared
 
-        # =================================================
-        # GRAPH INTELLIGENCE
-        # =================================================
+
+def score_batch(rows: list[dict]) -> tuple[list[float], list[float]]:
+    """
+    Champion and challenger probabilities for the whole batch.
+    """
+    if ENGINE is not None:
+        X = np.array(
+            [[row[c] for c in ENGINE.feature_names] for row in rows],
+            dtype=np.float64
+        )
+        with STAGE_SECONDS.time("model_champion_challenger"):
+            champion_probs, challenger_probs = ENGINE.predict(X)
+        return champion_probs.tolist(), challenger_probs.tolist()
+
+    X = pd.DataFrame(rows, columns=UPI_FEATURE_COLUMNS)
+
+    with STAGE_SECONDS.time("model_champion"):
+        champion_probs = CHAMPION_MODEL.predict_proba(X)[:, 1]
+    with STAGE_SECONDS.time("model_challenger"):
+        challenger_probs = CHALLENGER_MODEL.predict_proba(X)[:, 1]
+
+    return champion_probs.tolist(), challenger_probs.tolist()
+
+# =====================================================
+# PER-EVENT DECISION
+# =====================================================
+def decide_event(
+    event: dict,
+    velocity: dict,
+    champion_prob: float,
+    challenger_prob: float
+) -> dict:
+    """
+    Decides one event and queues its state mutations.
+    Returns the audit record; the caller writes it at the batch boundary.
+    """
+    txn_id = event["transaction_id"]
+
+    # 3️⃣ Velocity risk
+    velocity_risk = compute_velocity_risk(event, velocity)
+
+    # 4️⃣ Final probability (Champion only)
+    final_prob = min(1.0, champion_prob + velocity_risk)
+
+    # =================================================
+    # GRAPH INTELLIGENCE
+    # =================================================
+    with STAGE_SECONDS.time("graph_upsert"):
         graph_store.record_transaction(
             payer_vpa=event["payer_vpa"],
             payee_vpa=event["payee_vpa"],
@@ -119,36 +277,42 @@ def consume_events():
             timestamp=pd.to_datetime(event["timestamp"])
         )
 
-        payer_unique_payees = graph_store.get_unique_payees(event["payer_vpa"])
-        payee_unique_payers = graph_store.get_unique_payers(event["payee_vpa"])
-        edge_stats = graph_store.get_edge_stats(
+    with STAGE_SECONDS.time("graph_signals"):
+        signals = graph_store.get_graph_signals(
             event["payer_vpa"], event["payee_vpa"]
         )
-        edge_count = edge_stats["count"] if edge_stats else 0
-
-        graph_override = None
-        if payer_unique_payees >= 6:
-            graph_override = "PAYER_MULE_PATTERN"
-        elif payee_unique_payers >= 20:
-            graph_override = "SCAM_MERCHANT_PATTERN"
-        elif edge_count >= 4:
-            graph_override = "REPEATED_EDGE_ABUSE"
-
-        # =================================================
-        # DECISION ENGINE (CHAMPION ONLY)
-        # =================================================
+    payer_unique_payees = signals["payer_unique_payees"]
+    payee_unique_payers = signals["payee_unique_payers"]
+    edge_stats = signals["edge_stats"]
+    edge_count = edge_stats["count"] if edge_stats else 0
+
+    graph_override = None
+    if payer_unique_payees >= 6:
+        graph_override = "PAYER_MULE_PATTERN"
+    elif payee_unique_payers >= 20:
+        graph_override = "SCAM_MERCHANT_PATTERN"
+    elif edge_count >= 4:
+        graph_override = "REPEATED_EDGE_ABUSE"
+
+    # =================================================
+    # DECISION ENGINE (CHAMPION ONLY)
+    # =================================================
+    with STAGE_SECONDS.time("risk_profile_read"):
         thresholds = risk_store.get_thresholds(event["payer_vpa"])
 
-        if graph_override:
-            decision = "BLOCK"
-        elif final_prob >= thresholds["BLOCK"]:
-            decision = "BLOCK"
-        elif final_prob >= thresholds["STEP_UP"]:
-            decision = "STEP_UP_AUTH"
-        else:
-            decision = "ALLOW"
+    if graph_override:
+        decision = "BLOCK"
+    elif final_prob >= thresholds["BLOCK"]:
+        decision = "BLOCK"
+    elif final_prob >= thresholds["STEP_UP"]:
+        decision = "STEP_UP_AUTH"
+    else:
+        decision = "ALLOW"
 
-        # 🧠 Explainability
+    DECISIONS.inc(decision, graph_override or "none")
+
+    # 🧠 Explainability
+    with STAGE_SECONDS.time("explanation"):
         explanations = explain_decision(
             ml_prob=champion_prob,
             velocity=velocity,
@@ -161,44 +325,184 @@ def consume_events():
             final_decision=decision
         )
 
-        # Update risk profile
+    # Update risk profile
+    with STAGE_SECONDS.time("risk_profile_update"):
         risk_store.update(event["payer_vpa"], decision)
 
-        # =================================================
-        # AUDIT LOG (Champion vs Challenger)
-        # =================================================
-        log_decision({
-            "transaction_id": txn_id,
-            "payer_vpa": event["payer_vpa"],
-            "payee_vpa": event["payee_vpa"],
-            "amount": event["amount"],
-            "champion_probability": round(champion_prob, 6),
-            "challenger_probability": round(challenger_prob, 6),
-            "velocity_risk": round(velocity_risk, 3),
-            "final_probability": round(final_prob, 6),
-            "graph_override": graph_override,
-            "decision": decision,
-            "explanations": explanations
-        })
-
+    # =================================================
+    # AUDIT RECORD (Champion vs Challenger)
+    # =================================================
+    record = {
+        "transaction_id": txn_id,
+        "payer_vpa": event["payer_vpa"],
+        "payee_vpa": event["payee_vpa"],
+        "amount": event["amount"],
+        "champion_probability": round(champion_prob, 6),
+        "challenger_probability": round(challenger_prob, 6),
+        "velocity_risk": round(velocity_risk, 3),
+        "final_probability": round(final_prob, 6),
+        "graph_override": graph_override,
+        "decision": decision,
+        "explanations": explanations
+    }
+
+    with STAGE_SECONDS.time("processed_mark"):
         processed_store.mark_processed(txn_id, decision)
 
-        print(
-            f"[UPI] txn={txn_id} | decision={decision} | "
-            f"champion={champion_prob:.3f} | challenger={challenger_prob:.3f}"
-        )
+    print(
+        f"[UPI] txn={txn_id} | decision={decision} | "
+        f"champion={champion_prob:.3f} | challenger={challenger_prob:.3f}"
+    )
 
+    with STAGE_SECONDS.time("velocity_record"):
         velocity_store.record_transaction(
             payer_vpa=event["payer_vpa"],
             amount=event["amount"],
             timestamp=pd.to_datetime(event["timestamp"])
         )
 
-    clear_queue()
-    print("Queue cleared")
+    return record
+
+
+def decide_batch(
+    prepared: list[tuple[dict, dict, dict]],
+    champion_probs: list[float],
+    challenger_probs: list[float],
+    boundary: Callable[[list[dict]], None] | None = None
+) -> list[dict]:
+    """
+    Decisions and state updates, strictly in event order.
+
+    With `boundary`, a write buffer that became due (WRITE_BEHIND_FLUSH_SIZE
+    / interval) closes the boundary early, between two events, with the
+    records decided so far. Returns the records not handed to it.
+    """
+    records = []
+
+    for (event, velocity, _), champion_prob, challenger_prob in zip(
+        prepared, champion_probs, challenger_probs
+    ):
+        records.append(
+            decide_event(event, velocity, champion_prob, challenger_prob)
+        )
+
+        if boundary is not None and write_buffer.due:
+            boundary(records)
+            records = []
+
+    return records
+
+
+def flush_boundary(records: list[dict]):
+    """
+    Batch boundary: audit records and buffered state become durable
+    before the queue moves on. Audit first: once the state writes (and
+    processed marks) land, a replay skips these events, so their audit
+    records must already be on disk.
+    """
+    with STAGE_SECONDS.time("audit_enqueue"):
+        audit_writer.write_many(records)
+    with STAGE_SECONDS.time("audit_flush"):
+        audit_writer.flush()
+    with STAGE_SECONDS.time("write_behind_flush"):
+        write_buffer.flush()
+
+
+def process_batch(events: list[dict]) -> int:
+    # 0️⃣ Batch reads (one query per store)
+    for stage, fetch, keys in batch_lookups(events):
+        with STAGE_SECONDS.time(stage):
+            fetch(keys)
+
+    # 1️⃣ Feature extraction (in order, batch-aware)
+    prepared = prepare_batch(events)
+
+    if not prepared:
+        # nothing queued; drops the prefetched overlays
+        write_buffer.flush()
+        return 0
+
+    EVENTS.inc("processed", amount=len(prepared))
+
+    # 2️⃣ MODEL SCORING (one call per model)
+    champion_probs, challenger_probs = score_batch(
+        [row for _, _, row in prepared]
+    )
+
+    records = decide_batch(
+        prepared, champion_probs, challenger_probs, boundary=flush_boundary
+    )
+
+    # =================================================
+    # BATCH BOUNDARY (durable before the queue moves on)
+    # =================================================
+    flush_boundary(records)
+
+    return len(prepared)
+
+# =====================================================
+# MAIN CONSUMER LOOP
+# =====================================================
+def consume_events(
+    batch_size: int = BATCH_SIZE,
+    max_wait_ms: float = BATCH_MAX_WAIT_MS,
+    profiler: SamplingProfiler | None = None
+):
+    reader = QueueReader()
+    reporter = SummaryReporter()
+    batches = 0
+
+    if profiler is not None:
+        profiler.start()
+
+    try:
+        for batch in iter_batches(reader, batch_size, max_wait_ms):
+            process_batch(batch)
+            velocity_store.maybe_snapshot()
+
+            # Batch is durable – resume after it on restart
+            reader.commit()
+            batches += 1
+
+            reporter.maybe_report()
+            if profiler is not None:
+                profiler.on_batch()
+    finally:
+        if profiler is not None:
+            profiler.stop()
+
+    if not batches:
+        print("No events to process")
+        return
+
+    velocity_store.snapshot()
+    reporter.report()
+
+    segment = reader.rotate()
+    if segment:
+        print(f"Queue segment rotated to {segment}")
 
 # =====================================================
 # ENTRY POINT
 # =====================================================
 if __name__ == "__main__":
-    consume_events()
+    parser = argparse.ArgumentParser(description="UPI fraud consumer")
+    parser.add_argument("--profile", action="store_true",
+                        default=os.getenv("UPI_PROFILE", "0") == "1",
+                        help="sample stacks + allocations (see monitoring/profiler.py)")
+    parser.add_argument("--profile-seconds", type=float,
+                        help="profiling window (default UPI_PROFILE_SECONDS)")
+    args = parser.parse_args()
+
+    # Declared in storage/indexes.py; existing indexes are left alone
+    if os.getenv("MONGO_ENSURE_INDEXES", "1") == "1":
+        ensure_indexes()
+
+    profiler = None
+    if args.profile:
+        profiler = (
+            SamplingProfiler(duration_s=args.profile_seconds)
+            if args.profile_seconds else SamplingProfiler()
+        )
+
+    consume_events(profiler=profiler)
@@ -1,4 +1,12 @@
-from fastapi import FastAPI
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from dashboard.cache import ResponseCache
+from storage.indexes import ensure_indexes
+from storage.mongo import dashboard_db, close_clients
+from monitoring.metrics import instrument_app
 from dashboard.services import (
     get_recent_decisions,
     get_risk_summary,
@@ -7,31 +15,63 @@ from dashboard.services import (
     get_graph_risk_signals
 )
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if os.getenv("MONGO_ENSURE_INDEXES", "1") == "1":
+        await run_in_threadpool(ensure_indexes, dashboard_db)
+    yield
+    close_clients()
+
+
 app = FastAPI(
     title="UPI Fraud Ops Dashboard",
-    version="1.0"
+    version="1.0",
+    lifespan=lifespan
 )
 
+# Request latency + Prometheus /metrics
+instrument_app(app)
+
+# Shared by every analyst polling the dashboard
+cache = ResponseCache()
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 @app.get("/decisions/recent")
-def recent_decisions(limit: int = 50):
-    return get_recent_decisions(limit)
+def recent_decisions(request: Request, limit: int = 50):
+    return cache.respond(
+        request, "decisions_recent", (limit,),
+        lambda: get_recent_decisions(limit)
+    )
 
 @app.get("/summary")
-def summary():
-    return get_risk_summary()
+def summary(request: Request, start: datetime | None = None, end: datetime | None = None):
+    return cache.respond(
+        request, "summary", (start, end),
+        lambda: get_risk_summary(start, end)
+    )
 
 @app.get("/users/top-risky")
-def top_risky_users(limit: int = 10):
-    return get_top_risky_users(limit)
+def top_risky_users(request: Request, limit: int = 10):
+    return cache.respond(
+        request, "users_top_risky", (limit,),
+        lambda: get_top_risky_users(limit)
+    )
 
 @app.get("/alerts/velocity")
-def velocity_alerts():
-    return get_velocity_alerts()
+def velocity_alerts(request: Request):
+    return cache.respond(request, "alerts_velocity", (), get_velocity_alerts)
 
 @app.get("/alerts/graph")
-def graph_alerts():
-    return get_graph_risk_signals()
+def graph_alerts(request: Request):
+    return cache.respond(request, "alerts_graph", (), get_graph_risk_signals)
+
+@app.post("/cache/invalidate")
+def invalidate_cache(endpoint: str | None = None):
+    return {"invalidated": cache.invalidate(endpoint)}
+
+@app.get("/cache/metrics")
+def cache_metrics():
+    return cache.metrics()
@@ -0,0 +1,181 @@
+# dashboard/cache.py
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from storage.lru_cache import LRUCache
+
+# =====================================================
+# CONFIG
+# =====================================================
+DASHBOARD_CACHE_MAX_ENTRIES = int(os.getenv("DASHBOARD_CACHE_MAX_ENTRIES", 256))
+
+# Seconds an endpoint's response is served from the cache (0 = off)
+DASHBOARD_CACHE_TTLS = {
+    "decisions_recent": float(os.getenv("DASHBOARD_TTL_DECISIONS_RECENT_S", 2)),
+    "summary": float(os.getenv("DASHBOARD_TTL_SUMMARY_S", 5)),
+    "users_top_risky": float(os.getenv("DASHBOARD_TTL_USERS_TOP_RISKY_S", 10)),
+    "alerts_velocity": float(os.getenv("DASHBOARD_TTL_ALERTS_VELOCITY_S", 5)),
+    "alerts_graph": float(os.getenv("DASHBOARD_TTL_ALERTS_GRAPH_S", 30)),
+}
+
+
+def _etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+class _Entry:
+    __slots__ = ("body", "etag", "expires_at")
+
+    def __init__(self, body: bytes, etag: str, expires_at: float):
+        self.body = body
+        self.etag = etag
+        self.expires_at = expires_at
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+        self.error = None
+
+
+class ResponseCache:
+    """
+    Serialized JSON responses keyed by (endpoint, params).
+
+    - per-endpoint TTLs (DASHBOARD_CACHE_TTLS)
+    - concurrent misses for the same key share one query: the first
+      caller computes, the others wait for its result
+    - ETag / If-None-Match: unchanged bodies are answered with 304
+    - hit / miss / coalesced / not-modified counters per endpoint
+    """
+
+    def __init__(
+        self,
+        ttls: dict[str, float] = DASHBOARD_CACHE_TTLS,
+        max_entries: int = DASHBOARD_CACHE_MAX_ENTRIES
+    ):
+        self.ttls = ttls
+        self._entries = LRUCache(max_entries)
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+        self._metrics = {
+            endpoint: {"hits": 0, "misses": 0, "coalesced": 0, "not_modified": 0}
+            for endpoint in ttls
+        }
+
+    # --------------------------------------------------
+    # PUBLIC
+    # --------------------------------------------------
+    def respond(
+        self,
+        request: Request,
+        endpoint: str,
+        params: tuple,
+        compute: Callable[[], object]
+    ) -> Response:
+        entry, outcome = self._get(endpoint, params, compute)
+
+        headers = {
+            "ETag": entry.etag,
+            "Cache-Control": f"max-age={int(self.ttls.get(endpoint, 0))}",
+            "X-Cache": outcome.upper()
+        }
+
+        if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+            self._count(endpoint, "not_modified")
+            return Response(status_code=304, headers=headers)
+
+        return Response(
+            content=entry.body,
+            media_type="application/json",
+            headers=headers
+        )
+
+    def invalidate(self, endpoint: str | None = None) -> int:
+        """
+        Drops cached responses of one endpoint (or all of them).
+        """
+        with self._lock:
+            keys = [
+                key for key in self._entries.keys()
+                if endpoint is None or key[0] == endpoint
+            ]
+            for key in keys:
+                self._entries.pop(key)
+
+        return len(keys)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            per_endpoint = {e: dict(m) for e, m in self._metrics.items()}
+
+        for m in per_endpoint.values():
+            lookups = m["hits"] + m["misses"] + m["coalesced"]
+            m["hit_ratio"] = round(
+                (m["hits"] + m["coalesced"]) / lookups, 4
+            ) if lookups else 0.0
+
+        return {"entries": len(self._entries), "endpoints": per_endpoint}
+
+    # --------------------------------------------------
+    # INTERNALS
+    # --------------------------------------------------
+    def _get(self, endpoint: str, params: tuple, compute) -> tuple[_Entry, str]:
+        key = (endpoint, params)
+        ttl = self.ttls.get(endpoint, 0)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > time.monotonic():
+                self._metrics[endpoint]["hits"] += 1
+                return entry, "hit"
+
+            inflight = self._inflight.get(key)
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight[key] = _InFlight()
+                self._metrics[endpoint]["misses"] += 1
+            else:
+                self._metrics[endpoint]["coalesced"] += 1
+
+        if not leader:
+            inflight.done.wait()
+            if inflight.error is not None:
+                raise inflight.error
+            return inflight.entry, "coalesced"
+
+        try:
+            body = json.dumps(jsonable_encoder(compute())).encode("utf-8")
+            inflight.entry = _Entry(
+                body,
+                f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+                time.monotonic() + ttl
+            )
+        except Exception as e:
+            inflight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                if inflight.entry is not None and ttl > 0:
+                    self._entries.put(key, inflight.entry)
+            inflight.done.set()
+
+        return inflight.entry, "miss"
+
+    def _count(self, endpoint: str, counter: str):
+        with self._lock:
+            self._metrics[endpoint][counter] += 1
@@ -1,16 +1,20 @@
+from datetime import datetime
 from fastapi import APIRouter
-from storage.mongo import db
+from storage.decision_counters import DecisionCounterStore
+from storage.mongo import dashboard_db
 
 router = APIRouter()
 
+decision_counters = DecisionCounterStore(database=dashboard_db)
+
 @router.get("/summary")
-def system_metrics():
-    col = db["decision_logs"]
+def system_metrics(start: datetime | None = None, end: datetime | None = None):
+    counts = decision_counters.summarize(start, end)
 
-    total = col.count_documents({})
-    blocked = col.count_documents({"decision": "BLOCK"})
-    step_up = col.count_documents({"decision": "STEP_UP_AUTH"})
-    allowed = col.count_documents({"decision": "ALLOW"})
+    total = counts["total"]
+    blocked = counts["BLOCK"]
+    step_up = counts["STEP_UP_AUTH"]
+    allowed = counts["ALLOW"]
 
     return {
         "total_transactions": total,
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from storage.mongo import db
+from storage.mongo import dashboard_db as db
 
 router = APIRouter()
 
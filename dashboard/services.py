@@ -1,4 +1,5 @@
-from storage.mongo import db
+from storage.mongo import dashboard_db as db
+from storage.decision_counters import DecisionCounterStore
 from datetime import datetime, timedelta
 
 # =====================================================
@@ -9,6 +10,8 @@ risk_col = db["upi_risk_profiles"]
 velocity_col = db["upi_velocity"]
 graph_col = db["upi_graph_edges"]
 
+decision_counters = DecisionCounterStore(database=db)
+
 # =====================================================
 # GRAPH STORE (PERSISTENT)
 # =====================================================
@@ -63,16 +66,18 @@ def get_recent_decisions(limit: int = 50):
     return list(
         audit_col
         .find({}, {"_id": 0})
-        .sort("timestamp", -1)
+        .sort("logged_at", -1)
         .limit(limit)
     )
 
 
-def get_risk_summary():
-    total = audit_col.count_documents({})
-    blocked = audit_col.count_documents({"decision": "BLOCK"})
-    step_up = audit_col.count_documents({"decision": "STEP_UP_AUTH"})
-    allowed = audit_col.count_documents({"decision": "ALLOW"})
+def get_risk_summary(start: datetime | None = None, end: datetime | None = None):
+    counts = decision_counters.summarize(start, end)
+
+    total = counts["total"]
+    blocked = counts["BLOCK"]
+    step_up = counts["STEP_UP_AUTH"]
+    allowed = counts["ALLOW"]
 
     return {
         "total_transactions": total,
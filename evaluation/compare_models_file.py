@@ -1,43 +1,53 @@
 # evaluation/compare_models_file.py
 
-import json
-from pathlib import Path
+import pandas as pd
+
+from audit.archive import compact_segments, load_decisions
+from feedback.fraud_feedback_ingestor import FEEDBACK_FILE
+
+COLUMNS = ["transaction_id", "decision", "challenger_decision", "actual_outcome"]
+
+
+def load_outcomes() -> pd.DataFrame:
+    """
+    Audit decisions with their confirmed outcome. Outcomes recorded in
+    the audit record win; otherwise they come from the feedback log.
+    """
+    compact_segments()
+    df = load_decisions(COLUMNS)
+
+    if FEEDBACK_FILE.exists() and not df.empty:
+        feedback = pd.read_json(FEEDBACK_FILE, lines=True)
+        if not feedback.empty:
+            outcomes = (
+                feedback.drop_duplicates("transaction_id", keep="last")
+                .set_index("transaction_id")["actual_outcome"]
+            )
+            df["actual_outcome"] = (
+                df["actual_outcome"].astype(object)
+                .fillna(df["transaction_id"].map(outcomes))
+            )
+
+    return df[df["actual_outcome"].notna()]
 
-AUDIT_LOG = Path("audit_logs/upi_decisions.log")
 
 def evaluate():
-    if not AUDIT_LOG.exists():
-        print("❌ Audit log not found")
+    df = load_outcomes()
+
+    if df.empty:
+        print("❌ No audited decisions with outcomes found")
         return
 
-    total = 0
-    champ_hits = 0
-    chall_hits = 0
-    champ_fp = 0
-    chall_fp = 0
-
-    with open(AUDIT_LOG, "r") as f:
-        for line in f:
-            record = json.loads(line)
-            if "actual_outcome" not in record:
-                continue
-
-            total += 1
-            actual = record["actual_outcome"]      # FRAUD / GENUINE
-            champ = record.get("decision")
-            chall = record.get("challenger_decision")
-
-            if actual == "FRAUD":
-                if champ == "BLOCK":
-                    champ_hits += 1
-                if chall == "BLOCK":
-                    chall_hits += 1
-
-            if actual == "GENUINE":
-                if champ == "BLOCK":
-                    champ_fp += 1
-                if chall == "BLOCK":
-                    chall_fp += 1
+    fraud = (df["actual_outcome"] == "FRAUD").to_numpy()
+    genuine = (df["actual_outcome"] == "GENUINE").to_numpy()
+    champ_block = (df["decision"] == "BLOCK").to_numpy()
+    chall_block = (df["challenger_decision"] == "BLOCK").to_numpy()
+
+    total = len(df)
+    champ_hits = int((fraud & champ_block).sum())
+    chall_hits = int((fraud & chall_block).sum())
+    champ_fp = int((genuine & champ_block).sum())
+    chall_fp = int((genuine & chall_block).sum())
 
     print("\n📊 CHAMPION vs CHALLENGER EVALUATION (FILE)")
     print("-" * 50)
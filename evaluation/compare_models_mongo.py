@@ -1,43 +1,39 @@
 # evaluation/compare_models_mongo.py
 
-from storage.mongo import db
+from storage.mongo import batch_db as db
 
 audit_col = db["audit_decisions"]
 
+def _count(outcome: str, field: str) -> dict:
+    return {"$sum": {"$cond": [
+        {"$and": [
+            {"$eq": ["$actual_outcome", outcome]},
+            {"$eq": [f"${field}", "BLOCK"]}
+        ]},
+        1,
+        0
+    ]}}
+
+
 def evaluate():
-    cursor = audit_col.find(
-        {"actual_outcome": {"$exists": True}},
-        {
-            "decision": 1,
-            "challenger_decision": 1,
-            "actual_outcome": 1,
-            "_id": 0
-        }
-    )
-
-    total = 0
-    champ_hits = 0
-    chall_hits = 0
-    champ_fp = 0
-    chall_fp = 0
-
-    for r in cursor:
-        total += 1
-        actual = r["actual_outcome"]
-        champ = r.get("decision")
-        chall = r.get("challenger_decision")
-
-        if actual == "FRAUD":
-            if champ == "BLOCK":
-                champ_hits += 1
-            if chall == "BLOCK":
-                chall_hits += 1
-
-        if actual == "GENUINE":
-            if champ == "BLOCK":
-                champ_fp += 1
-            if chall == "BLOCK":
-                chall_fp += 1
+    # counted server-side in one pass instead of streaming every record
+    result = next(audit_col.aggregate([
+        {"$match": {"actual_outcome": {"$exists": True}}},
+        {"$group": {
+            "_id": None,
+            "total": {"$sum": 1},
+            "champ_hits": _count("FRAUD", "decision"),
+            "chall_hits": _count("FRAUD", "challenger_decision"),
+            "champ_fp": _count("GENUINE", "decision"),
+            "chall_fp": _count("GENUINE", "challenger_decision")
+        }}
+    ]), {})
+
+    total = result.get("total", 0)
+    champ_hits = result.get("champ_hits", 0)
+    chall_hits = result.get("chall_hits", 0)
+    champ_fp = result.get("champ_fp", 0)
+    chall_fp = result.get("chall_fp", 0)
 
     print("\n📊 CHAMPION vs CHALLENGER EVALUATION (MONGO)")
     print("-" * 55)
@@ -1,23 +1,202 @@
 import json
+import os
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
+from typing import Iterable, Iterator
 
-QUEUE_FILE = Path("queue/upi_events.jsonl")
+try:
+    import fcntl
+except ImportError:  # Windows: single producer only
+    fcntl = None
+
+QUEUE_DIR = Path(os.getenv("UPI_QUEUE_DIR", "queue"))
+QUEUE_FILE = QUEUE_DIR / "upi_events.jsonl"
+OFFSET_FILE = QUEUE_DIR / "upi_events.offset"
+LOCK_FILE = QUEUE_DIR / "upi_events.lock"
+SEGMENT_DIR = QUEUE_DIR / "segments"
+
+BATCH_SIZE = int(os.getenv("CONSUMER_BATCH_SIZE", 256))
+BATCH_MAX_WAIT_MS = float(os.getenv("CONSUMER_BATCH_MAX_WAIT_MS", 50))
+
+
+# --------------------------------------------------
+# PARTITIONING
+# --------------------------------------------------
+def partition_for(key: str, partitions: int) -> int:
+    """
+    Stable across processes and restarts (unlike hash()).
+    """
+    return zlib.crc32(key.encode("utf-8")) % partitions
+
+
+# --------------------------------------------------
+# PRODUCER SIDE
+# --------------------------------------------------
+@contextmanager
+def _queue_lock():
+    """
+    Exclusive lock shared by producers (append) and the consumer
+    (segment rotation).
+    """
+    QUEUE_DIR.mkdir(parents=True, exist_ok=True)
+
+    with open(LOCK_FILE, "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
 
 
 def push_event(event: dict):
-    QUEUE_FILE.parent.mkdir(exist_ok=True)
-    with open(QUEUE_FILE, "a") as f:
-        f.write(json.dumps(event, default=str) + "\n")
+    line = (json.dumps(event, default=str) + "\n").encode("utf-8")
+
+    with _queue_lock():
+        with open(QUEUE_FILE, "ab") as f:
+            f.write(line)
+
+
+# --------------------------------------------------
+# CONSUMER SIDE
+# --------------------------------------------------
+class QueueReader:
+    """
+    Streams events from the active queue file starting at the last
+    committed byte offset.
+
+    The offset is stored with the file's identity (device + inode), so
+    after a rotation or a crash the reader never applies an offset to
+    the wrong file. Fully consumed files are rotated into
+    `queue/segments/` instead of being deleted.
+    """
+
+    def __init__(self, path: Path = QUEUE_FILE, offset_path: Path = OFFSET_FILE):
+        self.path = Path(path)
+        self.offset_path = Path(offset_path)
+        self.position = self._load_offset()
+        self.committed = self.position
+
+    def __iter__(self):
+        if not self.path.exists():
+            return
+
+        with open(self.path, "rb") as f:
+            f.seek(self.position)
+
+            for line in f:
+                # a producer may be halfway through this line
+                if not line.endswith(b"\n"):
+                    break
+
+                self.position += len(line)
+
+                if line.strip():
+                    yield json.loads(line)
+
+    # --------------------------------------------------
+    # OFFSETS
+    # --------------------------------------------------
+    def commit(self, position: int | None = None):
+        """
+        Durably records that every event up to `position` (default:
+        everything handed out so far) is processed.
+        """
+        if position is None:
+            position = self.position
+        if position == self.committed:
+            return
+
+        self._write_offset(self._file_id(), position)
+        self.committed = position
+
+    def rotate(self) -> Path | None:
+        """
+        Moves the active file into the segment archive once every
+        event in it was committed. Events appended meanwhile stay in
+        the active file for the next run.
+        """
+        with _queue_lock():
+            if not self.path.exists():
+                return None
+            if os.path.getsize(self.path) != self.committed:
+                return None
+
+            SEGMENT_DIR.mkdir(parents=True, exist_ok=True)
+            segment = SEGMENT_DIR / (
+                f"{self.path.stem}-{datetime.utcnow():%Y%m%dT%H%M%S%f}.jsonl"
+            )
+            os.replace(self.path, segment)
+
+            self._write_offset(None, 0)
+            self.position = self.committed = 0
+
+        return segment
+
+    def _file_id(self) -> list | None:
+        if not self.path.exists():
+            return None
+        st = os.stat(self.path)
+        return [st.st_dev, st.st_ino]
+
+    def _load_offset(self) -> int:
+        if not self.offset_path.exists():
+            return 0
+
+        with open(self.offset_path, "r") as f:
+            state = json.load(f)
+
+        file_id = self._file_id()
+        if file_id is None or state.get("file_id") != file_id:
+            return 0
+
+        return state["offset"]
+
+    def _write_offset(self, file_id: list | None, offset: int):
+        self.offset_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.offset_path.with_suffix(".tmp")
+
+        with open(tmp, "w") as f:
+            json.dump({"file_id": file_id, "offset": offset}, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp, self.offset_path)
+
+
+def iter_batches(
+    events: Iterable[dict],
+    batch_size: int = BATCH_SIZE,
+    max_wait_ms: float = BATCH_MAX_WAIT_MS
+) -> Iterator[list[dict]]:
+    """
+    Groups events into micro-batches of at most `batch_size` events,
+    closing a batch early once `max_wait_ms` passed since its first event.
+    """
+    batch = []
+    deadline = 0.0
+
+    for event in events:
+        if not batch:
+            deadline = time.monotonic() + max_wait_ms / 1000
 
+        batch.append(event)
 
-def read_events():
-    if not QUEUE_FILE.exists():
-        return []
+        if len(batch) >= batch_size or time.monotonic() >= deadline:
+            yield batch
+            batch = []
 
-    with open(QUEUE_FILE, "r") as f:
-        return [json.loads(line) for line in f]
+    if batch:
+        yield batch
 
 
-def clear_queue():
-    if QUEUE_FILE.exists():
-        QUEUE_FILE.unlink()
+def read_events() -> list[dict]:
+    """
+    Uncommitted events of the active queue file (materialized).
+    Prefer iterating a QueueReader directly.
+    """
+    return list(QueueReader())
@@ -0,0 +1,67 @@
+# inference/anomaly.py
+
+import numpy as np
+
+# Legacy fraud_knn.pkl bundles (no index threshold) keep the old rule
+LEGACY_KNN_MEAN_THRESHOLD = 3.0
+
+
+class HybridAnomalyScorer:
+    """
+    Isolation Forest and kNN-distance anomaly scores for a batch of
+    credit-card rows (FEATURE_COLUMNS order).
+
+    Isolation Forest: `score_samples` is computed once and the anomaly
+    flag derived from it (`score < offset_`, what `predict` does
+    internally), so the forest is traversed a single time.
+
+    kNN: the bundle written by `training/train_knn.py` holds a ball-tree
+    index over a sample of normal transactions and the k-distance
+    threshold calibrated on held-out normals. The score is the mean
+    euclidean distance (in scaled space) to the k nearest normals.
+    """
+
+    def __init__(self, iso_forest=None, knn_bundle: dict | None = None):
+        self.iso_forest = iso_forest
+        self.knn_bundle = knn_bundle
+
+    def score(self, X) -> list[dict]:
+        """
+        X: DataFrame with FEATURE_COLUMNS (the models were fitted on one).
+        """
+        n = len(X)
+
+        iso_scores = np.zeros(n)
+        iso_anomaly = np.zeros(n, dtype=bool)
+
+        if self.iso_forest is not None:
+            samples = self.iso_forest.score_samples(X)
+            iso_scores = -samples
+            iso_anomaly = samples < self.iso_forest.offset_
+
+        knn_distance = np.full(n, np.nan)
+        knn_anomaly = np.zeros(n, dtype=bool)
+
+        if self.knn_bundle is not None:
+            X_scaled = self.knn_bundle["scaler"].transform(X)
+
+            if "threshold" in self.knn_bundle:
+                distances, _ = self.knn_bundle["model"].kneighbors(
+                    X_scaled, n_neighbors=self.knn_bundle["k"]
+                )
+                knn_distance = distances.mean(axis=1)
+                knn_anomaly = knn_distance > self.knn_bundle["threshold"]
+            else:
+                knn_anomaly = X_scaled.mean(axis=1) > LEGACY_KNN_MEAN_THRESHOLD
+
+        return [
+            {
+                "isolation_forest_score": float(iso_scores[i]),
+                "isolation_forest_anomaly": bool(iso_anomaly[i]),
+                "knn_distance": (
+                    None if np.isnan(knn_distance[i]) else float(knn_distance[i])
+                ),
+                "knn_anomaly": bool(knn_anomaly[i])
+            }
+            for i in range(n)
+        ]
@@ -0,0 +1,91 @@
+# inference/native_booster.py
+
+import numpy as np
+
+from data.schema import FEATURE_COLUMNS
+
+
+class NativeBoosterScorer:
+    """
+    Scores credit-card transactions without the sklearn Pipeline.
+
+    The artifact produced by `training/export_native_models.py` holds the
+    raw LightGBM / XGBoost booster and the StandardScaler's mean / scale
+    arrays. Rows are standardized with plain numpy and handed straight
+    to the booster, skipping DataFrame / ColumnTransformer validation.
+    Inputs are rows in FEATURE_COLUMNS order (float32 or float64).
+    """
+
+    def __init__(self, kind: str, booster, mean: np.ndarray, scale: np.ndarray):
+        self.kind = kind
+        self.booster = booster
+        self.mean = np.ascontiguousarray(mean, dtype=np.float64)
+        self.scale = np.ascontiguousarray(scale, dtype=np.float64)
+
+    # --------------------------------------------------
+    # ARTIFACT
+    # --------------------------------------------------
+    @classmethod
+    def from_artifact(cls, artifact: dict) -> "NativeBoosterScorer":
+        if artifact["feature_columns"] != FEATURE_COLUMNS:
+            raise ValueError("Native artifact was exported for other features")
+
+        if artifact["kind"] == "lightgbm":
+            import lightgbm as lgb
+            booster = lgb.Booster(model_str=artifact["booster"])
+        elif artifact["kind"] == "xgboost":
+            import xgboost as xgb
+            booster = xgb.Booster()
+            booster.load_model(bytearray(artifact["booster"]))
+        else:
+            raise ValueError(f"Unknown booster kind: {artifact['kind']}")
+
+        return cls(artifact["kind"], booster, artifact["mean"], artifact["scale"])
+
+    @staticmethod
+    def export(pipeline) -> dict:
+        """
+        Builds the artifact from a fitted Pipeline(preprocessor, model).
+        """
+        preprocessor = pipeline.named_steps["preprocessor"]
+        scaler = preprocessor.named_transformers_["num"]
+        model = pipeline.named_steps["model"]
+
+        if hasattr(model, "booster_"):
+            kind = "lightgbm"
+            booster = model.booster_.model_to_string()
+        elif hasattr(model, "get_booster"):
+            kind = "xgboost"
+            booster = bytes(model.get_booster().save_raw(raw_format="json"))
+        else:
+            raise ValueError(f"Unsupported model: {type(model).__name__}")
+
+        return {
+            "kind": kind,
+            "feature_columns": list(FEATURE_COLUMNS),
+            "mean": np.asarray(scaler.mean_, dtype=np.float64),
+            "scale": np.asarray(scaler.scale_, dtype=np.float64),
+            "booster": booster
+        }
+
+    # --------------------------------------------------
+    # SCORING
+    # --------------------------------------------------
+    def predict_proba(self, X) -> np.ndarray:
+        """
+        Fraud probability for each row of X (n_rows x n_features or a
+        single 1-D row).
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        Z = (X - self.mean) / self.scale
+
+        if self.kind == "lightgbm":
+            return self.booster.predict(Z)
+
+        return self.booster.inplace_predict(Z)
+
+    def predict_one(self, row) -> float:
+        return float(self.predict_proba(row)[0])
@@ -0,0 +1,217 @@
+# inference/tree_engine.py
+
+import numpy as np
+
+# LightGBM missing-value handling per split
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+MISSING_TYPES = {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+
+# LightGBM's kZeroThreshold
+ZERO_THRESHOLD = 1e-35
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+class CompiledTreeEnsemble:
+    """
+    A binary LightGBM booster flattened into NumPy node arrays.
+
+    All trees share one set of arrays; leaves point to themselves, so a
+    batch is evaluated by advancing every (row, tree) cursor `max_depth`
+    times with fancy indexing and summing the reached leaf values.
+    Split semantics (`<=`, missing types, default direction) follow
+    LightGBM's numerical decision; categorical splits are not supported.
+    """
+
+    def __init__(self, dump: dict):
+        if dump.get("num_tree_per_iteration", 1) != 1:
+            raise ValueError("Only binary boosters can be compiled")
+
+        self.feature_names = list(dump["feature_names"])
+        self.sigmoid_scale = self._parse_sigmoid(dump.get("objective", ""))
+
+        feature, threshold, left, right = [], [], [], []
+        value, default_left, missing = [], [], []
+        roots, depth = [], 0
+
+        def add(node: dict, level: int) -> int:
+            nonlocal depth
+            idx = len(feature)
+
+            feature.append(0)
+            threshold.append(0.0)
+            left.append(idx)
+            right.append(idx)
+            value.append(0.0)
+            default_left.append(True)
+            missing.append(MISSING_NONE)
+
+            if "leaf_value" in node:
+                value[idx] = node["leaf_value"]
+                depth = max(depth, level)
+                return idx
+
+            if node.get("decision_type", "<=") != "<=":
+                raise ValueError("Categorical splits are not supported")
+
+            feature[idx] = node["split_feature"]
+            threshold[idx] = node["threshold"]
+            default_left[idx] = node.get("default_left", True)
+            missing[idx] = MISSING_TYPES[node.get("missing_type", "None")]
+            left[idx] = add(node["left_child"], level + 1)
+            right[idx] = add(node["right_child"], level + 1)
+            return idx
+
+        for tree in dump["tree_info"]:
+            roots.append(add(tree["tree_structure"], 0))
+
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.missing = np.asarray(missing, dtype=np.int8)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.max_depth = depth
+
+    @classmethod
+    def from_lightgbm(cls, model) -> "CompiledTreeEnsemble":
+        booster = getattr(model, "booster_", model)
+        return cls(booster.dump_model())
+
+    @staticmethod
+    def _parse_sigmoid(objective: str) -> float:
+        # e.g. "binary sigmoid:1"
+        if not objective.startswith("binary"):
+            raise ValueError(f"Unsupported objective: {objective!r}")
+
+        for part in objective.split()[1:]:
+            if part.startswith("sigmoid:"):
+                return float(part.split(":", 1)[1])
+        return 1.0
+
+    # --------------------------------------------------
+    # EVALUATION
+    # --------------------------------------------------
+    def margin(self, X: np.ndarray) -> np.ndarray:
+        """
+        Raw score (sum of leaf values) for each row of X, columns in
+        `feature_names` order.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[node]]
+            missing = self.missing[node]
+
+            x = np.where(np.isnan(x) & (missing != MISSING_NAN), 0.0, x)
+            is_missing = (
+                ((missing == MISSING_ZERO) & (np.abs(x) <= ZERO_THRESHOLD))
+                | ((missing == MISSING_NAN) & np.isnan(x))
+            )
+            go_left = np.where(
+                is_missing, self.default_left[node], x <= self.threshold[node]
+            )
+
+            node = np.where(go_left, self.left[node], self.right[node])
+
+        return self.value[node].sum(axis=1)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        return _sigmoid(self.sigmoid_scale * self.margin(X))
+
+
+class ChampionChallengerEngine:
+    """
+    Scores the UPI champion (sigmoid-calibrated LightGBM) and challenger
+    (raw LightGBM) from one tree evaluation.
+
+    The calibrated model from `training/train_upi_calibrated.py` is a
+    prefit CalibratedClassifierCV around the challenger's booster, so
+    champion = 1 / (1 + exp(a * f + b)) where f is the calibrator's
+    input (the challenger probability, or the margin if the estimator
+    exposes decision_function). If the two pickles no longer wrap the
+    same booster, the champion's trees are compiled and evaluated
+    separately.
+    """
+
+    def __init__(self, champion, challenger):
+        self.challenger = CompiledTreeEnsemble.from_lightgbm(challenger)
+
+        if len(champion.calibrated_classifiers_) != 1:
+            raise ValueError("Expected a prefit (single) calibrated classifier")
+
+        calibrated = champion.calibrated_classifiers_[0]
+        estimator = calibrated.estimator
+        calibrator = calibrated.calibrators[0]
+
+        if not hasattr(calibrator, "a_"):
+            raise ValueError("Only sigmoid calibration can be compiled")
+
+        self.a = float(calibrator.a_)
+        self.b = float(calibrator.b_)
+        self.calibrate_margin = hasattr(estimator, "decision_function")
+
+        self.shared_booster = (
+            self._model_string(estimator) == self._model_string(challenger)
+        )
+        self.champion_base = (
+            self.challenger if self.shared_booster
+            else CompiledTreeEnsemble.from_lightgbm(estimator)
+        )
+
+        if self.champion_base.feature_names != self.challenger.feature_names:
+            raise ValueError("Champion and challenger use different features")
+
+        self.feature_names = self.challenger.feature_names
+
+    @staticmethod
+    def _model_string(model) -> str:
+        return getattr(model, "booster_", model).model_to_string()
+
+    def predict(self, X: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (champion, challenger) fraud probabilities for each row of X.
+        """
+        margin = self.challenger.margin(X)
+        challenger = _sigmoid(self.challenger.sigmoid_scale * margin)
+
+        if not self.shared_booster:
+            margin = self.champion_base.margin(X)
+            base = self.champion_base.sigmoid_scale * margin
+        else:
+            base = self.challenger.sigmoid_scale * margin
+
+        f = base if self.calibrate_margin else _sigmoid(base)
+        champion = 1.0 / (1.0 + np.exp(self.a * f + self.b))
+
+        return champion, challenger
+
+
+if __name__ == "__main__":
+    # Compare the engine against the sklearn models on the UPI dataset
+    import joblib
+    import pandas as pd
+    from pathlib import Path
+
+    base_dir = Path(__file__).resolve().parent.parent
+    champion_model = joblib.load(base_dir / "models" / "upi_fraud_lgbm_calibrated.pkl")
+    challenger_model = joblib.load(base_dir / "models" / "upi_fraud_lgbm.pkl")
+
+    engine = ChampionChallengerEngine(champion_model, challenger_model)
+
+    df = pd.read_csv(base_dir / "data" / "upi_fraud_data.csv").head(20_000)
+    X = df[engine.feature_names]
+
+    champion, challenger = engine.predict(X.to_numpy(dtype=np.float64))
+
+    print(f"shared booster: {engine.shared_booster}")
+    print("champion max diff:",
+          np.max(np.abs(champion - champion_model.predict_proba(X)[:, 1])))
+    print("challenger max diff:",
+          np.max(np.abs(challenger - challenger_model.predict_proba(X)[:, 1])))
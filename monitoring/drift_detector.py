@@ -1,6 +1,8 @@
 import json
+import os
 from pathlib import Path
-from collections import deque
+
+import numpy as np
 
 from state.threshold_controller import adjust_global_thresholds
 
@@ -9,36 +11,48 @@ FEEDBACK_FILE = BASE_DIR / "feedback" / "data" / "fraud_feedback.log"
 
 WINDOW_SIZE = 100
 
+READ_CHUNK = 64 * 1024
+
+
+def tail_lines(path: Path, n: int) -> list[bytes]:
+    """
+    Last `n` complete lines, read backwards from the end of the file
+    instead of parsing all of it.
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        data = b""
+
+        while end > 0 and data.count(b"\n") <= n:
+            start = max(0, end - READ_CHUNK)
+            f.seek(start)
+            data = f.read(end - start) + data
+            end = start
+
+    lines = [line for line in data.splitlines() if line.strip()]
+    if end > 0:
+        lines = lines[1:]   # first line may be cut off
+
+    return lines[-n:]
+
+
 def detect_drift():
     if not FEEDBACK_FILE.exists():
         print("No feedback data yet")
         return
 
-    recent = deque(maxlen=WINDOW_SIZE)
-
-    with open(FEEDBACK_FILE, "r") as f:
-        for line in f:
-            recent.append(json.loads(line))
+    recent = [json.loads(line) for line in tail_lines(FEEDBACK_FILE, WINDOW_SIZE)]
 
     if len(recent) < 20:
         print("Not enough data for drift detection")
         return
 
-    false_negatives = 0
-    false_positives = 0
-
-    for r in recent:
-        decision = r["final_decision"]
-        actual = r["actual_outcome"]
-
-        if decision == "ALLOW" and actual == "FRAUD":
-            false_negatives += 1
-
-        if decision == "BLOCK" and actual == "GENUINE":
-            false_positives += 1
+    decision = np.array([r["final_decision"] for r in recent])
+    actual = np.array([r["actual_outcome"] for r in recent])
 
-    fn_rate = false_negatives / len(recent)
-    fp_rate = false_positives / len(recent)
+    fn_rate = np.mean((decision == "ALLOW") & (actual == "FRAUD"))
+    fp_rate = np.mean((decision == "BLOCK") & (actual == "GENUINE"))
 
     print(f"[DRIFT CHECK] FN={fn_rate:.2%} | FP={fp_rate:.2%}")
 
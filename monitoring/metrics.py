@@ -0,0 +1,407 @@
+# monitoring/metrics.py
+
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# =====================================================
+# CONFIG
+# =====================================================
+METRICS_SUMMARY_INTERVAL_S = float(os.getenv("METRICS_SUMMARY_INTERVAL_S", 60))
+
+# upper bounds in seconds (+Inf is implicit)
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def values(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for label_values, value in sorted(self.values().items()):
+            lines.append(
+                f"{self.name}{_format_labels(self.labels, label_values)} "
+                f"{_format_value(value)}"
+            )
+        return lines
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+
+# thread id -> innermost running stage of a `track_active` histogram
+# (read by monitoring.profiler to attribute samples)
+ACTIVE_STAGES = {}
+
+
+class _Timer:
+    __slots__ = ("histogram", "label_values", "started", "outer")
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        if self.histogram.track_active:
+            tid = threading.get_ident()
+            self.outer = ACTIVE_STAGES.get(tid)
+            ACTIVE_STAGES[tid] = self.label_values[0]
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(
+            time.perf_counter() - self.started, *self.label_values
+        )
+        if self.histogram.track_active:
+            ACTIVE_STAGES[threading.get_ident()] = self.outer
+        return False
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram: one bisect and three increments per
+    observation, no samples kept. Quantiles are estimated from the
+    buckets (linear within a bucket).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple = (),
+        buckets: tuple = LATENCY_BUCKETS,
+        track_active: bool = False
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.track_active = track_active
+        # label values -> [bucket counts (+Inf last), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        i = bisect_left(self.buckets, value)
+
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [
+                    [0] * (len(self.buckets) + 1), 0.0, 0
+                ]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *label_values) -> _Timer:
+        return _Timer(self, label_values)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                k: (list(counts), total, n)
+                for k, (counts, total, n) in self._series.items()
+            }
+
+    def quantile(self, q: float, counts: list[int]) -> float:
+        n = sum(counts)
+        if not n:
+            return 0.0
+
+        rank = q * n
+        seen = 0
+        for i, c in enumerate(counts):
+            if seen + c >= rank and c:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else lower
+                return lower + (upper - lower) * (rank - seen) / c
+            seen += c
+
+        return self.buckets[-1]
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+
+        for label_values, (counts, total, n) in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets + ("+Inf",), counts):
+                cumulative += c
+                le = f'le="{bound}"'
+                lines.append(
+                    f"{self.name}_bucket"
+                    f"{_format_labels(self.labels, label_values, le)} {cumulative}"
+                )
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total!r}")
+            lines.append(f"{self.name}_count{labels} {n}")
+
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self.metrics.setdefault(name, Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: tuple = ()) -> Gauge:
+        return self.metrics.setdefault(name, Gauge(name, help, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: tuple = (),
+        buckets: tuple = LATENCY_BUCKETS,
+        track_active: bool = False
+    ) -> Histogram:
+        return self.metrics.setdefault(
+            name, Histogram(name, help, labels, buckets, track_active)
+        )
+
+    def render(self) -> str:
+        """
+        Prometheus text exposition format (0.0.4).
+        """
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# =====================================================
+# SHARED METRICS
+# =====================================================
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "fraud_stage_duration_seconds",
+    "Time spent per pipeline stage",
+    ("stage",),
+    track_active=True
+)
+EVENTS = REGISTRY.counter(
+    "upi_events_total",
+    "UPI events read by the consumer",
+    ("result",)
+)
+DECISIONS = REGISTRY.counter(
+    "upi_decisions_total",
+    "UPI decisions by outcome and graph override",
+    ("decision", "graph_override")
+)
+MONGO_COMMANDS = REGISTRY.counter(
+    "mongo_commands_total",
+    "MongoDB round trips by client workload and command",
+    ("workload", "command", "status")
+)
+MONGO_POOL_CONNECTIONS = REGISTRY.gauge(
+    "mongo_pool_connections",
+    "Pooled connections per client workload (open / in_use)",
+    ("workload", "state")
+)
+MONGO_POOL_CHECKOUT_FAILURES = REGISTRY.counter(
+    "mongo_pool_checkout_failures_total",
+    "Connection checkouts that failed, by reason (e.g. timeout = pool exhausted)",
+    ("workload", "reason")
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ("method", "route", "status")
+)
+
+
+def mongo_listeners(workload: str) -> list:
+    """
+    pymongo listeners for a client: every command is counted into
+    MONGO_COMMANDS, pool usage into MONGO_POOL_CONNECTIONS and
+    MONGO_POOL_CHECKOUT_FAILURES. Pass them in `event_listeners`.
+    """
+    from pymongo import monitoring
+
+    class MongoCommandCounter(monitoring.CommandListener):
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            MONGO_COMMANDS.inc(workload, event.command_name, "ok")
+
+        def failed(self, event):
+            MONGO_COMMANDS.inc(workload, event.command_name, "failed")
+
+    class MongoPoolUsage(monitoring.ConnectionPoolListener):
+        def pool_created(self, event):
+            pass
+
+        def pool_ready(self, event):
+            pass
+
+        def pool_cleared(self, event):
+            pass
+
+        def pool_closed(self, event):
+            pass
+
+        def connection_created(self, event):
+            MONGO_POOL_CONNECTIONS.inc(workload, "open")
+
+        def connection_ready(self, event):
+            pass
+
+        def connection_closed(self, event):
+            MONGO_POOL_CONNECTIONS.inc(workload, "open", amount=-1)
+
+        def connection_check_out_started(self, event):
+            pass
+
+        def connection_check_out_failed(self, event):
+            MONGO_POOL_CHECKOUT_FAILURES.inc(workload, str(event.reason))
+
+        def connection_checked_out(self, event):
+            MONGO_POOL_CONNECTIONS.inc(workload, "in_use")
+
+        def connection_checked_in(self, event):
+            MONGO_POOL_CONNECTIONS.inc(workload, "in_use", amount=-1)
+
+    return [MongoCommandCounter(), MongoPoolUsage()]
+
+
+def instrument_app(app):
+    """
+    Adds request latency tracking and a Prometheus `/metrics` route to a
+    FastAPI app.
+    """
+    from fastapi.responses import PlainTextResponse
+
+    @app.middleware("http")
+    async def record_request_latency(request, call_next):
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                request.method,
+                getattr(route, "path", "unmatched"),
+                status
+            )
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def metrics():
+        return PlainTextResponse(
+            REGISTRY.render(),
+            media_type="text/plain; version=0.0.4"
+        )
+
+# =====================================================
+# PERIODIC SUMMARY (consumer logs)
+# =====================================================
+class SummaryReporter:
+    """
+    Prints per-stage latency, decisions and Mongo round trips for the
+    interval since the previous report.
+    """
+
+    def __init__(self, interval_s: float = METRICS_SUMMARY_INTERVAL_S):
+        self.interval_s = interval_s
+        self._last_at = time.monotonic()
+        self._last_stages = STAGE_SECONDS.snapshot()
+        self._last_decisions = DECISIONS.values()
+        self._last_mongo = MONGO_COMMANDS.values()
+        self._last_events = EVENTS.values()
+
+    def maybe_report(self):
+        if self.interval_s > 0 and time.monotonic() - self._last_at >= self.interval_s:
+            self.report()
+
+    def report(self):
+        now = time.monotonic()
+        elapsed = max(now - self._last_at, 1e-9)
+
+        stages = STAGE_SECONDS.snapshot()
+        decisions = DECISIONS.values()
+        mongo = MONGO_COMMANDS.values()
+        events = EVENTS.values()
+
+        processed = events.get(("processed",), 0) - self._last_events.get(("processed",), 0)
+        round_trips = sum(mongo.values()) - sum(self._last_mongo.values())
+
+        print(
+            f"[METRICS] {processed} events in {elapsed:.0f}s "
+            f"({processed / elapsed:.1f}/s) | mongo round trips {round_trips} "
+            f"({round_trips / processed if processed else 0:.2f}/event)"
+        )
+
+        for (stage,), (counts, total, n) in sorted(stages.items()):
+            last_counts, last_total, last_n = self._last_stages.get(
+                (stage,), ([0] * len(counts), 0.0, 0)
+            )
+            delta = [c - l for c, l in zip(counts, last_counts)]
+            calls = n - last_n
+            if not calls:
+                continue
+            print(
+                f"[METRICS] {stage:<20} calls={calls:<7} "
+                f"mean={(total - last_total) / calls * 1000:.3f}ms "
+                f"p50={STAGE_SECONDS.quantile(0.50, delta) * 1000:.3f}ms "
+                f"p99={STAGE_SECONDS.quantile(0.99, delta) * 1000:.3f}ms"
+            )
+
+        changed = {
+            k: v - self._last_decisions.get(k, 0)
+            for k, v in decisions.items()
+            if v != self._last_decisions.get(k, 0)
+        }
+        if changed:
+            print("[METRICS] decisions " + ", ".join(
+                f"{decision}/{override or '-'}={n}"
+                for (decision, override), n in sorted(changed.items(), key=str)
+            ))
+
+        self._last_at = now
+        self._last_stages = stages
+        self._last_decisions = decisions
+        self._last_mongo = mongo
+        self._last_events = events
@@ -0,0 +1,291 @@
+# monitoring/profiler.py
+
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from monitoring.metrics import ACTIVE_STAGES
+
+# =====================================================
+# CONFIG
+# =====================================================
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+PROFILE_DIR = Path(os.getenv("UPI_PROFILE_DIR", BASE_DIR / "profiles"))
+PROFILE_SECONDS = float(os.getenv("UPI_PROFILE_SECONDS", 60))
+PROFILE_INTERVAL_MS = float(os.getenv("UPI_PROFILE_INTERVAL_MS", 5))
+# collapsed | speedscope | both
+PROFILE_FORMAT = os.getenv("UPI_PROFILE_FORMAT", "both")
+# tracemalloc snapshot diff every N batches (0 disables allocation tracking)
+PROFILE_ALLOC_EVERY = int(os.getenv("UPI_PROFILE_ALLOC_EVERY", 10))
+PROFILE_ALLOC_TOP = int(os.getenv("UPI_PROFILE_ALLOC_TOP", 25))
+
+MAX_STACK_DEPTH = 128
+
+
+class SamplingProfiler:
+    """
+    In-process sampling profiler for one thread.
+
+    A daemon thread wakes every `interval_ms`, reads the target thread's
+    frame via `sys._current_frames()` and counts the stack, prefixed
+    with the pipeline stage running at that moment (the innermost
+    `STAGE_SECONDS.time(...)` block). After `duration_s` it stops and
+    writes collapsed stacks (flamegraph.pl / speedscope import) and/or
+    a speedscope JSON profile.
+
+    With allocation tracking on, tracemalloc runs for the same window;
+    `on_batch()` records the per-batch peak and diffs a snapshot every
+    `alloc_every` batches, accumulating net growth per source line.
+    """
+
+    def __init__(
+        self,
+        name: str = "consumer",
+        duration_s: float = PROFILE_SECONDS,
+        interval_ms: float = PROFILE_INTERVAL_MS,
+        out_dir: Path = PROFILE_DIR,
+        output_format: str = PROFILE_FORMAT,
+        alloc_every: int = PROFILE_ALLOC_EVERY
+    ):
+        self.name = name
+        self.duration_s = duration_s
+        self.interval_s = interval_ms / 1000
+        self.out_dir = Path(out_dir)
+        self.output_format = output_format
+        self.alloc_every = alloc_every
+
+        self.stacks = Counter()
+        self.samples = 0
+        self.target = None
+
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_at = None
+        self._finished = False
+        self._lock = threading.Lock()
+
+        # allocations
+        self._batches = 0
+        self._last_snapshot = None
+        self.alloc_growth = Counter()
+        self.alloc_count = Counter()
+        self.batch_peaks = []
+
+    # --------------------------------------------------
+    # PUBLIC
+    # --------------------------------------------------
+    def start(self, thread_id: int | None = None):
+        self.target = thread_id or threading.get_ident()
+        self._started_at = time.perf_counter()
+
+        if self.alloc_every > 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._last_snapshot = self._snapshot()
+
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+        print(
+            f"[PROFILE] sampling every {self.interval_s * 1000:.1f}ms "
+            f"for {self.duration_s:.0f}s"
+        )
+
+    @property
+    def active(self) -> bool:
+        return self._thread is not None and not self._finished
+
+    def on_batch(self):
+        """
+        Called by the consumer after each batch.
+        """
+        with self._lock:
+            if self._finished or self._last_snapshot is None:
+                return
+
+            self._batches += 1
+            _, peak = tracemalloc.get_traced_memory()
+            self.batch_peaks.append(peak)
+            tracemalloc.reset_peak()
+
+            if self._batches % self.alloc_every == 0:
+                snapshot = self._snapshot()
+                for stat in snapshot.compare_to(self._last_snapshot, "lineno"):
+                    key = str(stat.traceback[0])
+                    self.alloc_growth[key] += stat.size_diff
+                    self.alloc_count[key] += stat.count_diff
+                self._last_snapshot = snapshot
+
+    def stop(self) -> list[Path]:
+        """
+        Stops sampling (if still running) and writes the outputs once.
+        """
+        if self._thread is None:
+            return []
+
+        self._stop.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        return self._finish()
+
+    # --------------------------------------------------
+    # SAMPLING
+    # --------------------------------------------------
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            path = Path(code.co_filename)
+            try:
+                path = path.relative_to(BASE_DIR)
+            except ValueError:
+                path = Path(path.name)
+            label = self._labels[code] = (
+                f"{code.co_name} ({path}:{code.co_firstlineno})"
+            )
+        return label
+
+    def _run(self):
+        deadline = self._started_at + self.duration_s
+
+        while not self._stop.wait(self.interval_s):
+            if time.perf_counter() >= deadline:
+                break
+
+            frame = sys._current_frames().get(self.target)
+            if frame is None:
+                break
+
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+
+            stage = ACTIVE_STAGES.get(self.target) or "other"
+            self.stacks[(stage, tuple(reversed(stack)))] += 1
+            self.samples += 1
+
+        self._finish()
+
+    # --------------------------------------------------
+    # OUTPUT
+    # --------------------------------------------------
+    def _finish(self) -> list[Path]:
+        with self._lock:
+            if self._finished:
+                return []
+            self._finished = True
+            return self._write()
+
+    def _write(self) -> list[Path]:
+        elapsed = time.perf_counter() - self._started_at
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        prefix = self.out_dir / f"{datetime.utcnow():%Y%m%dT%H%M%S}-{self.name}"
+        written = []
+
+        if self.output_format in ("collapsed", "both"):
+            path = prefix.with_suffix(".collapsed.txt")
+            path.write_text(self._collapsed())
+            written.append(path)
+
+        if self.output_format in ("speedscope", "both"):
+            path = prefix.with_suffix(".speedscope.json")
+            path.write_text(json.dumps(self._speedscope(elapsed)))
+            written.append(path)
+
+        if self._last_snapshot is not None:
+            path = prefix.with_suffix(".allocations.txt")
+            path.write_text(self._allocations())
+            written.append(path)
+            tracemalloc.stop()
+
+        print(f"[PROFILE] {self.samples} samples over {elapsed:.1f}s")
+        for stage, share in self.stage_shares().items():
+            print(f"[PROFILE] {stage:<26} {share:6.1%}")
+        for path in written:
+            print(f"[PROFILE] wrote {path}")
+
+        return written
+
+    def stage_shares(self) -> dict[str, float]:
+        per_stage = Counter()
+        for (stage, _), n in self.stacks.items():
+            per_stage[stage] += n
+
+        total = sum(per_stage.values()) or 1
+        return {stage: n / total for stage, n in per_stage.most_common()}
+
+    def _collapsed(self) -> str:
+        lines = [
+            ";".join([f"stage:{stage}"] + [self._label(c) for c in stack]) + f" {n}"
+            for (stage, stack), n in self.stacks.most_common()
+        ]
+        return "\n".join(lines) + "\n"
+
+    def _speedscope(self, elapsed: float) -> dict:
+        frames = []
+        index = {}
+
+        def frame_id(name: str) -> int:
+            if name not in index:
+                index[name] = len(frames)
+                frames.append({"name": name})
+            return index[name]
+
+        samples = []
+        weights = []
+        for (stage, stack), n in self.stacks.items():
+            samples.append(
+                [frame_id(f"stage:{stage}")] + [frame_id(self._label(c)) for c in stack]
+            )
+            weights.append(n * self.interval_s)
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "monitoring.profiler",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": self.name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": elapsed,
+                "samples": samples,
+                "weights": weights
+            }]
+        }
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+
+    def _allocations(self) -> str:
+        peaks = sorted(self.batch_peaks)
+        lines = [
+            f"batches: {self._batches}",
+            f"per-batch peak traced memory: "
+            f"p50={peaks[len(peaks) // 2] / 1e6:.1f}MB max={peaks[-1] / 1e6:.1f}MB"
+            if peaks else "per-batch peak traced memory: n/a",
+            "",
+            f"top {PROFILE_ALLOC_TOP} lines by net growth (bytes, blocks):"
+        ]
+        for key, size in self.alloc_growth.most_common(PROFILE_ALLOC_TOP):
+            lines.append(f"{size:>14,} {self.alloc_count[key]:>10,}  {key}")
+
+        snapshot = self._snapshot()
+        lines += ["", f"top {PROFILE_ALLOC_TOP} lines by live size at the end:"]
+        for stat in snapshot.statistics("lineno")[:PROFILE_ALLOC_TOP]:
+            lines.append(f"{stat.size:>14,} {stat.count:>10,}  {stat.traceback[0]}")
+
+        return "\n".join(lines) + "\n"
@@ -1,5 +1,7 @@
 from datetime import datetime, timedelta
-from storage.mongo_client import velocity_col
+from storage.mongo import db
+
+velocity_col = db["velocity_state"]
 
 class VelocityStore:
     def record_transaction(self, payer_vpa, amount, timestamp):
@@ -0,0 +1,116 @@
+# storage/bloom_filter.py
+
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings: no false negatives, false
+    positives at roughly `error_rate` once `capacity` keys were added.
+    Bit positions come from double hashing one 128-bit blake2b digest.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+
+        self.num_bits = max(8, math.ceil(
+            -self.capacity * math.log(error_rate) / (math.log(2) ** 2)
+        ))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self.bits[pos >> 3] & (1 << (pos & 7))
+            for pos in self._positions(key)
+        )
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.bits)
+
+    @classmethod
+    def from_bytes(
+        cls,
+        data: bytes,
+        capacity: int,
+        error_rate: float,
+        count: int = 0
+    ) -> "BloomFilter":
+        """
+        Restores a filter saved with `to_bytes()`; capacity and error
+        rate must match the ones it was created with.
+        """
+        bloom = cls(capacity, error_rate)
+        if len(data) != len(bloom.bits):
+            raise ValueError("Bloom filter size does not match capacity / error rate")
+
+        bloom.bits = bytearray(data)
+        bloom.count = count
+        return bloom
+
+
+class ScalableBloomFilter:
+    """
+    Chain of Bloom filters that grows instead of degrading: when the
+    newest filter is full, a larger one (x `growth`) with a tighter error
+    rate (x `tightening`) is appended, which keeps the overall false
+    positive rate below `error_rate`.
+    """
+
+    def __init__(
+        self,
+        initial_capacity: int = 1_000_000,
+        error_rate: float = 0.001,
+        growth: int = 2,
+        tightening: float = 0.5
+    ):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+
+        self.filters = [
+            BloomFilter(initial_capacity, error_rate * (1 - tightening))
+        ]
+
+    def add(self, key: str):
+        current = self.filters[-1]
+
+        if current.full:
+            current = BloomFilter(
+                current.capacity * self.growth,
+                current.error_rate * self.tightening
+            )
+            self.filters.append(current)
+
+        current.add(key)
+
+    def __contains__(self, key: str) -> bool:
+        return any(key in f for f in reversed(self.filters))
+
+    def __len__(self) -> int:
+        return sum(f.count for f in self.filters)
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(len(f.bits) for f in self.filters)
@@ -0,0 +1,187 @@
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pymongo import UpdateOne
+from storage.mongo import db
+
+DECISIONS = ("BLOCK", "STEP_UP_AUTH", "ALLOW")
+
+# Minute buckets are only needed for the ragged ends of a range
+MINUTE_RETENTION_DAYS = int(os.getenv("DECISION_COUNTER_MINUTE_RETENTION_DAYS", 14))
+
+
+def _naive_utc(ts: datetime | None) -> datetime | None:
+    # buckets are naive UTC (utcnow); API bounds may carry an offset
+    if ts is None or ts.tzinfo is None:
+        return ts
+    return ts.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _floor(ts: datetime, granularity: str) -> datetime:
+    ts = ts.replace(second=0, microsecond=0)
+    return ts.replace(minute=0) if granularity == "hour" else ts
+
+
+def _ceil(ts: datetime, granularity: str) -> datetime:
+    floored = _floor(ts, granularity)
+    if floored == ts:
+        return floored
+    return floored + (timedelta(hours=1) if granularity == "hour" else timedelta(minutes=1))
+
+
+class DecisionCounterStore:
+    """
+    Per-minute and per-hour decision counts in `audit_decision_counters`
+    ({_id: "<granularity>|<bucket>", granularity, bucket, total, BLOCK,
+    STEP_UP_AUTH, ALLOW}), bucketed by the audit record's `logged_at`.
+
+    The audit writer increments them for every batch it mirrors into
+    `audit_decisions`, so summaries cost O(buckets) instead of four
+    collection scans. Run `python -m storage.decision_counters` once
+    to backfill from existing audit records.
+    """
+
+    def __init__(self, database=db):
+        self.col = database["audit_decision_counters"]
+        self.audit_col = database["audit_decisions"]
+
+    # --------------------------------------------------
+    # INCREMENTAL UPDATE
+    # --------------------------------------------------
+    def record_batch(self, records: list[dict]):
+        counts = {}
+
+        for record in records:
+            logged_at = record.get("logged_at")
+            if not isinstance(logged_at, datetime):
+                continue
+
+            for granularity in ("minute", "hour"):
+                key = (granularity, _floor(logged_at, granularity))
+                counts.setdefault(key, Counter())[record.get("decision")] += 1
+
+        if not counts:
+            return
+
+        ops = []
+        for (granularity, bucket), counter in counts.items():
+            inc = {"total": sum(counter.values())}
+            inc.update({d: counter[d] for d in DECISIONS if counter[d]})
+
+            update = {
+                "$inc": inc,
+                "$setOnInsert": {"granularity": granularity, "bucket": bucket}
+            }
+            if granularity == "minute":
+                update["$setOnInsert"]["expire_at"] = (
+                    bucket + timedelta(days=MINUTE_RETENTION_DAYS)
+                )
+
+            ops.append(UpdateOne(
+                {"_id": f"{granularity}|{bucket.isoformat()}"},
+                update,
+                upsert=True
+            ))
+
+        self.col.bulk_write(ops, ordered=False)
+
+    # --------------------------------------------------
+    # SUMMARY
+    # --------------------------------------------------
+    def summarize(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None
+    ) -> dict:
+        """
+        Decision counts for [start, end), minute resolution. Whole hours
+        come from hour buckets, the partial hours at either end from
+        minute buckets (kept for MINUTE_RETENTION_DAYS). Aware bounds
+        are converted to UTC.
+        """
+        start, end = _naive_utc(start), _naive_utc(end)
+
+        if start is None and end is None:
+            match = {"granularity": "hour"}
+        else:
+            start = _floor(start, "minute") if start else datetime.min
+            end = _ceil(end, "minute") if end else datetime.max
+
+            hours_from = _ceil(start, "hour") if start > datetime.min else start
+            hours_to = _floor(end, "hour") if end < datetime.max else end
+
+            if hours_from >= hours_to:
+                match = {
+                    "granularity": "minute",
+                    "bucket": {"$gte": start, "$lt": end}
+                }
+            else:
+                match = {"$or": [
+                    {"granularity": "hour",
+                     "bucket": {"$gte": hours_from, "$lt": hours_to}},
+                    {"granularity": "minute",
+                     "bucket": {"$gte": start, "$lt": hours_from}},
+                    {"granularity": "minute",
+                     "bucket": {"$gte": hours_to, "$lt": end}}
+                ]}
+
+        result = next(self.col.aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": None,
+                "total": {"$sum": "$total"},
+                **{d: {"$sum": f"${d}"} for d in DECISIONS}
+            }}
+        ]), {})
+
+        return {
+            "total": result.get("total", 0),
+            **{d: result.get(d, 0) for d in DECISIONS}
+        }
+
+    # --------------------------------------------------
+    # BACKFILL
+    # --------------------------------------------------
+    def rebuild(self):
+        """
+        Recomputes every counter from `audit_decisions`.
+        """
+        self.col.delete_many({})
+
+        for granularity in ("minute", "hour"):
+            self.audit_col.aggregate([
+                {"$match": {"logged_at": {"$type": "date"}}},
+                {"$group": {
+                    "_id": {"$dateTrunc": {
+                        "date": "$logged_at", "unit": granularity
+                    }},
+                    "total": {"$sum": 1},
+                    **{
+                        d: {"$sum": {"$cond": [{"$eq": ["$decision", d]}, 1, 0]}}
+                        for d in DECISIONS
+                    }
+                }},
+                {"$project": {
+                    "_id": {"$concat": [
+                        f"{granularity}|",
+                        {"$dateToString": {
+                            "date": "$_id", "format": "%Y-%m-%dT%H:%M:00"
+                        }}
+                    ]},
+                    "granularity": granularity,
+                    "bucket": "$_id",
+                    "total": 1,
+                    **{d: 1 for d in DECISIONS},
+                    **({"expire_at": {"$dateAdd": {
+                        "startDate": "$_id",
+                        "unit": "day",
+                        "amount": MINUTE_RETENTION_DAYS
+                    }}} if granularity == "minute" else {})
+                }},
+                {"$merge": {"into": self.col.name, "whenMatched": "replace"}}
+            ])
+
+
+if __name__ == "__main__":
+    DecisionCounterStore().rebuild()
+    print("Decision counters rebuilt")
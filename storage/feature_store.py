@@ -0,0 +1,352 @@
+# storage/feature_store.py
+
+import ipaddress
+import os
+from datetime import datetime, timedelta
+
+from bson import Binary
+from pymongo import UpdateOne
+
+from storage.mongo import db
+from storage.bloom_filter import BloomFilter
+from storage.lru_cache import LRUCache
+from storage.write_behind import WriteBehindBuffer
+
+# Hot payer states kept in process. Only valid while this process is
+# the sole writer of its payers (single consumer, or a partition
+# worker); read-only users (the API) run with the cache off.
+FEATURE_STORE_CACHE_SIZE = int(os.getenv("FEATURE_STORE_CACHE_SIZE", 100_000))
+
+# Known receivers are kept exactly up to this many, then folded into a
+# fixed-size Bloom filter (~2.4 KB at the defaults). Capacity and error
+# rate only apply to new filters; stored ones keep their own.
+FEATURE_RECEIVER_EXACT_LIMIT = int(os.getenv("FEATURE_RECEIVER_EXACT_LIMIT", 32))
+FEATURE_RECEIVER_BLOOM_CAPACITY = int(os.getenv("FEATURE_RECEIVER_BLOOM_CAPACITY", 2048))
+FEATURE_RECEIVER_BLOOM_ERROR_RATE = float(os.getenv("FEATURE_RECEIVER_BLOOM_ERROR_RATE", 0.01))
+
+FAILED_WINDOW = timedelta(hours=1)
+# failed timestamps kept per payer (the 1h count saturates there)
+FAILED_ATTEMPTS_MAX = int(os.getenv("FEATURE_FAILED_ATTEMPTS_MAX", 50))
+FAILED_STATUSES = {"FAILED", "DECLINED"}
+
+# Features this store serves (the rest of UPI_FEATURE_COLUMNS comes
+# from the event and the velocity store)
+STORE_FEATURE_COLUMNS = [
+    "device_change_flag",
+    "location_change_flag",
+    "failed_attempts_last_1hr",
+    "receiver_new_flag"
+]
+
+FEATURE_PROJECTION = {
+    "_id": 0,
+    "payer_vpa": 1,
+    "last_device_id": 1,
+    "last_network": 1,
+    "failed_at": 1,
+    "receivers": 1,
+    "receiver_bloom": 1,
+    "receiver_bloom_capacity": 1,
+    "receiver_bloom_error_rate": 1,
+    "receiver_count": 1
+}
+
+
+def network_of(ip_address: str) -> str:
+    """
+    Coarse location proxy: the /16 (IPv4) or /48 (IPv6) of the address.
+    """
+    try:
+        ip = ipaddress.ip_address(ip_address)
+    except ValueError:
+        return ip_address
+
+    prefix = 16 if ip.version == 4 else 48
+    return str(ipaddress.ip_network(f"{ip}/{prefix}", strict=False))
+
+
+class PayerFeatureStore:
+    """
+    Online per-payer aggregates in `upi_payer_features`:
+
+    - last device_id and last IP network -> device / location change
+    - timestamps of failed attempts      -> failed attempts in the last hour
+    - known receivers                    -> receiver_new_flag
+
+    Receivers are an exact list until FEATURE_RECEIVER_EXACT_LIMIT, then
+    a Bloom filter (a new receiver may then rarely read as known).
+
+    The consumer records every event after reading its features; reads
+    are served from an LRU of payer states, with one Mongo query per
+    micro-batch via `prefetch`. The API uses the same store read-only.
+    """
+
+    def __init__(
+        self,
+        writer: WriteBehindBuffer | None = None,
+        cache_size: int = FEATURE_STORE_CACHE_SIZE
+    ):
+        self.col = db["upi_payer_features"]
+        self.cache = LRUCache(cache_size)
+
+        # Write-behind mode: payer states changed in the current batch
+        self.writer = writer
+        self._pending = {}
+
+        if writer is not None:
+            writer.on_flush(self._on_flush)
+
+    # --------------------------------------------------
+    # READ
+    # --------------------------------------------------
+    def get_features(
+        self,
+        payer_vpa: str,
+        payee_vpa: str,
+        device_id: str,
+        ip_address: str,
+        now: datetime
+    ) -> dict:
+        """
+        Store features of a transaction, from the payer's history
+        before it.
+        """
+        return self._features(
+            self._find(payer_vpa), payee_vpa, device_id, ip_address, now
+        )
+
+    def get_features_many(self, transactions: list[dict], now: datetime) -> list[dict]:
+        """
+        `get_features` for many transactions (dicts with payer_vpa,
+        payee_vpa, device_id, ip_address); uncached payers are read with
+        one query.
+        """
+        payers = {t["payer_vpa"] for t in transactions}
+        states = {
+            vpa: self._pending.get(vpa) or self.cache.get(vpa)
+            for vpa in payers
+        }
+
+        missing = [vpa for vpa, state in states.items() if state is None]
+        if missing:
+            for doc in self.col.find(
+                {"payer_vpa": {"$in": missing}}, FEATURE_PROJECTION
+            ):
+                states[doc["payer_vpa"]] = self._from_doc(doc)
+
+        return [
+            self._features(
+                states[t["payer_vpa"]],
+                t["payee_vpa"], t["device_id"], t["ip_address"], now
+            )
+            for t in transactions
+        ]
+
+    def _features(
+        self,
+        state: dict | None,
+        payee_vpa: str,
+        device_id: str,
+        ip_address: str,
+        now: datetime
+    ) -> dict:
+        if state is None:
+            return {
+                "device_change_flag": 0,
+                "location_change_flag": 0,
+                "failed_attempts_last_1hr": 0,
+                "receiver_new_flag": 1
+            }
+
+        last_device = state["last_device_id"]
+        last_network = state["last_network"]
+
+        return {
+            "device_change_flag": int(
+                last_device is not None and last_device != device_id
+            ),
+            "location_change_flag": int(
+                last_network is not None and last_network != network_of(ip_address)
+            ),
+            "failed_attempts_last_1hr": sum(
+                1 for t in state["failed_at"] if now - FAILED_WINDOW <= t <= now
+            ),
+            "receiver_new_flag": int(not self._knows_receiver(state, payee_vpa))
+        }
+
+    def prefetch(self, payer_vpas: list[str]):
+        """
+        Loads the states of a micro-batch with one query.
+        """
+        missing = [
+            vpa for vpa in set(payer_vpas)
+            if vpa not in self._pending and vpa not in self.cache
+        ]
+        if not missing or self.cache.maxsize <= 0:
+            return
+
+        found = {
+            doc["payer_vpa"]: self._from_doc(doc)
+            for doc in self.col.find(
+                {"payer_vpa": {"$in": missing}}, FEATURE_PROJECTION
+            )
+        }
+
+        # an empty state reads exactly like an unknown payer
+        for vpa in missing:
+            self.cache.put(vpa, found.get(vpa) or self._empty_state(vpa))
+
+    # --------------------------------------------------
+    # WRITE
+    # --------------------------------------------------
+    def record(
+        self,
+        payer_vpa: str,
+        payee_vpa: str,
+        device_id: str,
+        ip_address: str,
+        timestamp: datetime,
+        status: str = "INITIATED"
+    ):
+        state = self._find(payer_vpa) or self._empty_state(payer_vpa)
+        state = {
+            **state,
+            "last_device_id": device_id,
+            "last_network": network_of(ip_address),
+            "last_seen": timestamp
+        }
+
+        update = {
+            "$set": {
+                "last_device_id": device_id,
+                "last_network": state["last_network"],
+                "last_seen": timestamp
+            }
+        }
+
+        if status in FAILED_STATUSES:
+            state["failed_at"] = [
+                t for t in state["failed_at"] if timestamp - t <= FAILED_WINDOW
+            ] + [timestamp]
+            state["failed_at"] = state["failed_at"][-FAILED_ATTEMPTS_MAX:]
+            update["$set"]["failed_at"] = state["failed_at"]
+
+        if not self._knows_receiver(state, payee_vpa):
+            self._add_receiver(state, payee_vpa, update)
+
+        if self.writer is None:
+            self.col.update_one({"payer_vpa": payer_vpa}, update, upsert=True)
+            self.cache.put(payer_vpa, state)
+            return
+
+        self._pending[payer_vpa] = state
+        self.writer.add(
+            self.col, UpdateOne({"payer_vpa": payer_vpa}, update, upsert=True)
+        )
+
+    # --------------------------------------------------
+    # RECEIVER SET
+    # --------------------------------------------------
+    def _knows_receiver(self, state: dict, payee_vpa: str) -> bool:
+        if state["receiver_bloom"] is not None:
+            return payee_vpa in state["receiver_bloom"]
+        return payee_vpa in state["receivers"]
+
+    def _add_receiver(self, state: dict, payee_vpa: str, update: dict):
+        state["receiver_count"] += 1
+        update.setdefault("$inc", {})["receiver_count"] = 1
+
+        if state["receiver_bloom"] is None and len(state["receivers"]) < FEATURE_RECEIVER_EXACT_LIMIT:
+            state["receivers"] = state["receivers"] | {payee_vpa}
+            update["$addToSet"] = {"receivers": payee_vpa}
+            return
+
+        # fold the exact set into a filter (copied, the cached state
+        # may still be shared with a reader)
+        bloom = self._new_bloom(state["receiver_bloom"])
+        for receiver in state["receivers"]:
+            bloom.add(receiver)
+        bloom.add(payee_vpa)
+
+        state["receivers"] = set()
+        state["receiver_bloom"] = bloom
+        update["$set"]["receiver_bloom"] = Binary(bloom.to_bytes())
+        update["$set"]["receiver_bloom_capacity"] = bloom.capacity
+        update["$set"]["receiver_bloom_error_rate"] = bloom.error_rate
+        update["$unset"] = {"receivers": ""}
+
+    def _new_bloom(self, source: BloomFilter | None = None) -> BloomFilter:
+        if source is not None:
+            return BloomFilter.from_bytes(
+                source.to_bytes(), source.capacity, source.error_rate, source.count
+            )
+        return BloomFilter(
+            FEATURE_RECEIVER_BLOOM_CAPACITY, FEATURE_RECEIVER_BLOOM_ERROR_RATE
+        )
+
+    # --------------------------------------------------
+    # STATE
+    # --------------------------------------------------
+    def _empty_state(self, payer_vpa: str) -> dict:
+        return {
+            "payer_vpa": payer_vpa,
+            "last_device_id": None,
+            "last_network": None,
+            "failed_at": [],
+            "receivers": set(),
+            "receiver_bloom": None,
+            "receiver_count": 0
+        }
+
+    def _from_doc(self, doc: dict) -> dict:
+        state = self._empty_state(doc["payer_vpa"])
+        state.update(
+            last_device_id=doc.get("last_device_id"),
+            last_network=doc.get("last_network"),
+            failed_at=doc.get("failed_at", []),
+            receivers=set(doc.get("receivers", [])),
+            receiver_count=doc.get("receiver_count", 0)
+        )
+
+        if doc.get("receiver_bloom") is not None:
+            state["receiver_bloom"] = self._load_bloom(doc, state["receiver_count"])
+
+        return state
+
+    def _load_bloom(self, doc: dict, count: int) -> BloomFilter:
+        # docs written before the parameters were stored used the config
+        capacity = doc.get("receiver_bloom_capacity", FEATURE_RECEIVER_BLOOM_CAPACITY)
+        error_rate = doc.get("receiver_bloom_error_rate", FEATURE_RECEIVER_BLOOM_ERROR_RATE)
+
+        try:
+            return BloomFilter.from_bytes(
+                doc["receiver_bloom"], capacity, error_rate, count
+            )
+        except ValueError:
+            # unknown parameters: the receivers read as new until re-learned
+            print(
+                f"[FEATURES] unreadable receiver filter for {doc['payer_vpa']}, "
+                f"starting a new one"
+            )
+            return self._new_bloom()
+
+    def _find(self, payer_vpa: str) -> dict | None:
+        if payer_vpa in self._pending:
+            return self._pending[payer_vpa]
+
+        cached = self.cache.get(payer_vpa)
+        if cached is not None:
+            return cached
+
+        doc = self.col.find_one({"payer_vpa": payer_vpa}, FEATURE_PROJECTION)
+        if doc is None:
+            return None
+
+        state = self._from_doc(doc)
+        self.cache.put(payer_vpa, state)
+        return state
+
+    def _on_flush(self):
+        for payer_vpa, state in self._pending.items():
+            self.cache.put(payer_vpa, state)
+        self._pending.clear()
@@ -1,10 +1,53 @@
+import os
 from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
 from storage.mongo import db
+from storage.lru_cache import LRUCache
+from storage.write_behind import WriteBehindBuffer
+
+GRAPH_CACHE_SIZE = int(os.getenv("GRAPH_CACHE_SIZE", 0))
 
 class GraphStore:
-    def __init__(self):
+    """
+    Payer → payee edges in `upi_graph_edges`, plus per-VPA degree
+    counters in `upi_graph_degrees` ({_id: vpa, out_degree, in_degree}).
+    Degrees are only incremented when an upsert creates a new edge, so
+    unique payee / payer counts never scan the edge collection.
+
+    Write-behind mode decides "new edge" from the edge read before the
+    batch, not from the upsert result. That is only exact while this
+    process is the sole writer of its payers' edges (single consumer,
+    or a partition worker); two writers of one payer (e.g. during a
+    repartition) can double-count a degree until the next backfill.
+    Run `python -m storage.graph_repo` once to backfill degrees for
+    edges that existed before the counters.
+    """
+
+    def __init__(
+        self,
+        writer: WriteBehindBuffer | None = None,
+        cache_size: int = GRAPH_CACHE_SIZE
+    ):
         self.col = db["upi_graph_edges"]
+        self.degree_col = db["upi_graph_degrees"]
+
+        # Optional in-process cache: vpa -> [out, in], (payer, payee) -> edge
+        self.cache = LRUCache(cache_size)
+
+        # Write-behind mode: edges / degrees touched in the current batch
+        self.writer = writer
+        self._pending_edges = {}
+        self._base_degrees = {}
+        self._new_payees = {}
+        self._new_payers = {}
+        self._prefetched_edges = {}
 
+        if writer is not None:
+            writer.on_flush(self._on_flush)
+
+    # --------------------------------------------------
+    # RECORD TRANSACTION EDGE
+    # --------------------------------------------------
     def record_transaction(
         self,
         payer_vpa: str,
@@ -12,28 +55,317 @@ class GraphStore:
         amount: float,
         timestamp: datetime
     ):
-        self.col.update_one(
-            {"payer_vpa": payer_vpa, "payee_vpa": payee_vpa},
-            {
-                "$inc": {
-                    "count": 1,
-                    "total_amount": amount
-                },
-                "$set": {
-                    "last_seen": timestamp
-                }
+        query = {"payer_vpa": payer_vpa, "payee_vpa": payee_vpa}
+        update = {
+            "$inc": {
+                "count": 1,
+                "total_amount": amount
             },
-            upsert=True
+            "$set": {
+                "last_seen": timestamp
+            }
+        }
+
+        if self.writer is None:
+            before = self.col.find_one_and_update(
+                query,
+                update,
+                projection={"_id": 0},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
+            )
+
+            if before is None:
+                self.degree_col.bulk_write(
+                    self._degree_ops(payer_vpa, payee_vpa), ordered=False
+                )
+                self._cache_degree(payer_vpa, 0, 1)
+                self._cache_degree(payee_vpa, 1, 1)
+
+            self.cache.put(
+                (payer_vpa, payee_vpa),
+                self._merge_edge(payer_vpa, payee_vpa, before, 1, amount, timestamp)
+            )
+            return
+
+        key = (payer_vpa, payee_vpa)
+        pending = self._pending_edges.get(key)
+
+        if pending is None:
+            signals = self._lookup(payer_vpa, payee_vpa)
+            self._base_degrees[payer_vpa] = signals["degrees"][payer_vpa]
+            self._base_degrees[payee_vpa] = signals["degrees"][payee_vpa]
+
+            pending = self._pending_edges[key] = {
+                "base": signals["edge_stats"],
+                "count": 0,
+                "total_amount": 0,
+                "last_seen": None
+            }
+
+            if signals["edge_stats"] is None:
+                self._new_payees[payer_vpa] = self._new_payees.get(payer_vpa, 0) + 1
+                self._new_payers[payee_vpa] = self._new_payers.get(payee_vpa, 0) + 1
+
+                for op in self._degree_ops(payer_vpa, payee_vpa):
+                    self.writer.add(self.degree_col, op)
+
+        pending["count"] += 1
+        pending["total_amount"] += amount
+        pending["last_seen"] = timestamp
+
+        self.writer.add(self.col, UpdateOne(query, update, upsert=True))
+
+    # --------------------------------------------------
+    # GRAPH SIGNALS (one lookup)
+    # --------------------------------------------------
+    def get_graph_signals(self, payer_vpa: str, payee_vpa: str) -> dict:
+        """
+        Unique payees of the payer, unique payers of the payee and the
+        payer → payee edge stats.
+        """
+        key = (payer_vpa, payee_vpa)
+        base_known = (
+            payer_vpa in self._base_degrees
+            and payee_vpa in self._base_degrees
         )
 
+        if base_known and key in self._pending_edges:
+            payer_degrees = self._base_degrees[payer_vpa]
+            payee_degrees = self._base_degrees[payee_vpa]
+            edge_stats = self.get_edge_stats(payer_vpa, payee_vpa)
+        else:
+            signals = self._lookup(payer_vpa, payee_vpa)
+            payer_degrees = self._base_degrees.get(
+                payer_vpa, signals["degrees"][payer_vpa]
+            )
+            payee_degrees = self._base_degrees.get(
+                payee_vpa, signals["degrees"][payee_vpa]
+            )
+            edge_stats = (
+                self.get_edge_stats(payer_vpa, payee_vpa)
+                if key in self._pending_edges
+                else signals["edge_stats"]
+            )
+
+        return {
+            "payer_unique_payees": (
+                payer_degrees[0] + self._new_payees.get(payer_vpa, 0)
+            ),
+            "payee_unique_payers": (
+                payee_degrees[1] + self._new_payers.get(payee_vpa, 0)
+            ),
+            "edge_stats": edge_stats
+        }
+
     def get_edge_stats(self, payer_vpa: str, payee_vpa: str):
-        return self.col.find_one(
-            {"payer_vpa": payer_vpa, "payee_vpa": payee_vpa},
-            {"_id": 0}
+        pending = self._pending_edges.get((payer_vpa, payee_vpa))
+
+        if pending is None:
+            return self._lookup(payer_vpa, payee_vpa)["edge_stats"]
+
+        return self._merge_edge(
+            payer_vpa,
+            payee_vpa,
+            pending["base"],
+            pending["count"],
+            pending["total_amount"],
+            pending["last_seen"]
         )
 
     def get_unique_payees(self, payer_vpa: str) -> int:
-        return self.col.count_documents({"payer_vpa": payer_vpa})
+        out_degree, _ = self._base_degrees.get(payer_vpa) or self._get_degrees(payer_vpa)
+        return out_degree + self._new_payees.get(payer_vpa, 0)
 
     def get_unique_payers(self, payee_vpa: str) -> int:
-        return self.col.count_documents({"payee_vpa": payee_vpa})
+        _, in_degree = self._base_degrees.get(payee_vpa) or self._get_degrees(payee_vpa)
+        return in_degree + self._new_payers.get(payee_vpa, 0)
+
+    def prefetch(self, pairs: list[tuple[str, str]]):
+        """
+        Loads degrees and edges of a micro-batch with two queries, so
+        the per-event lookups are served from memory.
+        """
+        pairs = [
+            pair for pair in set(pairs)
+            if pair not in self._pending_edges and pair not in self._prefetched_edges
+        ]
+        if not pairs:
+            return
+
+        vpas = {vpa for pair in pairs for vpa in pair}
+        vpas -= self._base_degrees.keys()
+
+        degrees = {vpa: [0, 0] for vpa in vpas}
+        if vpas:
+            for doc in self.degree_col.find({"_id": {"$in": list(vpas)}}):
+                degrees[doc["_id"]] = [
+                    doc.get("out_degree", 0),
+                    doc.get("in_degree", 0)
+                ]
+
+        edges = dict.fromkeys(pairs)
+        for doc in self.col.find(
+            {"$or": [{"payer_vpa": a, "payee_vpa": b} for a, b in pairs]},
+            {"_id": 0}
+        ):
+            edges[(doc["payer_vpa"], doc["payee_vpa"])] = doc
+
+        if self.writer is None:
+            # direct mode has no batch overlay; the cache is the only home
+            for vpa, value in degrees.items():
+                self.cache.put(vpa, value)
+            for key, edge in edges.items():
+                if edge is not None:
+                    self.cache.put(key, edge)
+            return
+
+        self._base_degrees.update(degrees)
+        self._prefetched_edges.update(edges)
+
+    # --------------------------------------------------
+    # BACKFILL
+    # --------------------------------------------------
+    def rebuild_degrees(self):
+        """
+        Recomputes every degree counter from the edge collection.
+        """
+        self.degree_col.delete_many({})
+
+        for field, group_key in (
+            ("out_degree", "$payer_vpa"),
+            ("in_degree", "$payee_vpa")
+        ):
+            self.col.aggregate([
+                {"$group": {"_id": group_key, field: {"$sum": 1}}},
+                {"$merge": {
+                    "into": self.degree_col.name,
+                    "whenMatched": "merge",
+                    "whenNotMatched": "insert"
+                }}
+            ])
+
+        self.cache.clear()
+
+    # --------------------------------------------------
+    # INTERNALS
+    # --------------------------------------------------
+    def _lookup(self, payer_vpa: str, payee_vpa: str) -> dict:
+        """
+        Degrees of both VPAs and the edge doc in a single aggregation
+        (served from the LRU cache when all three are cached).
+        """
+        key = (payer_vpa, payee_vpa)
+
+        if (
+            key in self._prefetched_edges
+            and payer_vpa in self._base_degrees
+            and payee_vpa in self._base_degrees
+        ):
+            return {
+                "degrees": {
+                    payer_vpa: self._base_degrees[payer_vpa],
+                    payee_vpa: self._base_degrees[payee_vpa]
+                },
+                "edge_stats": self._prefetched_edges[key]
+            }
+
+        payer_degrees = self.cache.get(payer_vpa)
+        payee_degrees = self.cache.get(payee_vpa)
+
+        if payer_degrees and payee_degrees and key in self.cache:
+            return {
+                "degrees": {
+                    payer_vpa: payer_degrees,
+                    payee_vpa: payee_degrees
+                },
+                "edge_stats": self.cache.get(key)
+            }
+
+        docs = self.degree_col.aggregate([
+            {"$match": {"_id": {"$in": [payer_vpa, payee_vpa]}}},
+            {"$unionWith": {
+                "coll": self.col.name,
+                "pipeline": [
+                    {"$match": {"payer_vpa": payer_vpa, "payee_vpa": payee_vpa}},
+                    {"$project": {"_id": 0}},
+                    {"$replaceWith": {"edge": "$$ROOT"}}
+                ]
+            }}
+        ])
+
+        degrees = {payer_vpa: [0, 0], payee_vpa: [0, 0]}
+        edge_stats = None
+
+        for doc in docs:
+            if "edge" in doc:
+                edge_stats = doc["edge"]
+            else:
+                degrees[doc["_id"]] = [
+                    doc.get("out_degree", 0),
+                    doc.get("in_degree", 0)
+                ]
+
+        for vpa, value in degrees.items():
+            self.cache.put(vpa, value)
+        if edge_stats is not None:
+            self.cache.put(key, edge_stats)
+
+        return {"degrees": degrees, "edge_stats": edge_stats}
+
+    def _get_degrees(self, vpa: str) -> list:
+        cached = self.cache.get(vpa)
+        if cached:
+            return cached
+
+        doc = self.degree_col.find_one({"_id": vpa}) or {}
+        degrees = [doc.get("out_degree", 0), doc.get("in_degree", 0)]
+        self.cache.put(vpa, degrees)
+        return degrees
+
+    def _degree_ops(self, payer_vpa: str, payee_vpa: str) -> list:
+        return [
+            UpdateOne({"_id": payer_vpa}, {"$inc": {"out_degree": 1}}, upsert=True),
+            UpdateOne({"_id": payee_vpa}, {"$inc": {"in_degree": 1}}, upsert=True)
+        ]
+
+    def _cache_degree(self, vpa: str, index: int, delta: int):
+        cached = self.cache.get(vpa)
+        if cached:
+            cached[index] += delta
+
+    @staticmethod
+    def _merge_edge(payer_vpa, payee_vpa, base, count, total_amount, last_seen):
+        doc = dict(base or {
+            "payer_vpa": payer_vpa,
+            "payee_vpa": payee_vpa
+        })
+        doc["count"] = doc.get("count", 0) + count
+        doc["total_amount"] = doc.get("total_amount", 0) + total_amount
+        doc["last_seen"] = last_seen
+        return doc
+
+    def _on_flush(self):
+        # pending state is in Mongo now; keep the cache in step with it
+        for (payer_vpa, payee_vpa) in self._pending_edges:
+            self.cache.put(
+                (payer_vpa, payee_vpa),
+                self.get_edge_stats(payer_vpa, payee_vpa)
+            )
+
+        for vpa, (out_degree, in_degree) in self._base_degrees.items():
+            self.cache.put(vpa, [
+                out_degree + self._new_payees.get(vpa, 0),
+                in_degree + self._new_payers.get(vpa, 0)
+            ])
+
+        self._pending_edges.clear()
+        self._prefetched_edges.clear()
+        self._base_degrees.clear()
+        self._new_payees.clear()
+        self._new_payers.clear()
+
+
+if __name__ == "__main__":
+    GraphStore().rebuild_degrees()
+    print("Graph degree counters rebuilt")
@@ -0,0 +1,191 @@
+# storage/indexes.py
+
+import argparse
+import os
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from storage.mongo import db
+from storage.velocity_window import VELOCITY_WINDOWS, MAX_LATENESS_SECONDS
+
+# Raw velocity docs are only replayed within the engine's retention
+# (longest window + lateness); keep one extra day for snapshot slack
+VELOCITY_TTL_SECONDS = int(os.getenv(
+    "VELOCITY_TTL_SECONDS",
+    VELOCITY_WINDOWS[-1][1] + MAX_LATENESS_SECONDS + 24 * 60 * 60
+))
+
+# =====================================================
+# DECLARED INDEXES (collection -> indexes)
+# =====================================================
+INDEXES = {
+    "upi_velocity": [
+        IndexModel(
+            [("payer_vpa", ASCENDING), ("timestamp", ASCENDING)]
+        ),
+        # retention + dashboard velocity alerts + restore replay
+        IndexModel(
+            [("timestamp", ASCENDING)],
+            expireAfterSeconds=VELOCITY_TTL_SECONDS
+        ),
+    ],
+    "upi_velocity_state": [
+        IndexModel([("last_id", ASCENDING)], sparse=True),
+    ],
+    "upi_graph_edges": [
+        IndexModel(
+            [("payer_vpa", ASCENDING), ("payee_vpa", ASCENDING)],
+            unique=True
+        ),
+        IndexModel([("payee_vpa", ASCENDING)]),
+        IndexModel([("count", DESCENDING)]),
+    ],
+    "upi_risk_profiles": [
+        IndexModel([("payer_vpa", ASCENDING)], unique=True),
+        IndexModel([("risk_score", DESCENDING)]),
+    ],
+    "upi_payer_features": [
+        IndexModel([("payer_vpa", ASCENDING)], unique=True),
+    ],
+    "processed_transactions": [
+        IndexModel([("transaction_id", ASCENDING)], unique=True),
+        # idempotency filter rebuild (retention window)
+        IndexModel([("processed_at", ASCENDING)]),
+    ],
+    "audit_decisions": [
+        # audit records carry the writer's `logged_at`, not an event time
+        IndexModel([("logged_at", DESCENDING)]),
+        IndexModel([("transaction_id", ASCENDING)]),
+        IndexModel([("actual_outcome", ASCENDING)], sparse=True),
+    ],
+    "audit_decision_counters": [
+        IndexModel(
+            [("granularity", ASCENDING), ("bucket", ASCENDING)]
+        ),
+        IndexModel([("expire_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "decision_logs": [
+        IndexModel([("timestamp", DESCENDING)]),
+    ],
+    # legacy state/* stores
+    "velocity_state": [
+        IndexModel(
+            [("payer_vpa", ASCENDING), ("timestamp", ASCENDING)]
+        ),
+    ],
+}
+
+
+def ensure_indexes(database=db) -> dict[str, list[str]]:
+    """
+    Creates every declared index (no-op for existing ones). Called by
+    the consumer / dashboard entry points, not at import.
+
+    Default index names are used, so indexes created by earlier
+    versions of the stores are recognized. An index that exists with
+    other options is reported instead of failing startup.
+    """
+    created = {}
+
+    for collection, indexes in INDEXES.items():
+        try:
+            created[collection] = database[collection].create_indexes(indexes)
+        except OperationFailure as e:
+            print(f"[INDEXES] {collection}: {e}")
+            created[collection] = []
+
+    return created
+
+# =====================================================
+# HOT QUERIES (checked with explain())
+# =====================================================
+def hot_queries() -> list[dict]:
+    now = datetime.utcnow()
+    vpa = "check@upi"
+
+    return [
+        {"name": "velocity payer range", "collection": "upi_velocity",
+         "filter": {"payer_vpa": vpa, "timestamp": {"$gte": now - timedelta(days=7)}}},
+        {"name": "velocity alerts window", "collection": "upi_velocity",
+         "filter": {"timestamp": {"$gte": now - timedelta(hours=1)}}},
+        {"name": "velocity replay", "collection": "upi_velocity",
+         "filter": {"_id": {"$gt": ObjectId.from_datetime(now)}}, "sort": [("_id", 1)]},
+        {"name": "velocity snapshots", "collection": "upi_velocity_state",
+         "filter": {"last_id": {"$exists": True}}},
+        {"name": "graph edge", "collection": "upi_graph_edges",
+         "filter": {"payer_vpa": vpa, "payee_vpa": vpa}},
+        {"name": "graph payer edges", "collection": "upi_graph_edges",
+         "filter": {"payer_vpa": vpa}},
+        {"name": "graph alerts", "collection": "upi_graph_edges",
+         "filter": {"count": {"$gte": 4}}, "sort": [("count", -1)], "limit": 20},
+        {"name": "graph degrees", "collection": "upi_graph_degrees",
+         "filter": {"_id": {"$in": [vpa]}}},
+        {"name": "risk profile", "collection": "upi_risk_profiles",
+         "filter": {"payer_vpa": vpa}},
+        {"name": "top risky users", "collection": "upi_risk_profiles",
+         "filter": {}, "sort": [("risk_score", -1)], "limit": 10},
+        {"name": "payer features", "collection": "upi_payer_features",
+         "filter": {"payer_vpa": {"$in": [vpa]}}},
+        {"name": "processed txn", "collection": "processed_transactions",
+         "filter": {"transaction_id": "check"}},
+        {"name": "idempotency rebuild", "collection": "processed_transactions",
+         "filter": {"processed_at": {"$gte": now - timedelta(days=30)}}},
+        {"name": "recent decisions", "collection": "audit_decisions",
+         "filter": {}, "sort": [("logged_at", -1)], "limit": 50},
+        {"name": "decisions with outcome", "collection": "audit_decisions",
+         "filter": {"actual_outcome": {"$exists": True}}},
+        {"name": "decision counters", "collection": "audit_decision_counters",
+         "filter": {"granularity": "hour", "bucket": {"$gte": now - timedelta(days=1)}}},
+    ]
+
+
+def _stages(plan: dict):
+    yield plan.get("stage")
+
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+def check_query_plans(database=db) -> list[dict]:
+    """
+    Explains every hot query; returns the ones whose winning plan
+    contains a COLLSCAN.
+    """
+    failures = []
+
+    for query in hot_queries():
+        cursor = database[query["collection"]].find(query["filter"])
+        if "sort" in query:
+            cursor = cursor.sort(query["sort"])
+        if "limit" in query:
+            cursor = cursor.limit(query["limit"])
+
+        plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        stages = [s for s in _stages(plan) if s]
+
+        status = "COLLSCAN" if "COLLSCAN" in stages else "ok"
+        print(f"[PLAN] {query['name']:<24} {status:<8} {' <- '.join(stages)}")
+
+        if status == "COLLSCAN":
+            failures.append({"query": query["name"], "stages": stages})
+
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Provision and check MongoDB indexes")
+    parser.add_argument("--check", action="store_true",
+                        help="explain hot queries and fail on COLLSCAN")
+    args = parser.parse_args()
+
+    for collection, names in ensure_indexes().items():
+        print(f"[INDEXES] {collection}: {', '.join(names) or '-'}")
+
+    if args.check and check_query_plans():
+        raise SystemExit("Hot queries without an index (COLLSCAN) found")
@@ -0,0 +1,47 @@
+# storage/lru_cache.py
+
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class LRUCache:
+    """
+    Small in-process LRU map. A maxsize of 0 disables it:
+    `get` always misses and `put` is a no-op.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if key not in self._data:
+            return default
+
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+
+        self._data[key] = value
+        self._data.move_to_end(key)
+
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        return self._data.pop(key, default)
+
+    def keys(self) -> list:
+        return list(self._data)
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -1,11 +1,190 @@
+# storage/mongo.py
+
+import os
+import threading
+
 from pymongo import MongoClient
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+from monitoring.metrics import mongo_listeners
 
 # Default local MongoDB
-MONGO_URI = "mongodb://localhost:27017"
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB = os.getenv("MONGO_DB", "fraud_db")
+
+# =====================================================
+# WORKLOADS (one pool each, per process)
+# =====================================================
+# Any option can be overridden per workload with
+# MONGO_<WORKLOAD>_<OPTION>, e.g. MONGO_HOT_PATH_MAXPOOLSIZE=100
+WORKLOADS = {
+    # consumer + API stores: short timeouts, primary reads, acked writes
+    "hot_path": {
+        "maxPoolSize": 50,
+        "minPoolSize": 5,
+        "maxIdleTimeMS": 300_000,
+        "waitQueueTimeoutMS": 2_000,
+        "serverSelectionTimeoutMS": 5_000,
+        "connectTimeoutMS": 2_000,
+        "socketTimeoutMS": 10_000,
+        "readPreference": "primary",
+        "w": 1,
+    },
+    # dashboard aggregations: may read from secondaries, longer queries
+    "dashboard": {
+        "maxPoolSize": 20,
+        "minPoolSize": 0,
+        "maxIdleTimeMS": 60_000,
+        "waitQueueTimeoutMS": 5_000,
+        "serverSelectionTimeoutMS": 5_000,
+        "connectTimeoutMS": 5_000,
+        "socketTimeoutMS": 30_000,
+        "readPreference": "secondaryPreferred",
+        "w": 1,
+    },
+    # offline jobs (evaluation, backfills, learners)
+    "batch": {
+        "maxPoolSize": 10,
+        "minPoolSize": 0,
+        "serverSelectionTimeoutMS": 30_000,
+        "connectTimeoutMS": 10_000,
+        "socketTimeoutMS": 0,
+        "readPreference": "secondaryPreferred",
+        "w": "majority",
+    },
+}
+
+
+def client_options(workload: str) -> dict:
+    if workload not in WORKLOADS:
+        raise ValueError(f"Unknown Mongo workload: {workload}")
+
+    options = {}
+    for option, default in WORKLOADS[workload].items():
+        raw = os.getenv(f"MONGO_{workload.upper()}_{option.upper()}")
+
+        if raw is None:
+            options[option] = default
+        elif isinstance(default, int) and raw.lstrip("-").isdigit():
+            options[option] = int(raw)
+        elif option == "w" and raw.isdigit():
+            options[option] = int(raw)
+        else:
+            options[option] = raw
+
+    return options
+
+# =====================================================
+# CLIENT FACTORY
+# =====================================================
+_clients: dict[str, MongoClient] = {}
+_clients_pid = os.getpid()
+_lock = threading.Lock()
+
+
+def _forget_clients():
+    """
+    pymongo clients are not fork-safe: a child process drops the ones it
+    inherited (their sockets belong to the parent) and creates its own
+    on first use.
+    """
+    global _clients, _clients_pid, _lock
+    _clients = {}
+    _clients_pid = os.getpid()
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_clients)
+
+
+def get_client(workload: str = "hot_path") -> MongoClient:
+    """
+    The process-wide client of a workload, created on first use.
+    """
+    if _clients_pid != os.getpid():
+        _forget_clients()
+
+    client = _clients.get(workload)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(workload)
+        if client is None:
+            client = _clients[workload] = MongoClient(
+                MONGO_URI,
+                appname=f"fraud-{workload}",
+                event_listeners=mongo_listeners(workload),
+                **client_options(workload)
+            )
+        return client
+
+
+def get_db(workload: str = "hot_path") -> Database:
+    return get_client(workload)[MONGO_DB]
+
+
+def close_clients():
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+
+    for client in clients:
+        client.close()
+
+
+class _LazyCollection:
+    """
+    Collection handle that follows the workload's current client, so
+    stores and module globals can bind `db[...]` at import: no pool is
+    opened until the first operation, and after a fork (or
+    close_clients()) the next operation goes through the new client.
+    """
+
+    def __init__(self, workload: str, name: str):
+        self.workload = workload
+        self.name = name
+        # (client, collection) resolved for the current process
+        self._bound = (None, None)
+
+    @property
+    def full_name(self) -> str:
+        # without resolving (WriteBehindBuffer keys on it at import)
+        return f"{MONGO_DB}.{self.name}"
+
+    def resolve(self) -> Collection:
+        client = get_client(self.workload)
+        bound_client, collection = self._bound
+
+        if client is not bound_client:
+            collection = client[MONGO_DB][self.name]
+            self._bound = (client, collection)
+
+        return collection
+
+    def __getattr__(self, attr: str):
+        return getattr(self.resolve(), attr)
+
+
+class _LazyDatabase:
+    """
+    Module-level `db` handle. Collections taken from it are lazy (see
+    _LazyCollection); other attributes resolve the workload's database
+    on every access.
+    """
+
+    def __init__(self, workload: str):
+        self.workload = workload
+
+    def __getitem__(self, name: str) -> _LazyCollection:
+        return _LazyCollection(self.workload, name)
 
-client = MongoClient(MONGO_URI)
+    def __getattr__(self, name: str):
+        return getattr(get_db(self.workload), name)
 
-db = client["fraud_db"]
 
-# Collections
-velocity_collection = db["velocity_state"]
+db = _LazyDatabase("hot_path")
+dashboard_db = _LazyDatabase("dashboard")
+batch_db = _LazyDatabase("batch")
@@ -1,34 +1,202 @@
 # storage/processed_txn_store.py
 
-from datetime import datetime
+import os
+from datetime import datetime, timedelta, timezone
+from pymongo import InsertOne
+from pymongo.errors import DuplicateKeyError
 from storage.mongo import db
+from storage.bloom_filter import ScalableBloomFilter
+from storage.lru_cache import LRUCache
+from storage.write_behind import WriteBehindBuffer
+
+# Ids processed within this window are loaded into the filter at startup.
+# Older events are checked against Mongo instead of the filter.
+IDEMPOTENCY_RETENTION_DAYS = float(os.getenv("IDEMPOTENCY_RETENTION_DAYS", 30))
+IDEMPOTENCY_BLOOM_CAPACITY = int(os.getenv("IDEMPOTENCY_BLOOM_CAPACITY", 1_000_000))
+IDEMPOTENCY_BLOOM_ERROR_RATE = float(os.getenv("IDEMPOTENCY_BLOOM_ERROR_RATE", 0.001))
+IDEMPOTENCY_LRU_SIZE = int(os.getenv("IDEMPOTENCY_LRU_SIZE", 100_000))
 
 
 class ProcessedTransactionStore:
     """
     Ensures idempotency & replay protection.
     Each transaction_id is processed exactly once.
+
+    The unique index on `transaction_id` is the source of truth. In
+    front of it, a scalable Bloom filter answers "never seen" without a
+    query and an LRU of recent ids answers "seen"; Mongo is consulted
+    only for filter hits that are not in the LRU (mostly false
+    positives), and for events older than the ids the filter was loaded
+    with, whose filter miss proves nothing.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        writer: WriteBehindBuffer | None = None,
+        retention_days: float = IDEMPOTENCY_RETENTION_DAYS
+    ):
+        # unique index on transaction_id: storage/indexes.py
         self.col = db["processed_transactions"]
-        self.col.create_index("transaction_id", unique=True)
 
-    def is_processed(self, transaction_id: str) -> bool:
-        return self.col.find_one(
+        self.retention_days = retention_days
+        self.bloom = None
+        # the filter holds every id processed since then
+        self._since = None
+        self.recent = LRUCache(IDEMPOTENCY_LRU_SIZE)
+
+        # metrics
+        self.bloom_negatives = 0
+        self.lru_hits = 0
+        self.mongo_lookups = 0
+
+        # Write-behind mode: ids marked in the current batch
+        self.writer = writer
+        self._pending = set()
+
+        # prefetched ids of the current batch that Mongo does not have
+        self._absent = set()
+
+        if writer is not None:
+            writer.ignore_duplicates(self.col)
+            writer.on_flush(self._pending.clear)
+
+    def is_processed(
+        self,
+        transaction_id: str,
+        event_time: datetime | None = None
+    ) -> bool:
+        if transaction_id in self._pending:
+            return True
+
+        self._ensure_loaded()
+
+        if transaction_id not in self.bloom and self._covers(event_time):
+            self.bloom_negatives += 1
+            return False
+
+        if transaction_id in self.recent:
+            self.lru_hits += 1
+            return True
+
+        if transaction_id in self._absent:
+            return False
+
+        self.mongo_lookups += 1
+        found = self.col.find_one(
             {"transaction_id": transaction_id},
             {"_id": 1}
         ) is not None
 
+        if found:
+            self.recent.put(transaction_id, True)
+        return found
+
+    def prefetch(self, transactions: list[tuple[str, datetime | None]]):
+        """
+        Resolves the filter hits of a micro-batch, and its events older
+        than the filter, with one query. Takes (transaction_id,
+        event_time) pairs.
+        """
+        self._ensure_loaded()
+
+        candidates = {
+            txn_id for txn_id, event_time in transactions
+            if txn_id not in self._pending
+            and (txn_id in self.bloom or not self._covers(event_time))
+            and txn_id not in self.recent
+        }
+        self._absent = set(candidates)
+
+        if not candidates:
+            return
+
+        self.mongo_lookups += 1
+        for doc in self.col.find(
+            {"transaction_id": {"$in": list(candidates)}},
+            {"_id": 0, "transaction_id": 1}
+        ):
+            self.recent.put(doc["transaction_id"], True)
+            self._absent.discard(doc["transaction_id"])
+
     def mark_processed(
         self,
         transaction_id: str,
         decision: str,
         source: str = "UPI_CONSUMER"
-    ):
-        self.col.insert_one({
+    ) -> bool:
+        """
+        Returns False if the id was already stored (direct mode only;
+        the write-behind buffer drops duplicates at flush).
+        """
+        doc = {
             "transaction_id": transaction_id,
             "decision": decision,
             "source": source,
             "processed_at": datetime.utcnow()
-        })
+        }
+
+        self._ensure_loaded()
+        self.bloom.add(transaction_id)
+        self.recent.put(transaction_id, True)
+        self._absent.discard(transaction_id)
+
+        if self.writer is None:
+            try:
+                self.col.insert_one(doc)
+            except DuplicateKeyError:
+                print(f"[IDEMPOTENCY] {transaction_id} was already processed")
+                return False
+            return True
+
+        self._pending.add(transaction_id)
+        self.writer.add(self.col, InsertOne(doc))
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "bloom_keys": len(self.bloom) if self.bloom else 0,
+            "bloom_bytes": self.bloom.size_bytes if self.bloom else 0,
+            "bloom_negatives": self.bloom_negatives,
+            "lru_hits": self.lru_hits,
+            "mongo_lookups": self.mongo_lookups
+        }
+
+    # --------------------------------------------------
+    # STARTUP
+    # --------------------------------------------------
+    def _ensure_loaded(self):
+        if self.bloom is None:
+            self.rebuild()
+
+    def _covers(self, event_time: datetime | None) -> bool:
+        # an id is processed after its event happened: events since the
+        # filter's window start are in it if they were processed at all
+        if event_time is None:
+            return True
+        if event_time.tzinfo is not None:
+            event_time = event_time.astimezone(timezone.utc).replace(tzinfo=None)
+        return event_time >= self._since
+
+    def rebuild(self):
+        """
+        Rebuilds the filter from ids processed within the retention window.
+        """
+        bloom = ScalableBloomFilter(
+            IDEMPOTENCY_BLOOM_CAPACITY, IDEMPOTENCY_BLOOM_ERROR_RATE
+        )
+        since = datetime.utcnow() - timedelta(days=self.retention_days)
+
+        cursor = self.col.find(
+            {"processed_at": {"$gte": since}},
+            {"_id": 0, "transaction_id": 1},
+            batch_size=10_000
+        )
+        for doc in cursor:
+            bloom.add(doc["transaction_id"])
+
+        self.bloom = bloom
+        self._since = since
+        print(
+            f"[IDEMPOTENCY] filter loaded with {len(bloom)} ids "
+            f"({bloom.size_bytes / 1e6:.1f} MB)"
+        )
@@ -1,17 +1,104 @@
 # storage/risk_profile_repo.py
 
+import os
 from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
 from storage.mongo import db
+from storage.lru_cache import LRUCache
+from storage.write_behind import WriteBehindBuffer
+
+# Write-through cache of hot profiles. Only safe while this process is
+# the sole writer of its payers (single consumer, or a partition worker).
+RISK_PROFILE_CACHE_SIZE = int(os.getenv("RISK_PROFILE_CACHE_SIZE", 0))
+
+DEFAULT_RISK_SCORE = 20
+
+# decision -> (risk_score delta, counter)
+DECISION_EFFECTS = {
+    "BLOCK": (15, "block_count"),
+    "STEP_UP_AUTH": (5, "stepup_count"),
+    "ALLOW": (-2, "allow_count"),
+}
+
+COUNTERS = ("allow_count", "block_count", "stepup_count")
+
+PROFILE_PROJECTION = {
+    "_id": 0,
+    "payer_vpa": 1,
+    "risk_score": 1,
+    "block_threshold": 1,
+    "step_up_threshold": 1,
+    **{c: 1 for c in COUNTERS}
+}
+
+
+def _thresholds(doc: dict) -> dict:
+    return {
+        "BLOCK": doc["block_threshold"],
+        "STEP_UP": doc["step_up_threshold"]
+    }
+
+
+def decision_pipeline(decision: str) -> list[dict]:
+    """
+    Aggregation-pipeline update applying one decision server-side:
+    risk_score moves and is clamped, the decision's counter goes up and
+    both thresholds are re-derived from the new score. Missing fields
+    (upsert of a new payer) start from the default profile.
+    """
+    risk_score = {"$ifNull": ["$risk_score", DEFAULT_RISK_SCORE]}
+    delta, counter = DECISION_EFFECTS.get(decision, (0, None))
+
+    if delta > 0:
+        risk_score = {"$min": [100, {"$add": [risk_score, delta]}]}
+    elif delta < 0:
+        risk_score = {"$max": [0, {"$add": [risk_score, delta]}]}
+
+    return [
+        {"$set": {
+            "risk_score": risk_score,
+            **{
+                c: {"$add": [{"$ifNull": [f"${c}", 0]}, int(c == counter)]}
+                for c in COUNTERS
+            },
+            "last_updated": datetime.utcnow()
+        }},
+        {"$set": {
+            "block_threshold": {"$max": [
+                0.60, {"$subtract": [0.85, {"$divide": ["$risk_score", 300]}]}
+            ]},
+            "step_up_threshold": {"$max": [
+                0.25, {"$subtract": [0.45, {"$divide": ["$risk_score", 500]}]}
+            ]}
+        }}
+    ]
 
 
 class RiskProfileStore:
     """
     Stores adaptive risk profiles and thresholds per UPI payer.
     Backed by MongoDB.
+
+    A decision is applied with one atomic pipeline update (no
+    read-modify-write), so concurrent consumers never lose updates.
+    Direct mode uses `find_one_and_update` and gets the new thresholds
+    back in the same round trip.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        writer: WriteBehindBuffer | None = None,
+        cache_size: int = RISK_PROFILE_CACHE_SIZE
+    ):
         self.collection = db["upi_risk_profiles"]
+        self.cache = LRUCache(cache_size)
+
+        # Write-behind mode: profiles read / updated in the current batch
+        self.writer = writer
+        self._pending = {}
+
+        if writer is not None:
+            writer.on_flush(self._on_flush)
 
     # --------------------------------------------------
     # DEFAULT PROFILE
@@ -19,7 +106,7 @@ class RiskProfileStore:
     def _default_profile(self, payer_vpa: str) -> dict:
         return {
             "payer_vpa": payer_vpa,
-            "risk_score": 20,                 # 0–100
+            "risk_score": DEFAULT_RISK_SCORE,   # 0–100
             "block_threshold": 0.85,
             "step_up_threshold": 0.45,
             "allow_count": 0,
@@ -32,65 +119,118 @@ class RiskProfileStore:
     # READ THRESHOLDS (used by fraud consumer)
     # --------------------------------------------------
     def get_thresholds(self, payer_vpa: str) -> dict:
-        doc = self.collection.find_one({"payer_vpa": payer_vpa})
+        """
+        Thresholds for the payer's next decision. A payer without a
+        profile gets the defaults; the profile is created by update().
+        """
+        return _thresholds(
+            self._find(payer_vpa) or self._default_profile(payer_vpa)
+        )
 
-        if not doc:
-            doc = self._default_profile(payer_vpa)
-            self.collection.insert_one(doc)
+    def prefetch(self, payer_vpas: list[str]):
+        """
+        Loads the profiles of a micro-batch with one query.
+        """
+        # without a batch overlay there is nowhere to keep misses
+        target = self._pending if self.writer is not None else None
+        if target is None and self.cache.maxsize <= 0:
+            return
 
-        return {
-            "BLOCK": doc["block_threshold"],
-            "STEP_UP": doc["step_up_threshold"]
+        missing = [
+            vpa for vpa in set(payer_vpas)
+            if vpa not in self._pending and vpa not in self.cache
+        ]
+        if not missing:
+            return
+
+        found = {
+            doc["payer_vpa"]: self._with_defaults(doc)
+            for doc in self.collection.find(
+                {"payer_vpa": {"$in": missing}}, PROFILE_PROJECTION
+            )
         }
 
+        for vpa in missing:
+            if target is not None:
+                target[vpa] = found.get(vpa) or self._default_profile(vpa)
+            elif vpa in found:
+                self.cache.put(vpa, found[vpa])
+
     # --------------------------------------------------
     # UPDATE FROM REAL-TIME DECISIONS
     # --------------------------------------------------
-    def update(self, payer_vpa: str, decision: str):
-        doc = self.collection.find_one({"payer_vpa": payer_vpa})
+    def update(self, payer_vpa: str, decision: str) -> dict:
+        """
+        Applies the decision and returns the payer's new thresholds.
+        """
+        query = {"payer_vpa": payer_vpa}
+        pipeline = decision_pipeline(decision)
+
+        if self.writer is None:
+            doc = self.collection.find_one_and_update(
+                query,
+                pipeline,
+                projection=PROFILE_PROJECTION,
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            self.cache.put(payer_vpa, doc)
+            return _thresholds(doc)
 
-        if not doc:
-            doc = self._default_profile(payer_vpa)
+        # Buffered: same math locally for in-batch reads, atomic update queued
+        doc = self._find(payer_vpa) or self._default_profile(payer_vpa)
+        doc = self._pending[payer_vpa] = {
+            **doc, **self._apply_decision(doc, decision)
+        }
+        self.writer.add(self.collection, UpdateOne(query, pipeline, upsert=True))
 
+        return _thresholds(doc)
+
+    def _apply_decision(self, doc: dict, decision: str) -> dict:
+        """
+        Python twin of decision_pipeline().
+        """
         risk_score = doc["risk_score"]
+        delta, counter = DECISION_EFFECTS.get(decision, (0, None))
 
-        # -------------------------
-        # Adaptive learning
-        # -------------------------
-        if decision == "BLOCK":
-            risk_score = min(100, risk_score + 15)
-            doc["block_count"] += 1
-
-        elif decision == "STEP_UP_AUTH":
-            risk_score = min(100, risk_score + 5)
-            doc["stepup_count"] += 1
-
-        elif decision == "ALLOW":
-            risk_score = max(0, risk_score - 2)
-            doc["allow_count"] += 1
-
-        # -------------------------
-        # Dynamic thresholds derived from risk
-        # -------------------------
-        block_threshold = max(0.60, 0.85 - (risk_score / 300))
-        step_up_threshold = max(0.25, 0.45 - (risk_score / 500))
-
-        # -------------------------
-        # Persist
-        # -------------------------
-        self.collection.update_one(
-            {"payer_vpa": payer_vpa},
-            {"$set": {
-                "risk_score": risk_score,
-                "block_threshold": block_threshold,
-                "step_up_threshold": step_up_threshold,
-                "allow_count": doc["allow_count"],
-                "block_count": doc["block_count"],
-                "stepup_count": doc["stepup_count"],
-                "last_updated": datetime.utcnow()
-            }},
-            upsert=True
-        )
+        if delta > 0:
+            risk_score = min(100, risk_score + delta)
+        elif delta < 0:
+            risk_score = max(0, risk_score + delta)
+
+        return {
+            "risk_score": risk_score,
+            "block_threshold": max(0.60, 0.85 - (risk_score / 300)),
+            "step_up_threshold": max(0.25, 0.45 - (risk_score / 500)),
+            **{c: doc[c] + int(c == counter) for c in COUNTERS},
+            "last_updated": datetime.utcnow()
+        }
+
+    def _find(self, payer_vpa: str) -> dict | None:
+        if payer_vpa in self._pending:
+            return self._pending[payer_vpa]
+
+        cached = self.cache.get(payer_vpa)
+        if cached is not None:
+            return cached
+
+        doc = self.collection.find_one({"payer_vpa": payer_vpa}, PROFILE_PROJECTION)
+        if doc is not None:
+            doc = self._with_defaults(doc)
+            self.cache.put(payer_vpa, doc)
+        return doc
+
+    def _with_defaults(self, doc: dict) -> dict:
+        # profiles created by tighten/relax only carry a risk_score
+        if all(k in doc for k in PROFILE_PROJECTION if k != "_id"):
+            return doc
+        return {**self._default_profile(doc["payer_vpa"]), **doc}
+
+    def _on_flush(self):
+        # updated profiles are in Mongo now; keep the cache in step
+        for payer_vpa, doc in self._pending.items():
+            self.cache.put(payer_vpa, doc)
+        self._pending.clear()
 
     # --------------------------------------------------
     # ONLINE LEARNING FROM FEEDBACK
@@ -104,6 +244,7 @@ class RiskProfileStore:
             {"$inc": {"risk_score": 10}},
             upsert=True
         )
+        self.cache.pop(payer_vpa)
         print(f"[USER LEARNING] tightened thresholds for {payer_vpa}")
 
     def relax_user_thresholds(self, payer_vpa: str):
@@ -115,4 +256,5 @@ class RiskProfileStore:
             {"$inc": {"risk_score": -5}},
             upsert=True
         )
+        self.cache.pop(payer_vpa)
         print(f"[USER LEARNING] relaxed thresholds for {payer_vpa}")
@@ -1,37 +1,217 @@
+import os
+import time
 from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+
+from event_queue.event_queue import partition_for
 from storage.mongo import db
+from storage.velocity_window import SlidingWindowVelocity
+from storage.write_behind import WriteBehindBuffer
+
+SNAPSHOT_INTERVAL_S = float(os.getenv("VELOCITY_SNAPSHOT_INTERVAL_S", 60))
+
+# Velocity docs inserted shortly before a snapshot may not be in it yet
+SNAPSHOT_REPLAY_SLACK = timedelta(minutes=5)
+
+SNAPSHOT_META_ID = "__meta__"
+
 
 class VelocityStore:
-    def __init__(self):
+    """
+    Per-payer transaction velocity.
+
+    Raw transactions are still appended to `upi_velocity` (dashboard
+    alerts read it), but features are served from an in-memory sliding
+    window engine. Its state is snapshotted to `upi_velocity_state` and
+    restored on startup by loading the snapshot and replaying the
+    velocity docs inserted after it.
+
+    With `partition=(index, count)` the store only owns payers hashed to
+    that partition and keeps its own snapshot marker.
+    """
+
+    def __init__(
+        self,
+        snapshot_interval_s: float = SNAPSHOT_INTERVAL_S,
+        writer: WriteBehindBuffer | None = None,
+        partition: tuple[int, int] | None = None
+    ):
         self.col = db["upi_velocity"]
+        self.state_col = db["upi_velocity_state"]
+
+        # Write-behind mode: raw inserts are batched, the engine itself
+        # is updated immediately so reads see their own writes
+        self.writer = writer
 
+        self.partition = partition
+        self.meta_id = (
+            SNAPSHOT_META_ID if partition is None
+            else f"{SNAPSHOT_META_ID}{partition[0]}/{partition[1]}"
+        )
+
+        self.engine = SlidingWindowVelocity()
+        self.snapshot_interval_s = snapshot_interval_s
+
+        self._restored = False
+        self._dirty: dict[str, ObjectId] = {}
+        self._last_snapshot = time.monotonic()
+
+    # --------------------------------------------------
+    # WRITE
+    # --------------------------------------------------
     def record_transaction(self, payer_vpa: str, amount: float, timestamp: datetime):
-        self.col.insert_one({
+        self._ensure_restored()
+
+        doc_id = ObjectId()
+        doc = {
+            "_id": doc_id,
             "payer_vpa": payer_vpa,
             "amount": amount,
             "timestamp": timestamp
-        })
+        }
 
-    def get_features(self, payer_vpa: str, now: datetime) -> dict:
-        last_1hr = now - timedelta(hours=1)
-        last_24hr = now - timedelta(hours=24)
-        last_7d = now - timedelta(days=7)
+        if self.writer is None:
+            self.col.insert_one(doc)
+        else:
+            self.writer.add(self.col, InsertOne(doc))
 
-        txns = list(self.col.find({
-            "payer_vpa": payer_vpa,
-            "timestamp": {"$gte": last_7d}
-        }))
+        self.engine.record(payer_vpa, timestamp, amount)
+        self._dirty[payer_vpa] = doc_id
 
-        tx_1hr = [t for t in txns if t["timestamp"] >= last_1hr]
-        tx_24hr = [t for t in txns if t["timestamp"] >= last_24hr]
+    # --------------------------------------------------
+    # READ
+    # --------------------------------------------------
+    def get_features(
+        self,
+        payer_vpa: str,
+        now: datetime,
+        pending: list[dict] | None = None
+    ) -> dict:
+        """
+        `pending` holds transactions of the current micro-batch that
+        are not recorded yet, so earlier events in the batch still
+        count towards later ones.
+        """
+        self._ensure_restored()
 
-        avg_7d = (
-            sum(t["amount"] for t in txns) / len(txns)
-            if txns else 0.0
-        )
+        windows = self.engine.query(payer_vpa, now)
+
+        count_1hr, _ = windows["1hr"]
+        count_24hr, _ = windows["24hr"]
+        count_7d, sum_7d = windows["7d"]
+
+        if pending:
+            last_1hr = now - timedelta(hours=1)
+            last_24hr = now - timedelta(hours=24)
+            last_7d = now - timedelta(days=7)
+
+            for t in pending:
+                if t["timestamp"] >= last_7d:
+                    count_7d += 1
+                    sum_7d += t["amount"]
+                if t["timestamp"] >= last_24hr:
+                    count_24hr += 1
+                if t["timestamp"] >= last_1hr:
+                    count_1hr += 1
 
         return {
-            "transactions_last_1hr": len(tx_1hr),
-            "transactions_last_24hr": len(tx_24hr),
-            "avg_amount_last_7_days": avg_7d
+            "transactions_last_1hr": count_1hr,
+            "transactions_last_24hr": count_24hr,
+            "avg_amount_last_7_days": sum_7d / count_7d if count_7d else 0.0
         }
+
+    # --------------------------------------------------
+    # SNAPSHOT / RESTORE
+    # --------------------------------------------------
+    def maybe_snapshot(self):
+        if time.monotonic() - self._last_snapshot >= self.snapshot_interval_s:
+            self.snapshot()
+
+    def snapshot(self):
+        """
+        Persists the windows of payers touched since the last snapshot.
+        """
+        taken_at = datetime.utcnow()
+        ops = []
+
+        for payer_vpa, last_id in self._dirty.items():
+            window = self.engine.payers.get(payer_vpa)
+
+            if window is None:
+                ops.append(UpdateOne(
+                    {"_id": payer_vpa},
+                    {"$set": {"times": [], "amounts": [], "last_id": last_id}},
+                    upsert=True
+                ))
+                continue
+
+            ops.append(UpdateOne(
+                {"_id": payer_vpa},
+                {"$set": {
+                    "times": list(window.times),
+                    "amounts": list(window.amounts),
+                    "last_id": last_id
+                }},
+                upsert=True
+            ))
+
+        ops.append(UpdateOne(
+            {"_id": self.meta_id},
+            {"$set": {"taken_at": taken_at}},
+            upsert=True
+        ))
+
+        self.state_col.bulk_write(ops, ordered=False)
+
+        self._dirty.clear()
+        self._last_snapshot = time.monotonic()
+
+    def restore(self):
+        """
+        Loads the last snapshot, then replays newer velocity docs.
+        Without a snapshot, rebuilds from the last 7 days of history.
+        """
+        meta = self.state_col.find_one({"_id": self.meta_id})
+        last_ids = {}
+
+        if meta is None:
+            since = datetime.utcnow() - timedelta(seconds=self.engine.retention)
+            replay = self.col.find(
+                {"timestamp": {"$gte": since}}
+            ).sort("timestamp", 1)
+        else:
+            for doc in self.state_col.find({"last_id": {"$exists": True}}):
+                if not self._owns(doc["_id"]):
+                    continue
+                self.engine.load(doc["_id"], doc["times"], doc["amounts"])
+                last_ids[doc["_id"]] = doc["last_id"]
+
+            replay_from = ObjectId.from_datetime(
+                meta["taken_at"] - SNAPSHOT_REPLAY_SLACK
+            )
+            replay = self.col.find({"_id": {"$gt": replay_from}}).sort("_id", 1)
+
+        for doc in replay:
+            if not self._owns(doc["payer_vpa"]):
+                continue
+            last_id = last_ids.get(doc["payer_vpa"])
+            if last_id is not None and doc["_id"] <= last_id:
+                continue
+            self.engine.record(doc["payer_vpa"], doc["timestamp"], doc["amount"])
+
+        self.engine.sweep()
+        self._restored = True
+
+        print(f"[VELOCITY] restored state for {len(self.engine.payers)} payers")
+
+    def _owns(self, payer_vpa: str) -> bool:
+        if self.partition is None:
+            return True
+        index, count = self.partition
+        return partition_for(payer_vpa, count) == index
+
+    def _ensure_restored(self):
+        if not self._restored:
+            self.restore()
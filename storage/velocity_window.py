@@ -0,0 +1,206 @@
+# storage/velocity_window.py
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from math import fsum, inf
+
+EPOCH = datetime(1970, 1, 1)
+
+# (label, seconds) – order matters, the last window is the retention
+VELOCITY_WINDOWS = (
+    ("1hr", 60 * 60),
+    ("24hr", 24 * 60 * 60),
+    ("7d", 7 * 24 * 60 * 60),
+)
+
+# Physically drop expired entries only once this many piled up
+COMPACT_MIN_EXPIRED = 64
+
+# Sweep idle payers every N recorded transactions
+SWEEP_EVERY = 10_000
+
+# Late events may query this far behind the newest timestamp seen
+MAX_LATENESS_SECONDS = 6 * 60 * 60
+
+
+def to_epoch_seconds(ts: datetime) -> float:
+    """
+    Naive timestamps are treated as UTC (what the producer and Mongo use).
+    """
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return (ts - EPOCH).total_seconds()
+
+
+class PayerWindow:
+    """
+    Time-ordered transactions of one payer with a running count/sum
+    per sliding window. Each window keeps a start pointer that only
+    moves forward while query times increase, so a query is O(1)
+    amortized. Out-of-order timestamps fall back to a bisect.
+    """
+
+    __slots__ = ("times", "amounts", "starts", "cutoffs", "counts", "sums")
+
+    def __init__(self, n_windows: int):
+        self.times = []
+        self.amounts = []
+        self.starts = [0] * n_windows
+        self.cutoffs = [-inf] * n_windows
+        self.counts = [0] * n_windows
+        self.sums = [0.0] * n_windows
+
+    # --------------------------------------------------
+    # APPEND
+    # --------------------------------------------------
+    def add(self, t: float, amount: float):
+        if self.times and t < self.times[-1]:
+            pos = bisect_right(self.times, t)
+            self.times.insert(pos, t)
+            self.amounts.insert(pos, amount)
+            self._recompute()
+            return
+
+        self.times.append(t)
+        self.amounts.append(amount)
+
+        for i, cutoff in enumerate(self.cutoffs):
+            if t >= cutoff:
+                self.counts[i] += 1
+                self.sums[i] += amount
+            else:
+                # everything before is older than the cutoff too
+                self.starts[i] = len(self.times)
+
+    # --------------------------------------------------
+    # QUERY
+    # --------------------------------------------------
+    def advance(self, i: int, cutoff: float):
+        start = self.starts[i]
+
+        if cutoff >= self.cutoffs[i]:
+            while start < len(self.times) and self.times[start] < cutoff:
+                self.counts[i] -= 1
+                self.sums[i] -= self.amounts[start]
+                start += 1
+        else:
+            # query went back in time (late event)
+            new_start = bisect_left(self.times, cutoff, 0, start)
+            self.counts[i] += start - new_start
+            self.sums[i] += fsum(self.amounts[new_start:start])
+            start = new_start
+
+        if self.counts[i] == 0:
+            self.sums[i] = 0.0
+
+        self.starts[i] = start
+        self.cutoffs[i] = cutoff
+
+    # --------------------------------------------------
+    # EVICTION
+    # --------------------------------------------------
+    def evict(self, horizon: float) -> bool:
+        """
+        Drops entries older than `horizon` once enough accumulated.
+        Returns True when the window is empty.
+        """
+        # no later query reaches back past the horizon (see retention),
+        # so entries before it go even if a window still counts them
+        expired = bisect_left(self.times, horizon)
+
+        if expired >= COMPACT_MIN_EXPIRED or expired == len(self.times):
+            del self.times[:expired]
+            del self.amounts[:expired]
+            self.starts = [s - expired for s in self.starts]
+            self._recompute()
+
+        return not self.times
+
+    def _recompute(self):
+        for i, cutoff in enumerate(self.cutoffs):
+            start = bisect_left(self.times, cutoff)
+            self.starts[i] = start
+            self.counts[i] = len(self.times) - start
+            self.sums[i] = fsum(self.amounts[start:])
+
+
+class SlidingWindowVelocity:
+    """
+    In-memory velocity engine: per-payer ring of the last 7 days of
+    transactions with running 1h / 24h / 7d count and amount aggregates.
+    """
+
+    def __init__(
+        self,
+        windows: tuple = VELOCITY_WINDOWS,
+        max_lateness: float = MAX_LATENESS_SECONDS
+    ):
+        self.labels = [label for label, _ in windows]
+        self.spans = [span for _, span in windows]
+        self.retention = max(self.spans) + max_lateness
+
+        self.payers: dict[str, PayerWindow] = {}
+        self._watermark = -inf
+        self._since_sweep = 0
+
+    def record(self, payer_vpa: str, timestamp: datetime, amount: float):
+        t = to_epoch_seconds(timestamp)
+
+        window = self.payers.get(payer_vpa)
+        if window is None:
+            window = self.payers[payer_vpa] = PayerWindow(len(self.spans))
+
+        window.add(t, amount)
+        self._watermark = max(self._watermark, t)
+
+        self._since_sweep += 1
+        if self._since_sweep >= SWEEP_EVERY:
+            self.sweep()
+
+    def query(self, payer_vpa: str, now: datetime) -> dict:
+        """
+        Returns {label: (count, amount_sum)} for every window.
+        """
+        window = self.payers.get(payer_vpa)
+
+        if window is None:
+            return {label: (0, 0.0) for label in self.labels}
+
+        t = to_epoch_seconds(now)
+        self._watermark = max(self._watermark, t)
+
+        for i, span in enumerate(self.spans):
+            window.advance(i, t - span)
+
+        window.evict(self._watermark - self.retention)
+
+        return {
+            label: (window.counts[i], window.sums[i])
+            for i, label in enumerate(self.labels)
+        }
+
+    def sweep(self):
+        """
+        Evicts expired entries of every payer and forgets idle payers.
+        """
+        horizon = self._watermark - self.retention
+
+        for payer_vpa in list(self.payers):
+            if self.payers[payer_vpa].evict(horizon):
+                del self.payers[payer_vpa]
+
+        self._since_sweep = 0
+
+    def load(self, payer_vpa: str, times: list, amounts: list):
+        """
+        Restores a payer from a snapshot (times are epoch seconds).
+        """
+        window = PayerWindow(len(self.spans))
+        for t, amount in sorted(zip(times, amounts)):
+            window.times.append(t)
+            window.amounts.append(amount)
+        window._recompute()
+
+        if window.times:
+            self.payers[payer_vpa] = window
+            self._watermark = max(self._watermark, window.times[-1])
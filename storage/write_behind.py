@@ -0,0 +1,124 @@
+# storage/write_behind.py
+
+import os
+import time
+from concurrent.futures import Executor
+from typing import Callable
+
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError
+
+FLUSH_SIZE = int(os.getenv("WRITE_BEHIND_FLUSH_SIZE", 1000))
+FLUSH_INTERVAL_MS = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL_MS", 1000))
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class WriteBehindBuffer:
+    """
+    Collects Mongo write operations from the consumer stores and sends
+    them as one `bulk_write` per collection.
+
+    Stores keep an in-memory overlay of what they queued so reads inside
+    the batch still see their own writes; the overlay is dropped through
+    the `on_flush` callbacks once the writes reached Mongo.
+
+    The buffer never flushes by itself: a store's overlay and the ops
+    depending on it (e.g. an edge and its degree increments) must reach
+    Mongo together, so only the consumer flushes, at a batch boundary
+    between events. Size / interval only tell it (`due`) to close the
+    boundary early.
+    """
+
+    def __init__(
+        self,
+        flush_size: int = FLUSH_SIZE,
+        flush_interval_ms: float = FLUSH_INTERVAL_MS
+    ):
+        self.flush_size = flush_size
+        self.flush_interval_ms = flush_interval_ms
+
+        self._ops: dict[str, list] = {}
+        self._collections: dict[str, Collection] = {}
+        self._ignore_duplicates: set[str] = set()
+        self._listeners: list[Callable[[], None]] = []
+
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    # --------------------------------------------------
+    # REGISTRATION
+    # --------------------------------------------------
+    def on_flush(self, callback: Callable[[], None]):
+        self._listeners.append(callback)
+
+    def ignore_duplicates(self, collection: Collection):
+        """
+        Inserts into this collection are idempotent: duplicate key
+        errors are dropped and the remaining writes still go through.
+        """
+        self._ignore_duplicates.add(collection.full_name)
+
+    # --------------------------------------------------
+    # QUEUE
+    # --------------------------------------------------
+    def add(self, collection: Collection, op):
+        name = collection.full_name
+
+        self._collections[name] = collection
+        self._ops.setdefault(name, []).append(op)
+        self._pending += 1
+
+    @property
+    def due(self) -> bool:
+        if self._pending >= self.flush_size:
+            return True
+        elapsed_ms = (time.monotonic() - self._last_flush) * 1000
+        return self._pending > 0 and elapsed_ms >= self.flush_interval_ms
+
+    def __len__(self):
+        return self._pending
+
+    # --------------------------------------------------
+    # FLUSH
+    # --------------------------------------------------
+    def flush(self, executor: Executor | None = None):
+        """
+        Writes every queued operation. Returns only once Mongo
+        acknowledged them (per the collection's write concern).
+
+        With an `executor`, the per-collection bulk writes run
+        concurrently (order is only kept within a collection).
+        """
+        ops, self._ops = self._ops, {}
+
+        if executor is None:
+            for name, col_ops in ops.items():
+                self._write(name, col_ops)
+        else:
+            futures = [
+                executor.submit(self._write, name, col_ops)
+                for name, col_ops in ops.items()
+            ]
+            for future in futures:
+                future.result()
+
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+        for callback in self._listeners:
+            callback()
+
+    def _write(self, name: str, col_ops: list):
+        collection = self._collections[name]
+
+        if name not in self._ignore_duplicates:
+            collection.bulk_write(col_ops, ordered=True)
+            return
+
+        try:
+            collection.bulk_write(col_ops, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(err["code"] != DUPLICATE_KEY_ERROR for err in errors):
+                raise
@@ -0,0 +1,343 @@
+# tests/test_batch_scoring.py
+
+import importlib
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+lgb = pytest.importorskip("lightgbm")
+joblib = pytest.importorskip("joblib")
+pytest.importorskip("pymongo")
+pytest.importorskip("sklearn")
+
+from sklearn.calibration import CalibratedClassifierCV
+
+from data.upi_schema import UPI_FEATURE_COLUMNS
+from storage.write_behind import WriteBehindBuffer
+
+
+# --------------------------------------------------
+# In-memory stand-ins (no Mongo)
+# --------------------------------------------------
+class EmptyCollection:
+    """
+    A collection that keeps nothing: reads find nothing, writes are
+    dropped.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.full_name = f"test.{name}"
+
+    def find(self, *args, **kwargs):
+        return []
+
+    def find_one(self, *args, **kwargs):
+        return None
+
+    def aggregate(self, *args, **kwargs):
+        return []
+
+    def bulk_write(self, ops, ordered=True):
+        pass
+
+
+class GraphCollection(EmptyCollection):
+    """
+    Applies the graph store's `$inc` / `$set` upserts and answers its
+    reads (equality, `$in`, `$or` and the degree + edge lookup).
+    """
+
+    def __init__(self, name: str, collections: dict):
+        super().__init__(name)
+        self.docs = []
+        # by name, for $unionWith
+        self.collections = collections
+        collections[name] = self
+
+    @classmethod
+    def matches(cls, doc: dict, query: dict) -> bool:
+        if "$or" in query:
+            return any(cls.matches(doc, q) for q in query["$or"])
+
+        for field, cond in query.items():
+            if isinstance(cond, dict) and "$in" in cond:
+                if doc.get(field) not in cond["$in"]:
+                    return False
+            elif doc.get(field) != cond:
+                return False
+        return True
+
+    def find(self, query=None, projection=None):
+        return [dict(doc) for doc in self.docs if self.matches(doc, query or {})]
+
+    def find_one(self, query=None, projection=None):
+        return next(iter(self.find(query)), None)
+
+    def aggregate(self, pipeline):
+        (_, match), (_, union) = (next(iter(stage.items())) for stage in pipeline)
+        edges = self.collections[union["coll"]].find(union["pipeline"][0]["$match"])
+        return self.find(match) + [{"edge": edge} for edge in edges]
+
+    def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            assert op._upsert
+            doc = next((d for d in self.docs if self.matches(d, op._filter)), None)
+            if doc is None:
+                doc = dict(op._filter)
+                self.docs.append(doc)
+
+            for field, delta in op._doc.get("$inc", {}).items():
+                doc[field] = doc.get(field, 0) + delta
+            doc.update(op._doc.get("$set", {}))
+
+
+class KeepPendingWriter:
+    """
+    Write-behind buffer that never flushes: every store keeps what it
+    queued in its batch overlay, which then reads like a database that
+    applied all writes.
+    """
+
+    due = False
+
+    def __init__(self):
+        self.ops = []
+
+    def add(self, collection, op):
+        self.ops.append(op)
+
+    def on_flush(self, callback):
+        pass
+
+    def ignore_duplicates(self, collection):
+        pass
+
+    def flush(self, executor=None):
+        pass
+
+
+class CollectingAuditWriter:
+    def __init__(self):
+        self.records = []
+
+    def write_many(self, records):
+        self.records.extend(records)
+
+    def flush(self, timeout=None):
+        pass
+
+
+# --------------------------------------------------
+# Models
+# --------------------------------------------------
+def train_models():
+    rng = np.random.default_rng(0)
+    n = 4000
+    X = pd.DataFrame({
+        "transaction_amount": rng.exponential(2000, n),
+        "hour_of_day": rng.integers(0, 24, n),
+        "day_of_week": rng.integers(0, 7, n),
+        "transactions_last_1hr": rng.poisson(2, n),
+        "transactions_last_24hr": rng.poisson(8, n),
+        "avg_amount_last_7_days": rng.exponential(1500, n),
+        "device_change_flag": rng.integers(0, 2, n),
+        "location_change_flag": rng.integers(0, 2, n),
+        "failed_attempts_last_1hr": rng.poisson(0.5, n),
+        "receiver_new_flag": rng.integers(0, 2, n),
+    }, columns=UPI_FEATURE_COLUMNS).astype(float)
+
+    logit = (
+        X["transaction_amount"] / 2500 + X["transactions_last_1hr"] * 0.4
+        + X["receiver_new_flag"] - 3
+    )
+    y = (rng.uniform(size=n) < 1 / (1 + np.exp(-logit))).astype(int)
+
+    challenger = lgb.LGBMClassifier(n_estimators=50, random_state=0, verbose=-1)
+    challenger.fit(X.iloc[:3000], y.iloc[:3000])
+
+    try:
+        from sklearn.frozen import FrozenEstimator
+    except ImportError:
+        champion = CalibratedClassifierCV(estimator=challenger, method="sigmoid", cv="prefit")
+    else:
+        champion = CalibratedClassifierCV(estimator=FrozenEstimator(challenger), method="sigmoid")
+    champion.fit(X.iloc[3000:], y.iloc[3000:])
+
+    return champion, challenger
+
+
+@pytest.fixture(scope="module")
+def consumer(tmp_path_factory):
+    champion, challenger = train_models()
+    models = {
+        "upi_fraud_lgbm_calibrated.pkl": champion,
+        "upi_fraud_lgbm.pkl": challenger
+    }
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("AUDIT_LOG_DIR", str(tmp_path_factory.mktemp("audit")))
+        mp.setenv("AUDIT_MONGO_MIRROR", "0")
+        mp.setenv("UPI_TREE_ENGINE", "compiled")
+        mp.delenv("CONSUMER_PARTITION", raising=False)
+        mp.setattr(joblib, "load", lambda path: models[path.name])
+
+        module = importlib.import_module("consumers.upi_fraud_consumer")
+
+    return module
+
+
+@pytest.fixture
+def fresh_state(consumer, monkeypatch):
+    """
+    Gives the consumer empty stores backed by memory only.
+    """
+    from storage.velocity_repo import VelocityStore
+    from storage.risk_profile_repo import RiskProfileStore
+    from storage.graph_repo import GraphStore
+    from storage.processed_txn_store import ProcessedTransactionStore
+    from storage.feature_store import PayerFeatureStore
+
+    def install(writer=None):
+        if writer is None:
+            writer = KeepPendingWriter()
+        collections = {}
+
+        velocity = VelocityStore(writer=writer)
+        velocity.col = EmptyCollection("upi_velocity")
+        velocity._restored = True
+
+        risk = RiskProfileStore(writer=writer)
+        risk.collection = EmptyCollection("upi_risk_profiles")
+
+        graph = GraphStore(writer=writer)
+        graph.col = GraphCollection("upi_graph_edges", collections)
+        graph.degree_col = GraphCollection("upi_graph_degrees", collections)
+
+        processed = ProcessedTransactionStore(writer=writer)
+        processed.col = EmptyCollection("processed_transactions")
+
+        features = PayerFeatureStore(writer=writer, cache_size=0)
+        features.col = EmptyCollection("upi_payer_features")
+
+        audit = CollectingAuditWriter()
+
+        monkeypatch.setattr(consumer, "write_buffer", writer)
+        monkeypatch.setattr(consumer, "velocity_store", velocity)
+        monkeypatch.setattr(consumer, "risk_store", risk)
+        monkeypatch.setattr(consumer, "graph_store", graph)
+        monkeypatch.setattr(consumer, "processed_store", processed)
+        monkeypatch.setattr(consumer, "feature_store", features)
+        monkeypatch.setattr(consumer, "audit_writer", audit)
+        return audit
+
+    return install
+
+
+def make_events(n: int = 120, seed: int = 4, payees: int = 10) -> list[dict]:
+    rng = random.Random(seed)
+    payers = [f"payer{i}@upi" for i in range(4)]
+    payees = [f"merchant{i}@upi" for i in range(payees)]
+    clock = datetime.utcnow() - timedelta(hours=30)
+    events = []
+
+    for i in range(n):
+        clock += timedelta(minutes=rng.expovariate(1 / 12))
+        events.append({
+            "transaction_id": f"txn-{i}",
+            "payer_vpa": rng.choice(payers),
+            "payee_vpa": rng.choice(payees),
+            "amount": round(rng.choice([rng.uniform(10, 800), rng.uniform(2000, 9000)]), 2),
+            "device_id": rng.choice(["dev-a", "dev-b"]),
+            "ip_address": rng.choice(["10.1.2.3", "10.9.0.1", "192.168.4.4"]),
+            "status": rng.choice(["SUCCESS", "SUCCESS", "FAILED"]),
+            "timestamp": clock.isoformat()
+        })
+
+        # replays: right after (same batch) and much later (next batches)
+        if i % 17 == 5:
+            events.append(dict(events[-1]))
+        if i % 23 == 7 and i > 30:
+            events.append(dict(events[i - 20]))
+
+    return events
+
+
+def per_event_loop(consumer, events: list[dict]) -> list[dict]:
+    """
+    Reference: one event at a time, one predict_proba per model and row.
+    """
+    records = []
+
+    for event in events:
+        if consumer.processed_store.is_processed(event["transaction_id"]):
+            continue
+
+        X, velocity = consumer.extract_upi_features(event)
+        consumer.record_payer_features(event, pd.to_datetime(event["timestamp"]))
+
+        champion_prob = float(consumer.CHAMPION_MODEL.predict_proba(X)[0, 1])
+        challenger_prob = float(consumer.CHALLENGER_MODEL.predict_proba(X)[0, 1])
+
+        records.append(
+            consumer.decide_event(event, velocity, champion_prob, challenger_prob)
+        )
+
+    return records
+
+
+@pytest.mark.parametrize("batch_size", [1, 7, 64])
+def test_batches_decide_like_the_per_event_loop(consumer, fresh_state, batch_size):
+    events = make_events()
+
+    fresh_state()
+    expected = per_event_loop(consumer, events)
+
+    audit = fresh_state()
+    for start in range(0, len(events), batch_size):
+        consumer.process_batch(events[start:start + batch_size])
+    actual = audit.records
+
+    # same events, same order (duplicates skipped in both)
+    assert [r["transaction_id"] for r in actual] == [r["transaction_id"] for r in expected]
+    assert len(actual) == len({e["transaction_id"] for e in events})
+
+    for got, want in zip(actual, expected):
+        assert got["decision"] == want["decision"], got["transaction_id"]
+        assert got["graph_override"] == want["graph_override"]
+        assert got["velocity_risk"] == want["velocity_risk"]
+        assert got["explanations"] == want["explanations"]
+        for field in ("champion_probability", "challenger_probability", "final_probability"):
+            assert got[field] == pytest.approx(want[field], abs=2e-6), field
+
+    # the sample has to exercise more than one outcome
+    assert len({r["decision"] for r in expected}) > 1
+
+
+@pytest.mark.parametrize("flush_size", [3, 8, 11, 17])
+def test_early_boundaries_keep_graph_degrees_exact(consumer, fresh_state, flush_size):
+    # a few ops per event: the buffer becomes due inside most batches
+    writer = WriteBehindBuffer(flush_size=flush_size)
+    flushes = []
+    writer.on_flush(lambda: flushes.append(1))
+
+    fresh_state(writer)
+    # few edges: the same edge comes back while earlier writes are queued
+    events = make_events(payees=1)
+    for start in range(0, len(events), 16):
+        consumer.process_batch(events[start:start + 16])
+
+    # boundaries were closed early, inside batches
+    assert len(flushes) > len(events) / 16 + 1
+
+    edges = {(e["payer_vpa"], e["payee_vpa"]) for e in events}
+    assert len(consumer.graph_store.col.docs) == len(edges)
+
+    degrees = {doc["_id"]: doc for doc in consumer.graph_store.degree_col.docs}
+    for payer in {a for a, _ in edges}:
+        assert degrees[payer].get("out_degree") == len({b for a, b in edges if a == payer})
+    for payee in {b for _, b in edges}:
+        assert degrees[payee].get("in_degree") == len({a for a, b in edges if b == payee})
@@ -0,0 +1,58 @@
+# tests/test_decision_counters.py
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from storage.decision_counters import DecisionCounterStore
+
+
+class RecordingCollection:
+    def __init__(self):
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        return iter([{"total": 3, "BLOCK": 1, "ALLOW": 2}])
+
+
+def store() -> DecisionCounterStore:
+    col = RecordingCollection()
+    return DecisionCounterStore(database={
+        "audit_decision_counters": col,
+        "audit_decisions": col
+    })
+
+
+def match_of(counters: DecisionCounterStore) -> dict:
+    return counters.col.pipelines[-1][0]["$match"]
+
+
+def test_aware_bounds_match_naive_utc_buckets():
+    naive = store()
+    naive.summarize(datetime(2024, 5, 1, 10, 30), datetime(2024, 5, 1, 14, 15))
+
+    aware = store()
+    ist = timezone(timedelta(hours=5, minutes=30))
+    counts = aware.summarize(
+        datetime(2024, 5, 1, 10, 30, tzinfo=timezone.utc),
+        datetime(2024, 5, 1, 19, 45, tzinfo=ist)
+    )
+
+    assert match_of(aware) == match_of(naive)
+    assert counts == {"total": 3, "BLOCK": 1, "STEP_UP_AUTH": 0, "ALLOW": 2}
+
+
+@pytest.mark.parametrize("bound", ["start", "end"])
+def test_single_aware_bound(bound):
+    counters = store()
+    counters.summarize(**{bound: datetime(2024, 5, 1, 10, 30, tzinfo=timezone.utc)})
+
+    buckets = [
+        value
+        for clause in match_of(counters)["$or"]
+        for value in clause["bucket"].values()
+    ]
+    assert all(b.tzinfo is None for b in buckets)
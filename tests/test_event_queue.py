@@ -0,0 +1,128 @@
+# tests/test_event_queue.py
+
+import json
+
+import pytest
+
+from event_queue import event_queue
+from event_queue.event_queue import QueueReader, iter_batches, push_event
+
+
+@pytest.fixture
+def queue_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(event_queue, "QUEUE_DIR", tmp_path)
+    monkeypatch.setattr(event_queue, "QUEUE_FILE", tmp_path / "upi_events.jsonl")
+    monkeypatch.setattr(event_queue, "OFFSET_FILE", tmp_path / "upi_events.offset")
+    monkeypatch.setattr(event_queue, "LOCK_FILE", tmp_path / "upi_events.lock")
+    monkeypatch.setattr(event_queue, "SEGMENT_DIR", tmp_path / "segments")
+    return tmp_path
+
+
+def reader() -> QueueReader:
+    return QueueReader(event_queue.QUEUE_FILE, event_queue.OFFSET_FILE)
+
+
+def push(*ids):
+    for i in ids:
+        push_event({"transaction_id": i})
+
+
+def ids(events) -> list:
+    return [e["transaction_id"] for e in events]
+
+
+def test_resumes_after_last_commit(queue_dir):
+    push(1, 2, 3, 4, 5)
+
+    first = reader()
+    it = iter(first)
+    assert ids([next(it), next(it)]) == [1, 2]
+    first.commit()
+
+    # read but not committed: handed out again after a restart
+    next(it)
+
+    assert ids(reader()) == [3, 4, 5]
+
+
+def test_commit_of_an_earlier_position(queue_dir):
+    push(1, 2, 3)
+
+    first = reader()
+    batches = []
+    for batch in iter_batches(first, batch_size=2, max_wait_ms=1000):
+        batches.append((ids(batch), first.position))
+
+    assert [b for b, _ in batches] == [[1, 2], [3]]
+
+    # only the first batch became durable
+    first.commit(batches[0][1])
+    assert ids(reader()) == [3]
+
+
+def test_partial_line_is_left_for_the_next_read(queue_dir):
+    push(1)
+    with open(event_queue.QUEUE_FILE, "ab") as f:
+        f.write(b'{"transaction_id": 2')
+
+    first = reader()
+    assert ids(first) == [1]
+    first.commit()
+
+    with open(event_queue.QUEUE_FILE, "ab") as f:
+        f.write(b"}\n")
+
+    assert ids(reader()) == [2]
+
+
+def test_rotate_only_when_fully_committed(queue_dir):
+    push(1, 2)
+
+    first = reader()
+    list(first)
+    first.commit(first.position - 1)
+    assert first.rotate() is None
+
+    first.commit()
+    segment = first.rotate()
+
+    assert segment is not None and segment.parent == queue_dir / "segments"
+    assert ids(json.loads(line) for line in segment.read_text().splitlines()) == [1, 2]
+    assert not event_queue.QUEUE_FILE.exists()
+
+
+def test_offset_is_not_applied_to_a_new_file(queue_dir):
+    push(1, 2, 3)
+
+    first = reader()
+    list(first)
+    first.commit()
+    first.rotate()
+
+    # a new active file starts from its beginning
+    push(4, 5)
+    second = reader()
+    assert ids(second) == [4, 5]
+    second.commit()
+
+    # the same offset written for another file is ignored (the old
+    # file is kept so its inode cannot be reused)
+    stale = json.loads(event_queue.OFFSET_FILE.read_text())
+    event_queue.QUEUE_FILE.rename(queue_dir / "moved.jsonl")
+    push(6, 7, 8)
+    event_queue.OFFSET_FILE.write_text(json.dumps(stale))
+
+    assert ids(reader()) == [6, 7, 8]
+
+
+def test_events_appended_during_rotation_check_stay(queue_dir):
+    push(1)
+
+    first = reader()
+    list(first)
+    first.commit()
+
+    # appended after the read: file is no longer fully committed
+    push(2)
+    assert first.rotate() is None
+    assert ids(reader()) == [2]
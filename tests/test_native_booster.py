@@ -0,0 +1,69 @@
+# tests/test_native_booster.py
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+
+from sklearn.pipeline import Pipeline
+
+from data.schema import FEATURE_COLUMNS
+from inference.native_booster import NativeBoosterScorer
+from training.preprocess import build_preprocessor
+
+
+def credit_card_data(n: int = 2000, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n, len(FEATURE_COLUMNS))), columns=FEATURE_COLUMNS)
+    X["Time"] = rng.uniform(0, 172_800, n)
+    X["Amount"] = rng.exponential(80, n)
+
+    logit = 1.5 * X["V14"] - X["V4"] + 0.01 * X["Amount"] - 3
+    y = (rng.uniform(size=n) < 1 / (1 + np.exp(-logit))).astype(int)
+    return X, y
+
+
+def fitted_pipeline(model):
+    X, y = credit_card_data()
+    pipeline = Pipeline(steps=[
+        ("preprocessor", build_preprocessor()),
+        ("model", model)
+    ])
+    return pipeline.fit(X, y)
+
+
+def lightgbm_model():
+    lgb = pytest.importorskip("lightgbm")
+    return lgb.LGBMClassifier(n_estimators=60, num_leaves=15, random_state=0, verbose=-1)
+
+
+def xgboost_model():
+    xgb = pytest.importorskip("xgboost")
+    return xgb.XGBClassifier(n_estimators=60, max_depth=4, random_state=0)
+
+
+@pytest.mark.parametrize("make_model", [lightgbm_model, xgboost_model])
+def test_native_scores_match_pipeline(make_model):
+    pipeline = fitted_pipeline(make_model())
+
+    # round trip through the exported artifact, as the API loads it
+    scorer = NativeBoosterScorer.from_artifact(NativeBoosterScorer.export(pipeline))
+
+    X, _ = credit_card_data(500, seed=1)
+    expected = pipeline.predict_proba(X)[:, 1]
+    actual = scorer.predict_proba(X.to_numpy(dtype=np.float64))
+
+    # same float64 standardization, same booster: bit-for-bit
+    np.testing.assert_array_equal(actual, expected)
+
+    row = X.iloc[0].to_numpy(dtype=np.float64)
+    assert scorer.predict_one(row) == expected[0]
+
+
+def test_artifact_for_other_features_is_rejected():
+    artifact = NativeBoosterScorer.export(fitted_pipeline(lightgbm_model()))
+    artifact["feature_columns"] = artifact["feature_columns"][:-1]
+
+    with pytest.raises(ValueError):
+        NativeBoosterScorer.from_artifact(artifact)
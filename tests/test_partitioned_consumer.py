@@ -0,0 +1,41 @@
+# tests/test_partitioned_consumer.py
+
+import pytest
+
+from consumers.partitioned_consumer import PartitionSupervisor
+
+
+class RunningProcess:
+    exitcode = None
+
+    def is_alive(self):
+        return True
+
+
+class FinishedProcess:
+    def __init__(self, exitcode):
+        self.exitcode = exitcode
+
+    def is_alive(self):
+        return False
+
+
+def supervisor() -> PartitionSupervisor:
+    # processes are never started; the queues are real
+    return PartitionSupervisor(workers=2, outbox_poll_s=0.05)
+
+
+def test_dead_worker_fails_instead_of_hanging():
+    sup = supervisor()
+    sup.processes = [RunningProcess(), FinishedProcess(-9)]
+
+    with pytest.raises(RuntimeError, match="Partition 1 .*exit code -9"):
+        sup._next_message()
+
+
+def test_last_message_of_a_dead_worker_is_still_read():
+    sup = supervisor()
+    sup.processes = [FinishedProcess(0), RunningProcess()]
+    sup.outbox.put(("error", 0, "Traceback ..."))
+
+    assert sup._next_message() == ("error", 0, "Traceback ...")
@@ -0,0 +1,56 @@
+# tests/test_predict_batch.py
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+pytest.importorskip("multipart")
+pytest.importorskip("dotenv")
+
+from fastapi.testclient import TestClient
+
+from backend import app as api
+from data.schema import FEATURE_COLUMNS
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(api, "require_model", lambda name: None)
+    monkeypatch.setattr(
+        api, "credit_predict_proba", lambda name, X: [0.1] * len(X)
+    )
+    # no lifespan: nothing is loaded
+    return TestClient(api.app)
+
+
+def post_csv(client, df: pd.DataFrame):
+    return client.post(
+        "/predict/batch",
+        files={"file": ("batch.csv", df.to_csv(index=False), "text/csv")}
+    )
+
+
+def rows(n: int = 3) -> pd.DataFrame:
+    return pd.DataFrame(
+        [[float(i)] * len(FEATURE_COLUMNS) for i in range(n)],
+        columns=FEATURE_COLUMNS
+    )
+
+
+def test_numeric_csv_is_scored(client):
+    response = post_csv(client, rows())
+
+    assert response.status_code == 200
+    assert response.json()["count"] == 3
+
+
+@pytest.mark.parametrize("value", ["abc", None])
+def test_bad_csv_cell_is_a_422_naming_it(client, value):
+    df = rows().astype(object)
+    df.loc[1, "V7"] = value
+
+    response = post_csv(client, df)
+
+    assert response.status_code == 422
+    assert "'V7', row 1" in response.json()["detail"]
@@ -0,0 +1,73 @@
+# tests/test_processed_txn_store.py
+
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from storage.processed_txn_store import ProcessedTransactionStore
+
+
+class ProcessedCollection:
+    """
+    Ids processed long ago: outside the window the filter is loaded with.
+    """
+
+    def __init__(self, ids):
+        self.ids = set(ids)
+        self.queries = []
+
+    def find(self, query, projection=None, batch_size=None):
+        self.queries.append(query)
+        if "processed_at" in query:
+            return []
+        return [
+            {"transaction_id": txn_id}
+            for txn_id in query["transaction_id"]["$in"]
+            if txn_id in self.ids
+        ]
+
+    def find_one(self, query, projection=None):
+        self.queries.append(query)
+        if query["transaction_id"] in self.ids:
+            return {"_id": query["transaction_id"]}
+        return None
+
+
+def store(ids=("old-1",)) -> ProcessedTransactionStore:
+    processed = ProcessedTransactionStore(retention_days=30)
+    processed.col = ProcessedCollection(ids)
+    processed.rebuild()
+    return processed
+
+
+def test_events_older_than_the_filter_are_checked_in_mongo():
+    processed = store()
+    old = datetime.utcnow() - timedelta(days=90)
+
+    assert processed.is_processed("old-1", old)
+    assert not processed.is_processed("old-2", old)
+    assert processed.mongo_lookups == 2
+
+
+def test_recent_filter_miss_needs_no_query():
+    processed = store()
+    queries = len(processed.col.queries)
+
+    assert not processed.is_processed("new-1", datetime.utcnow())
+    assert len(processed.col.queries) == queries
+
+
+def test_prefetch_resolves_old_events_with_one_query():
+    processed = store()
+    old = datetime.utcnow() - timedelta(days=90)
+    now = datetime.utcnow()
+
+    processed.prefetch([("old-1", old), ("old-2", old), ("new-1", now)])
+    assert processed.mongo_lookups == 1
+
+    assert processed.is_processed("old-1", old)
+    assert not processed.is_processed("old-2", old)
+    assert not processed.is_processed("new-1", now)
+    assert processed.mongo_lookups == 1
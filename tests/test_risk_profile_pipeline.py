@@ -0,0 +1,103 @@
+# tests/test_risk_profile_pipeline.py
+
+import random
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from storage.risk_profile_repo import (
+    RiskProfileStore,
+    DECISION_EFFECTS,
+    decision_pipeline
+)
+
+DECISIONS = list(DECISION_EFFECTS) + ["UNKNOWN"]
+FIELDS = (
+    "risk_score", "block_threshold", "step_up_threshold",
+    "allow_count", "block_count", "stepup_count"
+)
+
+
+# --------------------------------------------------
+# Minimal evaluator for the operators decision_pipeline() uses
+# --------------------------------------------------
+def evaluate(expr, doc: dict):
+    if isinstance(expr, str) and expr.startswith("$"):
+        return doc.get(expr[1:])
+
+    if not isinstance(expr, dict):
+        return expr
+
+    (op, args), = expr.items()
+    values = [evaluate(a, doc) for a in args]
+
+    if op == "$ifNull":
+        return values[0] if values[0] is not None else values[1]
+    if op == "$add":
+        return sum(values)
+    if op == "$subtract":
+        return values[0] - values[1]
+    if op == "$divide":
+        return values[0] / values[1]
+    if op == "$min":
+        return min(values)
+    if op == "$max":
+        return max(values)
+
+    raise AssertionError(f"Operator not covered by the test evaluator: {op}")
+
+
+def run_pipeline(pipeline: list[dict], doc: dict) -> dict:
+    for stage in pipeline:
+        (name, fields), = stage.items()
+        assert name == "$set"
+        # fields of one $set are evaluated against the input document
+        doc = {**doc, **{k: evaluate(v, doc) for k, v in fields.items()}}
+    return doc
+
+
+def store() -> RiskProfileStore:
+    # collections are lazy; nothing here talks to Mongo
+    return RiskProfileStore()
+
+
+def test_python_twin_matches_pipeline_over_random_histories():
+    rng = random.Random(11)
+    twin = store()
+
+    for _ in range(200):
+        server = {}
+        local = twin._default_profile("p@upi")
+
+        for decision in rng.choices(DECISIONS, k=rng.randint(1, 60)):
+            server = run_pipeline(decision_pipeline(decision), server)
+            local = {**local, **twin._apply_decision(local, decision)}
+
+            for field in FIELDS:
+                assert local[field] == pytest.approx(server[field], abs=1e-12), field
+
+
+@pytest.mark.parametrize("risk_score", [-30, 0, 55, 100, 140])
+def test_profiles_written_by_feedback_only(risk_score):
+    # tighten / relax $inc only risk_score, possibly past the bounds
+    twin = store()
+    server = {"payer_vpa": "p@upi", "risk_score": risk_score}
+    local = twin._with_defaults(dict(server))
+
+    for decision in DECISIONS:
+        server = run_pipeline(decision_pipeline(decision), server)
+        local = {**local, **twin._apply_decision(local, decision)}
+
+        for field in FIELDS:
+            assert local[field] == pytest.approx(server[field], abs=1e-12), field
+
+
+def test_thresholds_stay_within_bounds():
+    doc = {}
+    for _ in range(20):
+        doc = run_pipeline(decision_pipeline("BLOCK"), doc)
+
+    assert doc["risk_score"] == 100
+    assert doc["block_threshold"] == 0.60
+    assert doc["step_up_threshold"] == 0.25
@@ -0,0 +1,120 @@
+# tests/test_tree_engine.py
+
+import copy
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+lgb = pytest.importorskip("lightgbm")
+pytest.importorskip("sklearn")
+
+from sklearn.calibration import CalibratedClassifierCV
+
+from data.upi_schema import UPI_FEATURE_COLUMNS
+from inference.tree_engine import ChampionChallengerEngine, CompiledTreeEnsemble
+
+
+def upi_data(n: int = 3000, seed: int = 0, with_missing: bool = False):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({
+        "transaction_amount": rng.exponential(2000, n),
+        "hour_of_day": rng.integers(0, 24, n),
+        "day_of_week": rng.integers(0, 7, n),
+        "transactions_last_1hr": rng.poisson(2, n),
+        "transactions_last_24hr": rng.poisson(10, n),
+        "avg_amount_last_7_days": rng.exponential(1500, n),
+        "device_change_flag": rng.integers(0, 2, n),
+        "location_change_flag": rng.integers(0, 2, n),
+        "failed_attempts_last_1hr": rng.poisson(0.5, n),
+        "receiver_new_flag": rng.integers(0, 2, n),
+    }, columns=UPI_FEATURE_COLUMNS).astype(float)
+
+    if with_missing:
+        # NaN and exact zeros exercise the missing-value routing
+        X = X.mask(rng.uniform(size=X.shape) < 0.05)
+        X.loc[rng.uniform(size=n) < 0.05, "transaction_amount"] = 0.0
+
+    logit = (
+        X["transaction_amount"].fillna(0) / 3000
+        + X["device_change_flag"].fillna(0) * 1.5
+        + X["failed_attempts_last_1hr"].fillna(0)
+        - 3
+    )
+    y = (rng.uniform(size=n) < 1 / (1 + np.exp(-logit))).astype(int)
+    return X, y
+
+
+def lightgbm_model(**params):
+    X, y = upi_data(with_missing=True)
+    model = lgb.LGBMClassifier(**{
+        "n_estimators": 80, "num_leaves": 31, "random_state": 0, "verbose": -1,
+        **params
+    })
+    return model.fit(X, y)
+
+
+def calibrated(model):
+    # the training script's cv="prefit"; FrozenEstimator on newer sklearn
+    X, y = upi_data(seed=5)
+    try:
+        from sklearn.frozen import FrozenEstimator
+    except ImportError:
+        champion = CalibratedClassifierCV(estimator=model, method="sigmoid", cv="prefit")
+    else:
+        champion = CalibratedClassifierCV(estimator=FrozenEstimator(model), method="sigmoid")
+    return champion.fit(X, y)
+
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"objective": "binary", "sigmoid": 0.7},
+    {"zero_as_missing": True},
+    {"use_missing": False},
+])
+def test_compiled_ensemble_matches_lightgbm(params):
+    model = lightgbm_model(**params)
+    engine = CompiledTreeEnsemble.from_lightgbm(model)
+
+    X, _ = upi_data(1000, seed=1, with_missing=True)
+    expected = model.predict_proba(X)[:, 1]
+    actual = engine.predict_proba(X.to_numpy(dtype=np.float64))
+
+    np.testing.assert_allclose(actual, expected, rtol=1e-12, atol=1e-15)
+
+    raw = model.predict(X, raw_score=True)
+    np.testing.assert_allclose(engine.margin(X.to_numpy(dtype=np.float64)), raw, rtol=1e-12, atol=1e-12)
+
+
+def test_champion_and_challenger_match_sklearn():
+    challenger = lightgbm_model()
+    # separately unpickled in production; same booster string
+    champion = calibrated(copy.deepcopy(challenger))
+
+    engine = ChampionChallengerEngine(champion, challenger)
+    assert engine.shared_booster
+
+    X, _ = upi_data(1000, seed=2, with_missing=True)
+    champion_probs, challenger_probs = engine.predict(X.to_numpy(dtype=np.float64))
+
+    np.testing.assert_allclose(
+        challenger_probs, challenger.predict_proba(X)[:, 1], rtol=1e-12, atol=1e-15
+    )
+    np.testing.assert_allclose(
+        champion_probs, champion.predict_proba(X)[:, 1], rtol=1e-9, atol=1e-12
+    )
+
+
+def test_champion_on_a_different_booster():
+    challenger = lightgbm_model()
+    champion = calibrated(lightgbm_model(num_leaves=7))
+
+    engine = ChampionChallengerEngine(champion, challenger)
+    assert not engine.shared_booster
+
+    X, _ = upi_data(500, seed=3)
+    champion_probs, _ = engine.predict(X.to_numpy(dtype=np.float64))
+
+    np.testing.assert_allclose(
+        champion_probs, champion.predict_proba(X)[:, 1], rtol=1e-9, atol=1e-12
+    )
@@ -0,0 +1,101 @@
+# tests/test_velocity_window.py
+
+import math
+import random
+from datetime import datetime, timedelta
+
+from storage.velocity_window import (
+    SlidingWindowVelocity,
+    VELOCITY_WINDOWS,
+    MAX_LATENESS_SECONDS,
+    to_epoch_seconds
+)
+
+START = datetime(2026, 1, 1)
+
+
+def brute_force(history: list, payer_vpa: str, now: datetime) -> dict:
+    t = to_epoch_seconds(now)
+    result = {}
+
+    for label, span in VELOCITY_WINDOWS:
+        amounts = [
+            amount for vpa, ts, amount in history
+            if vpa == payer_vpa and ts >= t - span
+        ]
+        result[label] = (len(amounts), math.fsum(amounts))
+
+    return result
+
+
+def assert_same(actual: dict, expected: dict):
+    assert actual.keys() == expected.keys()
+    for label, (count, total) in expected.items():
+        assert actual[label][0] == count, label
+        assert math.isclose(actual[label][1], total, rel_tol=1e-9, abs_tol=1e-6), label
+
+
+def test_matches_brute_force_with_late_events_and_eviction():
+    rng = random.Random(7)
+    engine = SlidingWindowVelocity()
+    payers = [f"payer{i}@upi" for i in range(5)]
+    history = []
+    clock = START
+
+    # ~12 days of traffic: windows slide, entries expire and compact
+    for _ in range(3000):
+        clock += timedelta(seconds=rng.expovariate(1 / 350))
+        payer = rng.choice(payers)
+
+        # some events arrive late, within the allowed lateness
+        ts = clock
+        if rng.random() < 0.1:
+            ts -= timedelta(seconds=rng.uniform(0, MAX_LATENESS_SECONDS))
+
+        # queries also go back in time for late events
+        assert_same(engine.query(payer, ts), brute_force(history, payer, ts))
+
+        amount = round(rng.uniform(1, 5000), 2)
+        engine.record(payer, ts, amount)
+        history.append((payer, to_epoch_seconds(ts), amount))
+
+    for payer in payers:
+        assert_same(engine.query(payer, clock), brute_force(history, payer, clock))
+
+
+def test_unknown_payer_is_empty():
+    engine = SlidingWindowVelocity()
+
+    assert engine.query("nobody@upi", START) == {
+        label: (0, 0.0) for label, _ in VELOCITY_WINDOWS
+    }
+
+
+def test_sweep_forgets_idle_payers():
+    engine = SlidingWindowVelocity()
+    engine.record("idle@upi", START, 100.0)
+    engine.record("busy@upi", START + timedelta(days=30), 50.0)
+
+    engine.sweep()
+
+    assert "idle@upi" not in engine.payers
+    assert engine.query("busy@upi", START + timedelta(days=30))["1hr"] == (1, 50.0)
+
+
+def test_load_restores_snapshot():
+    rng = random.Random(3)
+    engine = SlidingWindowVelocity()
+    history = []
+
+    for i in range(200):
+        ts = START + timedelta(minutes=37 * i)
+        amount = rng.uniform(1, 100)
+        engine.record("p@upi", ts, amount)
+        history.append(("p@upi", to_epoch_seconds(ts), amount))
+
+    window = engine.payers["p@upi"]
+    restored = SlidingWindowVelocity()
+    restored.load("p@upi", list(reversed(window.times)), list(reversed(window.amounts)))
+
+    now = START + timedelta(minutes=37 * 200)
+    assert_same(restored.query("p@upi", now), brute_force(history, "p@upi", now))
@@ -0,0 +1,54 @@
+import joblib
+import numpy as np
+from pathlib import Path
+
+from inference.native_booster import NativeBoosterScorer
+from training.utils import load_data
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+MODEL_DIR = BASE_DIR / "models"
+
+# pipeline artifact -> native artifact
+EXPORTS = {
+    "fraud_lgbm.pkl": "fraud_lgbm_native.pkl",
+    "fraud_xgb.pkl": "fraud_xgb_native.pkl",
+}
+
+# max |native - pipeline| accepted on the validation sample
+TOLERANCE = 1e-6
+SAMPLE_SIZE = 5000
+
+
+def main():
+    _, X_test, _, _ = load_data()
+    X_sample = X_test.head(SAMPLE_SIZE)
+
+    for source, target in EXPORTS.items():
+        source_path = MODEL_DIR / source
+        if not source_path.exists():
+            print(f"Skipping {source}: not found")
+            continue
+
+        pipeline = joblib.load(source_path)
+        artifact = NativeBoosterScorer.export(pipeline)
+
+        # -------------------------
+        # Validate against the pipeline
+        # -------------------------
+        scorer = NativeBoosterScorer.from_artifact(artifact)
+        expected = pipeline.predict_proba(X_sample)[:, 1]
+        actual = scorer.predict_proba(X_sample.to_numpy(dtype=np.float64))
+        max_diff = float(np.max(np.abs(expected - actual)))
+
+        if max_diff > TOLERANCE:
+            raise ValueError(
+                f"{source}: native scores differ from pipeline "
+                f"(max diff {max_diff:.2e} > {TOLERANCE:.0e})"
+            )
+
+        joblib.dump(artifact, MODEL_DIR / target)
+        print(f"Saved {target} ({artifact['kind']}, max diff {max_diff:.2e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
+import numpy as np
 import pandas as pd
 import joblib
 from pathlib import Path
+from sklearn.model_selection import train_test_split
 from sklearn.neighbors import NearestNeighbors
 from sklearn.preprocessing import StandardScaler
 
@@ -13,6 +15,13 @@ MODEL_DIR = BASE_DIR / "models"
 
 MODEL_DIR.mkdir(exist_ok=True)
 
+# Index settings
+K = 5
+INDEX_SIZE = 50_000          # normal transactions kept in the index
+CALIBRATION_SIZE = 20_000    # held-out normals for the distance threshold
+THRESHOLD_QUANTILE = 0.998   # matches the Isolation Forest contamination
+LEAF_SIZE = 40
+
 # Load data
 df = pd.read_csv(DATA_PATH)
 
@@ -25,19 +34,34 @@ X = df_normal[FEATURE_COLUMNS]
 scaler = StandardScaler()
 X_scaled = scaler.fit_transform(X)
 
-# Train KNN (Nearest Neighbors)
+# Index a sample of normals; calibrate on others
+X_index, X_calib = train_test_split(
+    X_scaled,
+    train_size=min(INDEX_SIZE, len(X_scaled) - CALIBRATION_SIZE),
+    test_size=CALIBRATION_SIZE,
+    random_state=42
+)
+
+# Ball tree: bounded query cost instead of a brute-force scan
 knn = NearestNeighbors(
-    n_neighbors=5,
+    n_neighbors=K,
     metric="euclidean",
+    algorithm="ball_tree",
+    leaf_size=LEAF_SIZE,
     n_jobs=-1
 )
 
-knn.fit(X_scaled)
+knn.fit(X_index)
+
+# Mean k-distance of held-out normals -> anomaly threshold
+distances, _ = knn.kneighbors(X_calib)
+threshold = float(np.quantile(distances.mean(axis=1), THRESHOLD_QUANTILE))
 
 # Save model + scaler
 joblib.dump(
-    {"model": knn, "scaler": scaler},
+    {"model": knn, "scaler": scaler, "k": K, "threshold": threshold},
     MODEL_DIR / "fraud_knn.pkl"
 )
 
-print("KNN anomaly model trained and saved")
+print(f"KNN anomaly index ({len(X_index)} normals) trained and saved")
+print(f"k-distance threshold (q={THRESHOLD_QUANTILE}): {threshold:.4f}")